@@ -0,0 +1,320 @@
+"""
+压测用的 OpenAI 兼容假上游（桩服务）
+实现 POST /chat/completions（包括 stream=true），按 翻译：/关键词： 格式回复
+（请求带 response_format=json_object 时回复 JSON 对象），
+可配置延迟分布、输出 token 速度、错误和 429 注入以及 RPM 配额，
+把 DEEPSEEK_BASE_URL / ALIYUN_BASE_URL 指向它即可离线压测真实的客户端代码
+
+用法：
+    python -m benchmarks.fake_upstream --port 18080 --latency lognormal:300:0.5 \\
+        --tokens-per-second 80 --error-rate 0.01 --rate-limit-rate 0.02
+"""
+
+import re
+import json
+import time
+import math
+import random
+import asyncio
+import argparse
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from src.xp_translator.tokens import estimate_tokens
+
+# 用户消息中的原文，以及批量提示词中的编号条目
+_SOURCE_TEXT = re.compile(r"原文：(.*)", re.S)
+_BATCH_ITEM = re.compile(r"^\[(\d+)\] (.*)$", re.M)
+# 模拟提供商的上下文缓存：前缀按 64 token 为单位命中
+_CACHE_BLOCK_TOKENS = 64
+_CJK = re.compile(r"[一-鿿]")
+# 流式输出的切分单位：单个中日韩字符，或一段非中日韩字符（约一个 token）
+_STREAM_PIECE = re.compile(r"[一-鿿]|[^一-鿿]{1,4}")
+
+
+class LatencyDistribution:
+    """首 token 延迟的分布
+
+    支持的格式（单位毫秒）：
+    - fixed:200
+    - uniform:100:300
+    - normal:200:50（均值、标准差）
+    - lognormal:200:0.5（中位数、对数标准差，长尾）
+    - exponential:200（均值）
+    """
+
+    def __init__(self, spec: str = "fixed:0"):
+        kind, *params = spec.split(":")
+        self.kind = kind
+        self.params = [float(p) for p in params]
+        expected = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2, "exponential": 1}
+        if expected.get(kind) != len(self.params):
+            raise ValueError(f"无效的延迟分布: {spec}")
+        self.spec = spec
+
+    def sample(self, rng: random.Random) -> float:
+        """返回一次延迟（秒）"""
+        p = self.params
+        if self.kind == "fixed":
+            ms = p[0]
+        elif self.kind == "uniform":
+            ms = rng.uniform(p[0], p[1])
+        elif self.kind == "normal":
+            ms = rng.gauss(p[0], p[1])
+        elif self.kind == "lognormal":
+            ms = rng.lognormvariate(math.log(max(p[0], 1e-6)), p[1])
+        else:
+            ms = rng.expovariate(1 / p[0]) if p[0] > 0 else 0.0
+        return max(0.0, ms) / 1000
+
+
+@dataclass
+class StubConfig:
+    """桩服务配置"""
+    latency: str = "fixed:0"
+    # 输出速度（token/秒），0 表示瞬间输出
+    tokens_per_second: float = 0.0
+    # 返回 500 的概率
+    error_rate: float = 0.0
+    # 返回 429 的概率
+    rate_limit_rate: float = 0.0
+    # 429 响应的 Retry-After（秒）
+    retry_after: float = 1.0
+    # 每分钟请求配额，0 表示不限制；设置后所有响应都带 x-ratelimit-* 头
+    rpm: int = 0
+    seed: Optional[int] = None
+
+
+@dataclass
+class StubStats:
+    requests: int = 0
+    streams: int = 0
+    errors: int = 0
+    rate_limited: int = 0
+    cached_tokens: int = 0
+    status_counts: Dict[str, int] = field(default_factory=dict)
+
+
+def source_texts(prompt: str) -> Tuple[List[str], bool]:
+    """从翻译提示词中取出原文，返回 (原文列表, 是否为批量提示词)"""
+    items = _BATCH_ITEM.findall(prompt)
+    if items:
+        return [text for _, text in items], True
+    match = _SOURCE_TEXT.search(prompt)
+    return [match.group(1).strip() if match else prompt.strip()], False
+
+
+def fake_translation(text: str) -> Tuple[str, List[str]]:
+    """生成确定性的假译文和关键词：中文原文给出英文，英文原文给出中文"""
+    if _CJK.search(text):
+        return f"Translation of {len(text)} characters: {text[:20]}", ["stub", "translation", "test"]
+    return f"译文（{len(text)} 个字符）：{text[:40]}", ["桩服务", "翻译", "测试"]
+
+
+def fake_result(text: str) -> str:
+    """按 翻译：/关键词： 格式给出假译文"""
+    translation, keywords = fake_translation(text)
+    return f"翻译：{translation}\n关键词：[{', '.join(keywords)}]"
+
+
+def truncate_reply(content: str, max_tokens: Optional[int]) -> Tuple[str, str]:
+    """像真实上游一样在 max_tokens 处截断回复，返回 (回复, finish_reason)"""
+    if not max_tokens or estimate_tokens(content) <= max_tokens:
+        return content, "stop"
+    low, high = 0, len(content)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if estimate_tokens(content[:middle]) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return content[:low], "length"
+
+
+def build_reply(prompt: str, json_mode: bool = False) -> str:
+    """按 翻译：/关键词： 格式生成回复，批量提示词按编号逐条回复；json_mode 时回复 JSON 对象"""
+    texts, batched = source_texts(prompt)
+    if json_mode:
+        translation, keywords = fake_translation(texts[0])
+        return json.dumps({"translation": translation, "keywords": keywords}, ensure_ascii=False)
+    if not batched:
+        return fake_result(texts[0])
+    return "\n".join(f"[{number}]\n{fake_result(text)}" for number, text in enumerate(texts, start=1))
+
+
+def create_app(config: Optional[StubConfig] = None) -> FastAPI:
+    """创建桩服务应用"""
+    config = config or StubConfig()
+    latency = LatencyDistribution(config.latency)
+    rng = random.Random(config.seed)
+    stats = StubStats()
+    window = {"start": time.monotonic(), "count": 0}
+    seen_prefixes = set()
+    app = FastAPI(title="XP Translator Stub Upstream")
+    app.state.stats = stats
+
+    def ratelimit_headers() -> Dict[str, str]:
+        if not config.rpm:
+            return {}
+        elapsed = time.monotonic() - window["start"]
+        if elapsed >= 60:
+            window["start"], window["count"], elapsed = time.monotonic(), 0, 0.0
+        return {
+            "x-ratelimit-limit-requests": str(config.rpm),
+            "x-ratelimit-remaining-requests": str(max(0, config.rpm - window["count"])),
+            "x-ratelimit-reset-requests": f"{60 - elapsed:.3f}s",
+        }
+
+    def error_response(status: int, message: str, kind: str, headers: Dict[str, str]) -> JSONResponse:
+        stats.status_counts[str(status)] = stats.status_counts.get(str(status), 0) + 1
+        return JSONResponse(
+            status_code=status,
+            content={"error": {"message": message, "type": kind, "code": kind}},
+            headers=headers
+        )
+
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats.requests += 1
+
+        headers = ratelimit_headers()
+        over_quota = config.rpm and window["count"] >= config.rpm
+        if over_quota or rng.random() < config.rate_limit_rate:
+            stats.rate_limited += 1
+            retry_after = float(headers["x-ratelimit-reset-requests"][:-1]) if over_quota else config.retry_after
+            headers["retry-after"] = f"{retry_after:g}"
+            return error_response(429, "Rate limit exceeded", "rate_limit_exceeded", headers)
+        window["count"] += 1
+        headers = ratelimit_headers() or headers
+        if rng.random() < config.error_rate:
+            stats.errors += 1
+            return error_response(500, "Injected upstream error", "server_error", headers)
+
+        prompt = body["messages"][-1]["content"]
+        json_mode = (body.get("response_format") or {}).get("type") == "json_object"
+        content, finish_reason = truncate_reply(build_reply(prompt, json_mode), body.get("max_tokens"))
+        prompt_tokens = sum(estimate_tokens(m.get("content", "")) for m in body["messages"])
+        completion_tokens = estimate_tokens(content)
+        # 除最后一条消息外的前缀见过就算命中缓存
+        prefix = json.dumps(body["messages"][:-1], ensure_ascii=False, sort_keys=True)
+        prefix_tokens = prompt_tokens - estimate_tokens(prompt)
+        cached_tokens = prefix_tokens // _CACHE_BLOCK_TOKENS * _CACHE_BLOCK_TOKENS if prefix in seen_prefixes else 0
+        seen_prefixes.add(prefix)
+        stats.cached_tokens += cached_tokens
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": cached_tokens},
+        }
+        model = body.get("model", "stub")
+        first_token_delay = latency.sample(rng)
+        stats.status_counts["200"] = stats.status_counts.get("200", 0) + 1
+
+        if body.get("stream"):
+            stats.streams += 1
+            include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+            return StreamingResponse(
+                _stream(content, model, first_token_delay, config.tokens_per_second,
+                        usage if include_usage else None, finish_reason),
+                media_type="text/event-stream",
+                headers=headers
+            )
+
+        await asyncio.sleep(first_token_delay + (
+            completion_tokens / config.tokens_per_second if config.tokens_per_second > 0 else 0.0
+        ))
+        return JSONResponse(headers=headers, content={
+            "id": f"chatcmpl-stub-{stats.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": finish_reason,
+            }],
+            "usage": usage,
+        })
+
+    # 同时支持 base_url 带或不带 /v1
+    app.add_api_route("/chat/completions", chat_completions, methods=["POST"])
+    app.add_api_route("/v1/chat/completions", chat_completions, methods=["POST"])
+
+    @app.get("/stats")
+    async def get_stats():
+        return {
+            "requests": stats.requests,
+            "streams": stats.streams,
+            "errors": stats.errors,
+            "rate_limited": stats.rate_limited,
+            "cached_tokens": stats.cached_tokens,
+            "status_counts": stats.status_counts,
+        }
+
+    return app
+
+
+async def _stream(content: str, model: str, first_token_delay: float, tokens_per_second: float,
+                  usage: Optional[dict] = None, finish_reason: str = "stop"):
+    """按 OpenAI 流式格式逐块输出回复，给出 usage 时在最后追加一个只含 usage 的数据块"""
+    created = int(time.time())
+    interval = 1 / tokens_per_second if tokens_per_second > 0 else 0.0
+
+    def chunk(delta: dict, finish_reason=None) -> str:
+        return event({"choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]})
+
+    def event(fields: dict) -> str:
+        payload = {"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": created, "model": model}
+        payload.update(fields)
+        return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+    await asyncio.sleep(first_token_delay)
+    yield chunk({"role": "assistant", "content": ""})
+    for piece in _STREAM_PIECE.findall(content):
+        if interval:
+            await asyncio.sleep(interval)
+        yield chunk({"content": piece})
+    yield chunk({}, finish_reason=finish_reason)
+    if usage is not None:
+        yield event({"choices": [], "usage": usage})
+    yield "data: [DONE]\n\n"
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="OpenAI 兼容的本地桩服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--latency", default="fixed:0",
+                        help="首 token 延迟分布（毫秒）：fixed:200、uniform:100:300、normal:200:50、"
+                             "lognormal:200:0.5、exponential:200")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="输出速度，0 表示瞬间输出")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回 500 的概率")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="返回 429 的概率")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="注入的 429 响应的 Retry-After（秒）")
+    parser.add_argument("--rpm", type=int, default=0, help="每分钟请求配额，0 表示不限制")
+    parser.add_argument("--seed", type=int, default=None, help="随机种子，便于复现")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    import uvicorn
+
+    args = parse_args(argv)
+    config = StubConfig(
+        latency=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after,
+        rpm=args.rpm,
+        seed=args.seed
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning", access_log=False)
+
+
+if __name__ == "__main__":
+    main()
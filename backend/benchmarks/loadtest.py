@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+XP-Translator 端到端压测
+
+启动桩上游（benchmarks/fake_upstream.py）和 xp_translator.api:app（各自独立的子进程），然后对 POST /translate：
+1. 在固定并发下闭环压测（每个 worker 收到响应后立即发下一个请求）
+2. 在固定到达速率下开环压测（按计划时间发出请求，延迟从计划时间算起，
+   避免协调遗漏导致的延迟低估）
+
+输出每个场景的 RPS、p50/p95/p99 延迟和错误率，并写入 JSON 便于在提交之间比较。
+全程只访问本机端口，可以离线运行。
+
+用法：
+    python benchmarks/loadtest.py --concurrency 1,8,32 --rates 20,50 --duration 10
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+from pathlib import Path
+from typing import IO, Dict, List, Optional
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# 压测文本：按序号区分，避免命中翻译缓存
+SAMPLE_TEXTS = [
+    "人工智能正在改变我们的生活方式",
+    "今天天气很好，适合出去散步",
+    "这个翻译服务支持中英文互译并提取关键词",
+    "The quick brown fox jumps over the lazy dog",
+    "Performance testing helps us catch regressions before release",
+]
+
+
+def free_port() -> int:
+    """返回一个空闲的本机端口"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """最近秩法分位数，sorted_values 需要已排序"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(p * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def summarize(
+    name: str,
+    params: Dict[str, object],
+    latencies: List[float],
+    statuses: List[int],
+    elapsed: float,
+    dropped: int = 0
+) -> Dict[str, object]:
+    """汇总一个场景的结果
+
+    Args:
+        latencies: 实际发出的每个请求的延迟（秒）
+        statuses: 每个请求的状态码，连接错误、超时或未发出（dropped）记为 0
+        elapsed: 场景总耗时（秒）
+        dropped: 开环压测中因同时进行的请求达到上限而没有发出的请求数，计入错误但不计入延迟
+    """
+    ordered = sorted(latencies)
+    total = len(statuses)
+    errors = sum(1 for status in statuses if status != 200)
+    status_counts: Dict[str, int] = {}
+    for status in statuses:
+        status_counts[str(status)] = status_counts.get(str(status), 0) + 1
+    return {
+        "scenario": name,
+        **params,
+        "requests": total,
+        "errors": errors,
+        "error_rate": round(errors / total, 4) if total else 0.0,
+        "dropped": dropped,
+        "rps": round((total - errors) / elapsed, 2) if elapsed > 0 else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(ordered, 0.50) * 1000, 2),
+            "p95": round(percentile(ordered, 0.95) * 1000, 2),
+            "p99": round(percentile(ordered, 0.99) * 1000, 2),
+            "mean": round(sum(ordered) / len(ordered) * 1000, 2) if ordered else 0.0,
+            "max": round(ordered[-1] * 1000, 2) if ordered else 0.0,
+        },
+        "status_counts": status_counts,
+    }
+
+
+class RequestFactory:
+    """生成 /translate 请求体，hit_ratio 比例的请求重复使用已发送过的文本"""
+
+    def __init__(self, hit_ratio: float = 0.0, provider: str = "deepseek"):
+        self.hit_ratio = hit_ratio
+        self.provider = provider
+        self.counter = 0
+
+    def next(self) -> Dict[str, str]:
+        self.counter += 1
+        base = SAMPLE_TEXTS[self.counter % len(SAMPLE_TEXTS)]
+        # 用确定性的方式决定是否重复，保证多次运行可比
+        repeat = self.hit_ratio > 0 and (self.counter * 0.618033988749895) % 1.0 < self.hit_ratio
+        suffix = self.counter % len(SAMPLE_TEXTS) if repeat else self.counter
+        return {"text": f"{base} #{suffix}", "provider": self.provider}
+
+
+async def send(client: httpx.AsyncClient, body: Dict[str, str], started: float, latencies: List[float], statuses: List[int]) -> None:
+    try:
+        response = await client.post("/translate", json=body)
+        status = response.status_code
+    except httpx.HTTPError:
+        status = 0
+    latencies.append(time.perf_counter() - started)
+    statuses.append(status)
+
+
+async def run_closed_loop(client: httpx.AsyncClient, factory: RequestFactory, concurrency: int, duration: float) -> Dict[str, object]:
+    """固定并发的闭环压测"""
+    latencies: List[float] = []
+    statuses: List[int] = []
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            await send(client, factory.next(), time.perf_counter(), latencies, statuses)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize("closed_loop", {"concurrency": concurrency}, latencies, statuses, time.perf_counter() - start)
+
+
+async def run_open_loop(
+    client: httpx.AsyncClient,
+    factory: RequestFactory,
+    rate: float,
+    duration: float,
+    max_outstanding: int
+) -> Dict[str, object]:
+    """固定到达速率的开环压测
+
+    超过 max_outstanding 的请求不发出，单独计为 dropped（也计入错误）；它们没有延迟样本，
+    不会以 0 延迟拉低分位数，过载时 dropped 上升而不是延迟看起来变好
+    """
+    latencies: List[float] = []
+    statuses: List[int] = []
+    dropped = 0
+    tasks = set()
+    interval = 1.0 / rate
+    start = time.perf_counter()
+    count = int(rate * duration)
+
+    for i in range(count):
+        scheduled = start + i * interval
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if len(tasks) >= max_outstanding:
+            dropped += 1
+            statuses.append(0)
+            continue
+        # 延迟从计划发送时间算起
+        task = asyncio.ensure_future(send(client, factory.next(), scheduled, latencies, statuses))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    if tasks:
+        await asyncio.gather(*tasks)
+    return summarize("open_loop", {"rate": rate}, latencies, statuses, time.perf_counter() - start, dropped)
+
+
+def start_process(args: List[str], env: Dict[str, str], log: IO[bytes]) -> subprocess.Popen:
+    """启动子进程，stderr 写入 log 文件（不用管道，避免没人读取时写满缓冲区而阻塞子进程）"""
+    return subprocess.Popen(
+        [sys.executable] + args,
+        cwd=BACKEND_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=log
+    )
+
+
+def read_log(log: IO[bytes]) -> str:
+    log.seek(0)
+    return log.read().decode(errors="replace")
+
+
+def wait_ready(url: str, process: subprocess.Popen, log: IO[bytes], timeout: float = 20.0) -> None:
+    """轮询直到服务可以响应"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"进程提前退出: {read_log(log)}")
+        try:
+            httpx.get(url, timeout=1.0, trust_env=False)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    raise RuntimeError(f"等待 {url} 超时")
+
+
+def app_env(upstream_url: str, args) -> Dict[str, str]:
+    """被测服务的环境变量：两个提供商都指向桩上游，关闭磁盘缓存和访问日志"""
+    env = dict(os.environ)
+    env.update({
+        "DEEPSEEK_API_KEY": "bench",
+        "DEEPSEEK_BASE_URL": upstream_url,
+        "ALIYUN_API_KEY": "bench",
+        "ALIYUN_BASE_URL": upstream_url,
+        "TRANSLATION_DISK_CACHE_PATH": "",
+        "ACCESS_LOG_SAMPLE_RATE": "0",
+        "NO_PROXY": "127.0.0.1,localhost",
+    })
+    for item in args.env:
+        key, _, value = item.partition("=")
+        env[key] = value
+    return env
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run_scenarios(base_url: str, args) -> List[Dict[str, object]]:
+    max_connections = max(args.concurrency + [args.max_outstanding])
+    async with httpx.AsyncClient(
+        base_url=base_url,
+        timeout=args.timeout,
+        trust_env=False,
+        limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+    ) as client:
+        factory = RequestFactory(args.hit_ratio, args.provider)
+        if args.warmup > 0:
+            await run_closed_loop(client, factory, min(args.concurrency), args.warmup)
+
+        results = []
+        for concurrency in args.concurrency:
+            results.append(await run_closed_loop(client, factory, concurrency, args.duration))
+            print_result(results[-1])
+        for rate in args.rates:
+            results.append(await run_open_loop(client, factory, rate, args.duration, args.max_outstanding))
+            print_result(results[-1])
+        return results
+
+
+def print_result(result: Dict[str, object]) -> None:
+    label = f"c={result['concurrency']}" if "concurrency" in result else f"rate={result['rate']}/s"
+    latency = result["latency_ms"]
+    print(
+        f"{result['scenario']:<12} {label:<12} rps={result['rps']:<9} "
+        f"p50={latency['p50']:<9} p95={latency['p95']:<9} p99={latency['p99']:<9} "
+        f"errors={result['error_rate']:.2%}" + (f" dropped={result['dropped']}" if result["dropped"] else "")
+    )
+
+
+def parse_list(value: str, cast) -> list:
+    return [cast(item) for item in value.split(",") if item.strip()]
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="XP-Translator 端到端压测（离线）")
+    parser.add_argument("--concurrency", type=lambda v: parse_list(v, int), default=[1, 8, 32],
+                        help="闭环压测的并发数列表，逗号分隔")
+    parser.add_argument("--rates", type=lambda v: parse_list(v, float), default=[],
+                        help="开环压测的每秒请求数列表，逗号分隔")
+    parser.add_argument("--duration", type=float, default=10.0, help="每个场景的持续时间（秒）")
+    parser.add_argument("--warmup", type=float, default=2.0, help="预热时间（秒），不计入结果")
+    parser.add_argument("--upstream-latency", default="normal:200:25",
+                        help="桩上游的首 token 延迟分布（毫秒），如 fixed:200、lognormal:200:0.5")
+    parser.add_argument("--upstream-tokens-per-second", type=float, default=0.0,
+                        help="桩上游的输出速度，0 表示瞬间输出")
+    parser.add_argument("--upstream-error-rate", type=float, default=0.0, help="桩上游返回 500 的概率")
+    parser.add_argument("--upstream-rate-limit-rate", type=float, default=0.0, help="桩上游返回 429 的概率")
+    parser.add_argument("--hit-ratio", type=float, default=0.0, help="重复文本（可命中缓存）的请求比例")
+    parser.add_argument("--provider", default="deepseek")
+    parser.add_argument("--max-outstanding", type=int, default=1000, help="开环压测最多同时进行的请求数")
+    parser.add_argument("--timeout", type=float, default=30.0, help="单个请求的超时时间（秒）")
+    parser.add_argument("--workers", type=int, default=1, help="被测服务的 uvicorn worker 数")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="传给被测服务的额外环境变量，可重复")
+    parser.add_argument("--output", default=None,
+                        help="结果 JSON 路径，默认 benchmarks/results/<时间>-<提交>.json")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    upstream_port, app_port = free_port(), free_port()
+    upstream_url = f"http://127.0.0.1:{upstream_port}"
+    app_url = f"http://127.0.0.1:{app_port}"
+
+    upstream_log, app_log = tempfile.TemporaryFile(), tempfile.TemporaryFile()
+    upstream = start_process([
+        "-m", "benchmarks.fake_upstream",
+        "--port", str(upstream_port),
+        "--latency", args.upstream_latency,
+        "--tokens-per-second", str(args.upstream_tokens_per_second),
+        "--error-rate", str(args.upstream_error_rate),
+        "--rate-limit-rate", str(args.upstream_rate_limit_rate),
+        "--seed", "0",
+    ], dict(os.environ), upstream_log)
+    app = None
+    try:
+        wait_ready(f"{upstream_url}/docs", upstream, upstream_log)
+        app = start_process([
+            "-m", "uvicorn", "src.xp_translator.api:app",
+            "--host", "127.0.0.1", "--port", str(app_port),
+            "--workers", str(args.workers),
+            "--log-level", "warning", "--no-access-log",
+        ], app_env(upstream_url, args), app_log)
+        wait_ready(f"{app_url}/health", app, app_log)
+
+        results = asyncio.run(run_scenarios(app_url, args))
+    finally:
+        for process in (app, upstream):
+            if process is not None:
+                process.terminate()
+                process.wait(timeout=10)
+        upstream_log.close()
+        app_log.close()
+
+    commit = git_commit()
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "commit": commit,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "config": {
+                "duration": args.duration,
+                "warmup": args.warmup,
+                "upstream_latency": args.upstream_latency,
+                "upstream_tokens_per_second": args.upstream_tokens_per_second,
+                "upstream_error_rate": args.upstream_error_rate,
+                "upstream_rate_limit_rate": args.upstream_rate_limit_rate,
+                "hit_ratio": args.hit_ratio,
+                "provider": args.provider,
+                "workers": args.workers,
+                "env": args.env,
+            },
+        },
+        "results": results,
+    }
+
+    output = Path(args.output) if args.output else (
+        BACKEND_DIR / "benchmarks" / "results" / f"{time.strftime('%Y%m%d-%H%M%S')}-{commit or 'local'}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, ensure_ascii=False))
+    print(f"\n结果已保存到: {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
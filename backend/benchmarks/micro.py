@@ -0,0 +1,237 @@
+"""
+XP-Translator 热点函数微基准
+
+覆盖提示词构建、回复解析（含超长和格式错误的回复，以及 JSON 模式的回复）、MockAIClient 翻译、
+翻译记忆查找（精确和模糊匹配）、语言检测（与原先的正则对照）、请求模型校验和响应序列化。每个基准重复多轮取最快一轮的单次耗时，
+与保存的基线比较，超过阈值即视为性能回退。
+
+通过 tests/run_tests.py --benchmark 运行。
+"""
+
+import os
+import re
+import json
+import time
+import asyncio
+import platform
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+from unittest.mock import patch
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+# 基线随仓库提交；benchmarks/results/ 只存放压测结果，被 .gitignore 忽略
+DEFAULT_BASELINE = BACKEND_DIR / "benchmarks" / "micro_baseline.json"
+
+GOOD_RESPONSE = "翻译：Artificial intelligence is changing the way we live.\n关键词：[artificial intelligence, lifestyle, change]"
+LARGE_RESPONSE = "翻译：" + "This is a very long translated sentence. " * 500 + "\n关键词：[long, text, benchmark]"
+JSON_RESPONSE = json.dumps({"translation": "Artificial intelligence is changing the way we live.",
+                            "keywords": ["artificial intelligence", "lifestyle", "change"]})
+LARGE_JSON_RESPONSE = json.dumps({"translation": "This is a very long translated sentence.\n" * 500,
+                                  "keywords": ["long", "text", "benchmark"]})
+MALFORMED_RESPONSE = "Sure! Here is the translation you asked for:\n" + "Artificial intelligence changes lives. " * 50
+# 5000 字符的英文段落，中间夹一个汉字：旧的正则要扫描到该汉字，且会误判为中文
+MIXED_5000 = ("Cloud computing lowers the cost of running software. " * 100)[:2500] + "云" + \
+    ("Cloud computing lowers the cost of running software. " * 100)[:2499]
+CHINESE_5000 = ("人工智能正在改变我们的生活方式，云计算降低了运行软件的成本。" * 200)[:5000]
+# 翻译记忆的 10000 条占位后互不相同的句子：后半句相同，常见 n-gram 的倒排表很长
+MEMORY_SUBJECTS = ("客户", "团队", "经理", "供应商", "财务部", "设计师", "运营组", "法务部", "销售部", "工程师")
+MEMORY_TIMES = ("今天上午", "昨天下午", "本周一", "上周五", "月底前", "节后", "会后", "出差回来后", "升级后", "审批后")
+MEMORY_ACTIONS = ("提交", "审核", "更新", "确认", "退回", "归档", "修改", "补充", "签署", "转发")
+MEMORY_OBJECTS = ("合同", "报价单", "发票", "方案", "周报", "预算", "图纸", "订单", "需求文档", "测试报告")
+
+
+@dataclass
+class Benchmark:
+    """一个微基准：run(n) 连续执行 n 次被测操作"""
+    name: str
+    run: Callable[[int], None]
+    number: int = 1000
+
+
+def _repeat(func: Callable[[], object]) -> Callable[[int], None]:
+    def run(n: int) -> None:
+        for _ in range(n):
+            func()
+    return run
+
+
+def _repeat_async(loop: asyncio.AbstractEventLoop, factory: Callable[[], object]) -> Callable[[int], None]:
+    """在同一个事件循环里连续等待 n 个协程，不把创建事件循环的开销计入"""
+    async def repeat(n: int) -> None:
+        for _ in range(n):
+            await factory()
+
+    def run(n: int) -> None:
+        loop.run_until_complete(repeat(n))
+    return run
+
+
+def _memory_sentence(i: int) -> str:
+    """第 i 条翻译记忆原文（i < 10000 时占位后互不相同）"""
+    return (f"{MEMORY_SUBJECTS[i % 10]}{MEMORY_TIMES[i // 10 % 10]}{MEMORY_ACTIONS[i // 100 % 10]}了"
+            f"第{i}版{MEMORY_OBJECTS[i // 1000 % 10]}，请相关同事尽快查看并回复意见")
+
+
+def build_benchmarks(loop: asyncio.AbstractEventLoop) -> List[Benchmark]:
+    """构建所有微基准"""
+    from src.xp_translator.clients import DeepSeekClient, MockAIClient
+    from src.xp_translator.models import TranslationRequest, TranslationResponse
+    from src.xp_translator.translation_memory import TranslationMemory
+    from src.xp_translator.language import _detect, detect_language
+
+    # 只用到客户端的本地方法，不会发出网络请求
+    with patch.dict(os.environ, {"DEEPSEEK_API_KEY": "bench"}):
+        client = DeepSeekClient()
+    # 不模拟上游延迟，只测量本地计算开销
+    mock = MockAIClient(latency_ms=0)
+    memory = TranslationMemory(glossary=mock.glossary)
+    for i in range(10000):
+        memory.add(_memory_sentence(i), "zh_to_en", f"Version {i} of the document was updated, please review", [])
+    # 原先各客户端用于解析 auto 方向的正则，作为语言检测的对照
+    legacy_cjk = re.compile(r"[一-鿿]")
+    payload = {"text": "人工智能正在改变我们的生活方式", "direction": "zh_to_en", "provider": "deepseek"}
+    payload_json = json.dumps(payload, ensure_ascii=False)
+    response = TranslationResponse(
+        translation="Artificial intelligence is changing the way we live.",
+        keywords=["artificial intelligence", "lifestyle", "change"],
+        direction="zh_to_en",
+        provider="deepseek"
+    )
+
+    return [
+        Benchmark("prompt_build_zh_to_en", _repeat(
+            lambda: client._build_translation_prompt("人工智能正在改变我们的生活方式", "zh_to_en")), 20000),
+        Benchmark("prompt_build_auto", _repeat(
+            lambda: client._build_translation_prompt("Artificial intelligence is changing our lives", "auto")), 20000),
+        Benchmark("parse_response", _repeat(
+            lambda: client._parse_response(GOOD_RESPONSE, "zh_to_en", "人工智能正在改变我们的生活方式")), 20000),
+        Benchmark("parse_response_large", _repeat(
+            lambda: client._parse_response(LARGE_RESPONSE, "zh_to_en", "长文本")), 500),
+        Benchmark("parse_response_malformed", _repeat(
+            lambda: client._parse_response(MALFORMED_RESPONSE, "zh_to_en", "人工智能改变生活")), 2000),
+        Benchmark("parse_response_json", _repeat(lambda: client._parse_json_response(JSON_RESPONSE)), 20000),
+        Benchmark("parse_response_json_large", _repeat(lambda: client._parse_json_response(LARGE_JSON_RESPONSE)), 500),
+        Benchmark("mock_translate", _repeat_async(
+            loop, lambda: mock.translate_and_extract("你好世界，人工智能项目测试", "zh_to_en")), 5000),
+        # 只有数字不同，走精确匹配
+        Benchmark("memory_lookup_10k", _repeat(
+            lambda: memory.lookup(_memory_sentence(1234).replace("1234", "56789"), "zh_to_en")), 500),
+        # 多了句末的致谢，走 n-gram 模糊匹配
+        Benchmark("memory_lookup_10k_fuzzy", _repeat(
+            lambda: memory.lookup(_memory_sentence(1234) + "谢谢", "zh_to_en")), 500),
+        Benchmark("language_regex_5000", _repeat(lambda: legacy_cjk.search(MIXED_5000)), 2000),
+        Benchmark("language_detect_5000", _repeat(lambda: _detect(MIXED_5000)), 2000),
+        Benchmark("language_detect_5000_zh", _repeat(lambda: _detect(CHINESE_5000)), 2000),
+        Benchmark("language_detect_5000_cached", _repeat(lambda: detect_language(MIXED_5000)), 20000),
+        Benchmark("request_validate", _repeat(lambda: TranslationRequest.model_validate(payload)), 20000),
+        Benchmark("request_validate_json", _repeat(lambda: TranslationRequest.model_validate_json(payload_json)), 20000),
+        Benchmark("response_serialize", _repeat(response.model_dump_json), 20000),
+    ]
+
+
+def measure(benchmark: Benchmark, repeat: int = 5, scale: float = 1.0) -> float:
+    """执行 repeat 轮，返回最快一轮的单次耗时（纳秒）
+
+    取最快一轮可以排除调度和 GC 造成的噪声，更适合比较回退
+    """
+    number = max(1, int(benchmark.number * scale))
+    benchmark.run(max(1, number // 10))  # 预热
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        benchmark.run(number)
+        best = min(best, (time.perf_counter_ns() - start) / number)
+    return best
+
+
+def run_benchmarks(repeat: int = 5, scale: float = 1.0, only: Optional[List[str]] = None) -> Dict[str, float]:
+    """运行微基准，返回 {名称: 单次耗时纳秒}"""
+    loop = asyncio.new_event_loop()
+    try:
+        results = {}
+        for benchmark in build_benchmarks(loop):
+            if only and benchmark.name not in only:
+                continue
+            results[benchmark.name] = round(measure(benchmark, repeat, scale), 1)
+        return results
+    finally:
+        loop.close()
+
+
+def compare(results: Dict[str, float], baseline: Dict[str, float], threshold: float) -> List[Dict[str, object]]:
+    """与基线比较，ratio 超过 1 + threshold 的条目标记为回退"""
+    rows = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        ratio = current / previous if previous else None
+        rows.append({
+            "name": name,
+            "baseline_ns": previous,
+            "current_ns": current,
+            "ratio": round(ratio, 3) if ratio is not None else None,
+            "regressed": ratio is not None and ratio > 1 + threshold,
+        })
+    return rows
+
+
+def load_baseline(path: Path) -> Optional[Dict[str, object]]:
+    if not path.exists():
+        return None
+    return json.loads(path.read_text())
+
+
+def save_baseline(path: Path, results: Dict[str, float]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }, indent=2, ensure_ascii=False))
+
+
+def run_regression_gate(
+    baseline_path: Path = DEFAULT_BASELINE,
+    threshold: float = 0.25,
+    update_baseline: bool = False,
+    repeat: int = 5,
+    scale: float = 1.0
+) -> int:
+    """运行微基准并与基线比较
+
+    指定 update_baseline 时把本次结果保存为基线；否则没有基线，或任一基准比基线
+    慢超过 threshold 即返回 1（没有基线时不会悄悄写一个新的然后通过）
+    """
+    baseline = None if update_baseline else load_baseline(baseline_path)
+    if baseline is None and not update_baseline:
+        print(f"❌ 找不到基线: {baseline_path}，用 --update-baseline 生成")
+        return 1
+
+    results = run_benchmarks(repeat=repeat, scale=scale)
+    if update_baseline:
+        save_baseline(baseline_path, results)
+        for name, current in results.items():
+            print(f"  {name:<28} {current / 1000:>10.2f} µs")
+        print(f"\n基线已保存到: {baseline_path}")
+        return 0
+
+    if baseline["meta"].get("python") != platform.python_version():
+        print(f"⚠️  基线来自 Python {baseline['meta'].get('python')}，结果可能不可比")
+
+    rows = compare(results, baseline["results"], threshold)
+    print(f"{'基准':<30}{'基线 µs':>12}{'本次 µs':>12}{'比值':>8}")
+    for row in rows:
+        previous = f"{row['baseline_ns'] / 1000:.2f}" if row["baseline_ns"] else "-"
+        ratio = f"{row['ratio']:.2f}" if row["ratio"] is not None else "新增"
+        flag = "  ❌ 回退" if row["regressed"] else ""
+        print(f"  {row['name']:<28}{previous:>12}{row['current_ns'] / 1000:>12.2f}{ratio:>8}{flag}")
+
+    regressed = [row["name"] for row in rows if row["regressed"]]
+    if regressed:
+        print(f"\n❌ {len(regressed)} 个基准比基线慢超过 {threshold:.0%}: {', '.join(regressed)}")
+        return 1
+    print(f"\n✅ 所有基准都在基线的 {threshold:.0%} 以内")
+    return 0
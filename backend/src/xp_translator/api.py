@@ -2,21 +2,78 @@
 FastAPI 应用和路由定义
 """
 
-from fastapi import FastAPI, HTTPException
+import os
+import json
+import math
+import time
+import asyncio
+import xml.etree.ElementTree as ET
+from contextlib import asynccontextmanager
+from typing import Optional, Union
+
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from dotenv import load_dotenv
 
-from .models import TranslationRequest, TranslationResponse
-from .clients import create_ai_client
+from .models import (
+    TranslationRequest,
+    TranslationResponse,
+    BatchTranslationRequest,
+    BatchTranslationResponse,
+    TranslationDirection,
+    TokenEstimateResponse,
+    AIProvider
+)
+from .clients import client_registry, resolve_direction
+from .language import detect_language
+from .batch import gather_or_cancel, translate_items
+from .tokens import TokenBudgetExceeded, TokenEstimate, estimate_tokens
+from .segmentation import translate_chunked
+from .hedging import HedgedTranslator
+from .routing import ProviderRouter, NoHealthyProviderError
+from .limiter import QueueFullError
+from .retry import DeadlineExceeded, deadline_scope, no_deadline, within_deadline
+from .disconnect import ClientDisconnected, cancel_on_disconnect, iterate_until_disconnect
+from .cache import TranslationCache, DiskTranslationCache, make_cache_key
+from .prompts import FallbackReply
+from .singleflight import SingleFlight
+from .translation_memory import TranslationMemory
+from .tracing import Tracer, span
+from .logging_config import configure_logging, get_logger, AccessLogMiddleware
+from .metrics import registry as metrics_registry, RequestMetrics
 
 # 加载环境变量
 load_dotenv()
 
+# 结构化日志经由队列交给后台线程写出
+configure_logging()
+logger = get_logger("api")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：启动时创建各提供商客户端，关闭时释放连接池"""
+    client_registry.warm_up(provider.value for provider in AIProvider)
+    if disk_cache is not None:
+        # 后台打开磁盘缓存，不阻塞启动和首个请求
+        await disk_cache.start()
+    if translation_memory is not None:
+        await asyncio.get_running_loop().run_in_executor(None, translation_memory.load)
+    yield
+    if translation_memory is not None:
+        await asyncio.get_running_loop().run_in_executor(None, translation_memory.save)
+    if disk_cache is not None:
+        await disk_cache.aclose()
+    await client_registry.aclose()
+
+
 # 创建 FastAPI 应用
 app = FastAPI(
     title="XP Translator API",
     description="中文到英文翻译服务，提取关键词",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # 配置 CORS
@@ -28,7 +85,189 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# 注意：不再使用全局 ai_client，而是在每个请求中根据 provider 创建
+# 每个请求一行访问日志（ACCESS_LOG_SAMPLE_RATE 控制采样率，5xx 总是记录）
+app.add_middleware(AccessLogMiddleware, sample_rate=AccessLogMiddleware.sample_rate_from_env())
+
+# 注意：客户端由 client_registry 按 provider 缓存，所有请求复用同一连接池
+
+# 翻译结果缓存，键包含文本、方向、提供商和模型
+translation_cache = TranslationCache.from_env()
+# 可选的磁盘缓存层（SQLite），同一主机上的多个 worker 共享
+disk_cache = DiskTranslationCache.from_env()
+# 合并相同缓存键的并发上游调用
+inflight_translations = SingleFlight()
+# 可选的翻译记忆（TRANSLATION_MEMORY_ENABLED=true 时启用），近似重复的请求复用已有译文
+translation_memory = TranslationMemory.from_env()
+
+# 批量翻译时单次上游调用的提示词 token 预算和条目上限
+BATCH_MAX_PROMPT_TOKENS = int(os.getenv("BATCH_MAX_PROMPT_TOKENS", "2000"))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "20"))
+
+# 超过该估算 token 数的文本按句子切分后并发翻译
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "300"))
+CHUNK_CONCURRENCY = int(os.getenv("CHUNK_CONCURRENCY", "4"))
+
+# 请求的默认截止时间（秒，0 表示不设截止时间），X-Request-Timeout 请求头可以覆盖，但不超过上限
+REQUEST_TIMEOUT_SECONDS = float(os.getenv("REQUEST_TIMEOUT_SECONDS", "60"))
+REQUEST_TIMEOUT_MAX_SECONDS = float(os.getenv("REQUEST_TIMEOUT_MAX_SECONDS", "300"))
+
+# 按熔断器状态在提供商之间路由请求
+provider_router = ProviderRouter(client_registry)
+
+# 可选的对冲请求（HEDGING_ENABLED=true 时启用）
+hedged_translator = HedgedTranslator.from_env()
+
+# 请求追踪（TRACING_ENABLED=true 时启用），最近的追踪保存在环形缓冲区中
+tracer = Tracer.from_env()
+
+
+def _cache_key(client, text: str, direction: str) -> str:
+    """缓存键：按生成译文的客户端的提供商和模型区分"""
+    return make_cache_key(text, direction, client.provider, client.model)
+
+
+async def _lookup_cache(cache_key: str):
+    """依次查询内存缓存和磁盘缓存，磁盘命中时回填内存缓存"""
+    cached = translation_cache.get(cache_key)
+    if cached is None and disk_cache is not None:
+        cached = await disk_cache.get(cache_key)
+        if cached is not None:
+            translation_cache.set(cache_key, *cached)
+    return cached
+
+
+async def _store_cache(cache_key: str, translation: str, keywords):
+    """将翻译结果写入各级缓存"""
+    translation_cache.set(cache_key, translation, keywords)
+    if disk_cache is not None:
+        await disk_cache.set(cache_key, translation, keywords)
+
+
+def _lookup_memory(text: str, direction: str):
+    """查询翻译记忆，返回 (translation, keywords) 或 None"""
+    if translation_memory is None:
+        return None
+    hit = translation_memory.lookup(text, direction)
+    return (hit.translation, hit.keywords) if hit is not None else None
+
+
+def _remember(client, text: str, direction: str, translation: str, keywords):
+    """把上游翻译结果写入翻译记忆（降级的模拟客户端的结果不写入）"""
+    if translation_memory is not None and client.provider != "mock":
+        translation_memory.add(text, direction, translation, list(keywords))
+
+
+def _build_response(request: TranslationRequest, translation: str, keywords, provider: str) -> TranslationResponse:
+    """构建翻译响应；auto 方向返回实际使用的方向和检测到的原文语言"""
+    direction = request.direction
+    detected_language = None
+    if direction == TranslationDirection.AUTO:
+        detected_language = detect_language(request.text).language
+        direction = TranslationDirection(resolve_direction(request.text, direction.value))
+    return TranslationResponse(
+        translation=translation,
+        keywords=keywords,
+        direction=direction,
+        provider=provider,
+        detected_language=detected_language
+    )
+
+
+async def _translate_with_client(ai_client, text: str, direction: str):
+    """调用 AI 服务翻译文本，长文本按句子切分后并发翻译"""
+    if estimate_tokens(text) > CHUNK_MAX_TOKENS:
+        return await translate_chunked(
+            ai_client,
+            text,
+            resolve_direction(text, direction),
+            max_tokens=CHUNK_MAX_TOKENS,
+            concurrency=CHUNK_CONCURRENCY
+        )
+    return await ai_client.translate_and_extract(text, direction=direction)
+
+
+async def _translate_upstream(provider: str, text: str, direction: str):
+    """按提供商健康状况调用上游翻译
+    
+    熔断打开的提供商被跳过，调用失败时切换到下一个健康的提供商；
+    启用对冲时主提供商过慢会向下一个健康的提供商发出第二个请求。
+    
+    Returns:
+        ((translation, keywords), 实际返回结果的提供商)；回复格式不完整、用了占位结果时
+        前者为 FallbackReply
+    """
+    routes = provider_router.route(provider)
+    if not routes:
+        raise NoHealthyProviderError(provider_router.retry_after())
+    
+    async def translate(client):
+        return await _translate_with_client(client, text, direction)
+    
+    if hedged_translator is not None and len(routes) >= 2:
+        (primary, primary_client), (secondary, secondary_client) = routes[:2]
+        return await hedged_translator.run(
+            primary,
+            lambda: provider_router.call(primary, primary_client, translate),
+            secondary,
+            lambda: provider_router.call(secondary, secondary_client, translate)
+        )
+    return await provider_router.call_with_failover(routes, translate)
+
+
+# 各接口的请求指标按 (endpoint, outcome) 提前绑定
+request_metrics = RequestMetrics(
+    ("translate", "batch", "stream"),
+    ("success", "cache_hit", "memory_hit", "error", "unavailable", "rejected", "timeout", "cancelled")
+)
+
+
+def _record_request(endpoint: str, provider: str, model: str, direction: str, outcome: str, started: float):
+    """记录一次请求的结果和耗时"""
+    request_metrics.record(endpoint, provider, model, direction, outcome, time.perf_counter() - started)
+
+
+def _unavailable(error: Union[NoHealthyProviderError, QueueFullError]) -> HTTPException:
+    """所有提供商熔断或排队已满时返回 503，并通过 Retry-After 提示恢复时间"""
+    return HTTPException(
+        status_code=503,
+        detail=f"翻译服务暂时不可用: {str(error)}",
+        headers={"Retry-After": str(max(1, math.ceil(error.retry_after)))}
+    )
+
+
+def _request_timeout(http_request: Request) -> Optional[float]:
+    """请求的截止时间（秒）：取 X-Request-Timeout 请求头，缺省时使用 REQUEST_TIMEOUT_SECONDS"""
+    header = http_request.headers.get("X-Request-Timeout")
+    if header is None:
+        return REQUEST_TIMEOUT_SECONDS or None
+    try:
+        seconds = float(header)
+    except ValueError:
+        seconds = math.nan
+    if not 0 < seconds < math.inf:
+        raise HTTPException(status_code=400, detail="X-Request-Timeout 必须是正数（秒）")
+    return min(seconds, REQUEST_TIMEOUT_MAX_SECONDS)
+
+
+def _timed_out(error: DeadlineExceeded) -> HTTPException:
+    """请求超过截止时间时返回 504"""
+    return HTTPException(status_code=504, detail=f"翻译服务超时: {str(error)}")
+
+
+def _client_gone(error: ClientDisconnected) -> HTTPException:
+    """客户端已断开时的响应（499，不会被收到，只出现在访问日志中）"""
+    return HTTPException(status_code=499, detail=str(error))
+
+
+def _check_budget(ai_client, request: TranslationRequest, chunk_tokens: Optional[int]) -> TokenEstimate:
+    """在调用上游之前检查 token 预算，超出时抛出 TokenBudgetExceeded"""
+    direction = resolve_direction(request.text, request.direction.value)
+    return ai_client.token_budget.check(request.text, direction, chunk_tokens)
+
+
+def _too_large(error: TokenBudgetExceeded) -> HTTPException:
+    """输入超出 token 预算时返回 413"""
+    return HTTPException(status_code=413, detail=f"输入超出 token 预算: {str(error)}")
 
 
 @app.get("/")
@@ -39,7 +278,14 @@ async def root():
         "version": "1.0.0",
         "endpoints": {
             "POST /translate": "翻译中文文本并提取关键词",
-            "GET /health": "健康检查"
+            "POST /translate/batch": "批量翻译多条文本",
+            "POST /translate/stream": "以 SSE 流式返回翻译结果",
+            "POST /estimate": "估算翻译请求的 token 用量和 max_tokens",
+            "GET /health": "健康检查",
+            "GET /metrics": "Prometheus 指标",
+            "GET /debug/traces": "最近的请求追踪",
+            "GET /translation-memory/export": "以 TMX 格式导出翻译记忆",
+            "POST /translation-memory/import": "导入 TMX 格式的翻译记忆"
         }
     }
 
@@ -47,11 +293,55 @@ async def root():
 @app.get("/health")
 async def health_check():
     """健康检查接口"""
-    return {"status": "healthy", "service": "xp-translator"}
+    return {
+        "status": "healthy",
+        "service": "xp-translator",
+        "cache": translation_cache.stats(),
+        "disk_cache": disk_cache.stats() if disk_cache is not None else None,
+        "singleflight": inflight_translations.stats(),
+        "translation_memory": translation_memory.stats() if translation_memory is not None else None,
+        "hedging": hedged_translator.stats() if hedged_translator is not None else None,
+        "providers": provider_router.snapshot(),
+        "concurrency": {
+            provider: client.limiter.stats()
+            for provider, client in client_registry.items()
+            if getattr(client, "limiter", None) is not None
+        },
+        "rate_limits": {
+            provider: client.rate_limiter.stats()
+            for provider, client in client_registry.items()
+            if getattr(client, "rate_limiter", None) is not None
+        },
+        "token_budgets": {
+            provider: client.token_budget.stats()
+            for provider, client in client_registry.items()
+            if getattr(client, "token_budget", None) is not None
+        },
+        "retries": {
+            provider: client.retry_policy.stats()
+            for provider, client in client_registry.items()
+            if getattr(client, "retry_policy", None) is not None
+        }
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """以 Prometheus 文本格式导出指标"""
+    return PlainTextResponse(
+        metrics_registry.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+@app.get("/debug/traces")
+async def recent_traces(limit: int = 50):
+    """返回最近的请求追踪（最新的在前）"""
+    return {"enabled": tracer.enabled, "traces": tracer.recent(limit)}
 
 
 @app.post("/translate", response_model=TranslationResponse)
-async def translate_text(request: TranslationRequest):
+async def translate_text(request: TranslationRequest, response: Response, http_request: Request):
     """
     翻译文本并提取关键词
     
@@ -62,26 +352,401 @@ async def translate_text(request: TranslationRequest):
     返回:
     - **translation**: 翻译结果
     - **keywords**: 关键词列表（最多3个）
-    - **direction**: 实际使用的翻译方向
+    - **direction**: 实际使用的翻译方向（auto 时为检测后的方向）
+    - **detected_language**: direction=auto 时检测到的原文语言
+    
+    响应头 X-Cache 表示结果是否来自缓存（HIT / MISS），来自翻译记忆时为 TM；
+    启用追踪时响应头 Server-Timing 给出各阶段耗时。请求头 X-Request-Timeout（秒）
+    设置截止时间，上游重试不会超过它，超过时返回 504。客户端在结果返回之前断开时
+    取消上游调用（其他相同请求仍在等待时保留）
     """
-    if not request.text.strip():
-        raise HTTPException(status_code=400, detail="文本不能为空")
+    timeout = _request_timeout(http_request)
+    trace = tracer.start("translate")
+    with span("validate"):
+        if not request.text.strip():
+            tracer.finish(trace)
+            raise HTTPException(status_code=400, detail="文本不能为空")
     
+    started = time.perf_counter()
+    in_flight = request_metrics.in_flight["translate"]
+    in_flight.inc()
+    model = "unknown"
+    provider = request.provider
+    outcome = "error"
     try:
-        # 根据 provider 创建 AI 客户端
-        ai_client = create_ai_client(request.provider)
+        # 根据 provider 从注册表获取长期复用的 AI 客户端
+        with span("client"):
+            ai_client = client_registry.get(request.provider)
+        model = ai_client.model
+        if not client_registry.is_configured(request.provider):
+            # 请求的提供商未配置（例如缺少 API 密钥），注册表已降级为其他客户端，
+            # 缓存命中时也按实际的客户端报告
+            provider = ai_client.provider
         
-        # 调用 AI 服务进行翻译和关键词提取
-        translation, keywords = await ai_client.translate_and_extract(
-            request.text,
-            direction=request.direction.value
-        )
+        with span("budget"):
+            # 长文本会分段翻译，单次调用的输出只需容纳一个片段
+            _check_budget(ai_client, request, CHUNK_MAX_TOKENS)
         
-        return TranslationResponse(
-            translation=translation,
-            keywords=keywords,
-            direction=request.direction,
-            provider=request.provider
-        )
+        with span("cache"):
+            cache_key = _cache_key(ai_client, request.text, request.direction.value)
+            cached = await _lookup_cache(cache_key)
+        remembered = None
+        if cached is None:
+            with span("memory"):
+                remembered = _lookup_memory(request.text, request.direction.value)
+        # 缓存条目总是由 ai_client 生成（备用提供商的结果写在它自己的键下），
+        # 因此命中时的提供商就是 ai_client 的提供商
+        if cached is not None:
+            response.headers["X-Cache"] = "HIT"
+            translation, keywords = cached
+            outcome = "cache_hit"
+        elif remembered is not None:
+            response.headers["X-Cache"] = "TM"
+            translation, keywords = remembered
+            await _store_cache(cache_key, translation, keywords)
+            outcome = "memory_hit"
+        else:
+            response.headers["X-Cache"] = "MISS"
+            
+            async def translate_and_store():
+                # 调用 AI 服务进行翻译和关键词提取；共享任务不沿用首个请求的截止时间
+                with no_deadline():
+                    (translation, keywords), answered_by = reply = await _translate_upstream(
+                        request.provider,
+                        request.text,
+                        request.direction.value
+                    )
+                # 占位结果只返回给本次请求，不写入缓存和翻译记忆
+                if not isinstance(reply[0], FallbackReply):
+                    # 故障切换或对冲由备用提供商返回时，结果写在备用提供商的缓存键下，
+                    # 之后命中请求的提供商的键时不会把其他提供商的译文当作自己的返回
+                    answering_client = client_registry.get(answered_by)
+                    await _store_cache(
+                        _cache_key(answering_client, request.text, request.direction.value), translation, keywords
+                    )
+                    _remember(answering_client, request.text, request.direction.value, translation, keywords)
+                return translation, keywords, answered_by
+            
+            # 相同键的并发请求共享同一次上游调用；上游任务不带截止时间，
+            # 每个等待者在自己的截止时间到达或客户端断开时离开，最后一个等待者离开时上游调用被取消
+            with span("upstream"), deadline_scope(timeout):
+                translation, keywords, answered_by = await cancel_on_disconnect(
+                    http_request,
+                    within_deadline(inflight_translations.do(cache_key, translate_and_store))
+                )
+            # 实际返回结果的提供商，故障切换、对冲请求胜出或请求的提供商未配置时与请求中的不同；
+            # 与请求的提供商比较，而不是与注册表降级后的客户端比较
+            if answered_by != request.provider:
+                provider = answered_by
+                model = client_registry.get(answered_by).model
+            outcome = "success"
+        
+        return _build_response(request, translation, keywords, provider)
+    except TokenBudgetExceeded as e:
+        outcome = "rejected"
+        raise _too_large(e)
+    except (NoHealthyProviderError, QueueFullError) as e:
+        outcome = "unavailable"
+        raise _unavailable(e)
+    except DeadlineExceeded as e:
+        outcome = "timeout"
+        raise _timed_out(e)
+    except ClientDisconnected as e:
+        outcome = "cancelled"
+        raise _client_gone(e)
+    except Exception as e:
+        logger.warning("翻译服务错误", extra={"provider": provider, "error": str(e)})
+        raise HTTPException(status_code=500, detail=f"翻译服务错误: {str(e)}")
+    finally:
+        in_flight.dec()
+        _record_request("translate", provider, model, request.direction.value, outcome, started)
+        if trace is not None:
+            trace.attributes.update(provider=provider, outcome=outcome)
+            response.headers["Server-Timing"] = trace.server_timing()
+            tracer.finish(trace)
+
+
+@app.post("/translate/batch", response_model=BatchTranslationResponse)
+async def translate_batch(request: BatchTranslationRequest, http_request: Request):
+    """
+    批量翻译多条文本
+    
+    - **items**: 翻译条目列表，每个条目的格式与 POST /translate 的请求体相同
+    
+    同一提供商、同一翻译方向的条目会按 token 预算打包进少量上游调用；
+    完全相同的条目只翻译一次，已缓存的条目直接使用缓存结果。
+    请求头 X-Request-Timeout（秒）设置整个批量请求的截止时间。
+    
+    返回:
+    - **results**: 与请求条目一一对应的翻译结果
+    """
+    timeout = _request_timeout(http_request)
+    started = time.perf_counter()
+    in_flight = request_metrics.in_flight["batch"]
+    in_flight.inc()
+    outcome = "error"
+    cache_hits = set()
+    memory_hits = set()
+    # 缓存键 -> 实际返回结果的客户端（与请求的提供商不同时）
+    answered = {}
+    try:
+        results = {}
+        # (provider, 具体翻译方向) -> {缓存键: 条目}
+        pending = {}
+        item_keys = []
+        seen = set()
+        
+        # 任何条目超出预算时整个请求在调用上游之前被拒绝
+        for index, item in enumerate(request.items):
+            try:
+                _check_budget(client_registry.get(item.provider), item, None)
+            except TokenBudgetExceeded as e:
+                raise TokenBudgetExceeded(e.estimate, f"第 {index + 1} 条: {str(e)}")
+        
+        for item in request.items:
+            cache_key = _cache_key(client_registry.get(item.provider), item.text, item.direction.value)
+            item_keys.append(cache_key)
+            # 批次内完全相同的条目只处理一次
+            if cache_key in seen:
+                continue
+            seen.add(cache_key)
+            
+            cached = await _lookup_cache(cache_key)
+            if cached is not None:
+                results[cache_key] = cached
+                cache_hits.add(cache_key)
+                continue
+            
+            remembered = _lookup_memory(item.text, item.direction.value)
+            if remembered is not None:
+                results[cache_key] = remembered
+                memory_hits.add(cache_key)
+                await _store_cache(cache_key, *remembered)
+                continue
+            
+            group_key = (item.provider, resolve_direction(item.text, item.direction.value))
+            pending.setdefault(group_key, {})[cache_key] = item
+        
+        async def run_group(provider: str, direction: str, group: dict):
+            keys = list(group)
+            routes = provider_router.route(provider)
+            if not routes:
+                raise NoHealthyProviderError(provider_router.retry_after())
+            
+            async def translate(client):
+                return await translate_items(
+                    client,
+                    [group[key].text for key in keys],
+                    direction,
+                    max_prompt_tokens=BATCH_MAX_PROMPT_TOKENS,
+                    max_items=BATCH_MAX_ITEMS
+                )
+            
+            # 与单条翻译一样经过熔断器，调用失败时整组切换到下一个健康的提供商
+            translated, answered_by = await provider_router.call_with_failover(routes, translate)
+            batch_client = dict(routes)[answered_by]
+            # 备用提供商（熔断、故障切换或请求的提供商未配置）的结果写在它自己的缓存键下
+            rerouted = answered_by != provider
+            for key, reply in zip(keys, translated):
+                item = group[key]
+                translation, keywords = results[key] = reply
+                store_key = key
+                if rerouted:
+                    answered[key] = batch_client
+                    store_key = _cache_key(batch_client, item.text, item.direction.value)
+                # 占位结果只返回给本次请求，不写入缓存和翻译记忆
+                if not isinstance(reply, FallbackReply):
+                    await _store_cache(store_key, translation, keywords)
+                    _remember(batch_client, item.text, direction, translation, keywords)
+        
+        # 任一组失败时取消其余各组，不在请求返回 503/504 后继续占用上游容量
+        with deadline_scope(timeout):
+            await cancel_on_disconnect(http_request, within_deadline(gather_or_cancel(*(
+                run_group(provider, direction, group)
+                for (provider, direction), group in pending.items()
+            ))))
+        
+        outcome = "success"
+        return BatchTranslationResponse(results=[
+            _build_response(
+                item, results[key][0], list(results[key][1]),
+                answered[key].provider if key in answered else item.provider
+            )
+            for item, key in zip(request.items, item_keys)
+        ])
+    except TokenBudgetExceeded as e:
+        outcome = "rejected"
+        raise _too_large(e)
+    except (NoHealthyProviderError, QueueFullError) as e:
+        outcome = "unavailable"
+        raise _unavailable(e)
+    except DeadlineExceeded as e:
+        outcome = "timeout"
+        raise _timed_out(e)
+    except ClientDisconnected as e:
+        outcome = "cancelled"
+        raise _client_gone(e)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"翻译服务错误: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"翻译服务错误: {str(e)}")
+    finally:
+        in_flight.dec()
+        # 每个条目记录一次，耗时为整个批量请求的耗时（因预算被拒绝时还没有缓存键）
+        for index, item in enumerate(request.items):
+            key = item_keys[index] if index < len(item_keys) else None
+            item_outcome = outcome
+            if outcome == "success" and key in cache_hits:
+                item_outcome = "cache_hit"
+            elif outcome == "success" and key in memory_hits:
+                item_outcome = "memory_hit"
+            if key in answered:
+                provider, model = answered[key].provider, answered[key].model
+            else:
+                provider, model = item.provider, client_registry.get(item.provider).model
+            _record_request("batch", provider, model, item.direction.value, item_outcome, started)
+
+
+def _sse_event(event: str, data: dict) -> str:
+    """格式化一条 Server-Sent Events 消息"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.post("/translate/stream")
+async def translate_stream(request: TranslationRequest, http_request: Request):
+    """
+    以 Server-Sent Events 流式返回翻译结果
+    
+    请求体与 POST /translate 相同。事件流：
+    - **delta**: {"text": 新增的译文片段}，可能有多条
+    - **done**: 完整的 TranslationResponse（包含关键词）
+    - **error**: {"detail": 错误信息}
+    
+    请求头 X-Request-Timeout（秒）设置截止时间，超过时输出 error 事件；
+    客户端断开时取消上游的流式调用
+    """
+    timeout = _request_timeout(http_request)
+    ai_client = client_registry.get(request.provider)
+    try:
+        # 流式调用不分段，整段译文必须放进一次调用的 max_tokens
+        _check_budget(ai_client, request, None)
+    except TokenBudgetExceeded as e:
+        started = time.perf_counter()
+        _record_request("stream", request.provider, ai_client.model, request.direction.value, "rejected", started)
+        raise _too_large(e)
+    cache_key = _cache_key(ai_client, request.text, request.direction.value)
+    cached = await _lookup_cache(cache_key)
+    remembered = _lookup_memory(request.text, request.direction.value) if cached is None else None
+    
+    def done_event(translation: str, keywords, provider: str) -> str:
+        result = _build_response(request, translation, keywords, provider)
+        return _sse_event("done", result.model_dump(mode="json"))
+    
+    async def events():
+        started = time.perf_counter()
+        if cached is not None or remembered is not None:
+            translation, keywords = cached if cached is not None else remembered
+            if cached is None:
+                await _store_cache(cache_key, translation, keywords)
+            yield _sse_event("delta", {"text": translation})
+            yield done_event(translation, keywords, request.provider)
+            outcome = "cache_hit" if cached is not None else "memory_hit"
+            _record_request("stream", request.provider, ai_client.model, request.direction.value, outcome, started)
+            return
+        
+        in_flight = request_metrics.in_flight["stream"]
+        in_flight.inc()
+        outcome = "error"
+        provider, model = request.provider, ai_client.model
+        try:
+            stream_client = provider_router.select(request.provider)
+            store_key = cache_key
+            if stream_client is not ai_client:
+                # 请求的提供商熔断时由备用提供商输出，结果按备用提供商记录和缓存
+                provider, model = stream_client.provider, stream_client.model
+                store_key = _cache_key(stream_client, request.text, request.direction.value)
+            # 截止时间从开始输出事件时算起
+            with deadline_scope(timeout):
+                async for kind, payload in iterate_until_disconnect(
+                    http_request,
+                    stream_client.stream_translate(request.text, direction=request.direction.value)
+                ):
+                    if kind == "delta":
+                        yield _sse_event("delta", {"text": payload})
+                    else:
+                        translation, keywords = payload
+                        if not isinstance(payload, FallbackReply):
+                            await _store_cache(store_key, translation, keywords)
+                            _remember(stream_client, request.text, request.direction.value, translation, keywords)
+                        outcome = "success"
+                        yield done_event(translation, keywords, provider)
+        except (ClientDisconnected, asyncio.CancelledError) as e:
+            # 客户端已经离开，不再输出事件；服务器取消响应任务时继续向上传递
+            outcome = "cancelled"
+            if isinstance(e, asyncio.CancelledError):
+                raise
+        except Exception as e:
+            if isinstance(e, (NoHealthyProviderError, QueueFullError)):
+                outcome = "unavailable"
+            elif isinstance(e, DeadlineExceeded):
+                outcome = "timeout"
+            yield _sse_event("error", {"detail": f"翻译服务错误: {str(e)}"})
+        finally:
+            in_flight.dec()
+            _record_request("stream", provider, model, request.direction.value, outcome, started)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+            "X-Cache": "HIT" if cached is not None else ("TM" if remembered is not None else "MISS")
+        }
+    )
+
+
+@app.post("/estimate", response_model=TokenEstimateResponse)
+async def estimate(request: TranslationRequest, stream: bool = False):
+    """
+    估算翻译请求的 token 用量，不调用上游
+
+    请求体与 POST /translate 相同；stream=true 时按流式接口（不分段）估算。
+    within_budget 为 false 的请求会被翻译接口以 413 拒绝。
+    """
+    ai_client = client_registry.get(request.provider)
+    direction = resolve_direction(request.text, request.direction.value)
+    result = ai_client.token_budget.estimate(request.text, direction, None if stream else CHUNK_MAX_TOKENS)
+    return TokenEstimateResponse(
+        **result._asdict(),
+        provider=ai_client.provider,
+        max_input_tokens=ai_client.token_budget.max_input_tokens,
+        max_output_tokens=ai_client.token_budget.max_output_tokens
+    )
+
+
+def _require_memory() -> TranslationMemory:
+    if translation_memory is None:
+        raise HTTPException(status_code=404, detail="翻译记忆未启用（TRANSLATION_MEMORY_ENABLED=true）")
+    return translation_memory
+
+
+@app.get("/translation-memory/export")
+async def export_translation_memory():
+    """以 TMX 1.4 格式导出翻译记忆"""
+    memory = _require_memory()
+    return Response(
+        content=memory.export_tmx(),
+        media_type="application/x-tmx+xml",
+        headers={"Content-Disposition": 'attachment; filename="translation-memory.tmx"'}
+    )
+
+
+@app.post("/translation-memory/import")
+async def import_translation_memory(request: Request):
+    """导入请求体中的 TMX 文档，返回导入的条目数"""
+    memory = _require_memory()
+    body = await request.body()
+    try:
+        imported = memory.import_tmx(body.decode("utf-8"))
+    except (ET.ParseError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=f"无效的 TMX 文档: {str(e)}")
+    return {"imported": imported, "entries": len(memory)}
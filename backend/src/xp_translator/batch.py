@@ -0,0 +1,177 @@
+"""
+批量翻译模块
+将多条短文本打包进一个带编号的提示词，减少提示词开销和网络往返次数
+"""
+
+import re
+import asyncio
+from typing import Awaitable, Dict, List, Optional, Tuple, TypeVar
+
+# 批量提示词与单条提示词共用 prompts 模块中的固定前缀，token 估算移到 tokens 模块，
+# 这里保留导出以兼容原有调用方
+from .prompts import build_batch_prompt  # noqa: F401
+from .tokens import estimate_tokens
+from .limiter import QueueFullError
+from .retry import DeadlineExceeded
+from .routing import NoHealthyProviderError
+
+# 单次上游调用的默认提示词 token 预算和条目上限
+DEFAULT_MAX_PROMPT_TOKENS = 2000
+DEFAULT_MAX_ITEMS = 20
+
+# 批量提示词中固定说明部分的 token 估算
+PROMPT_OVERHEAD_TOKENS = 150
+# 每个条目的编号、换行和回复格式开销
+ITEM_OVERHEAD_TOKENS = 8
+
+T = TypeVar("T")
+
+_ITEM_HEADER = re.compile(r"^\s*\[(\d+)\]\s*$", re.MULTILINE)
+
+
+def pack_batches(
+    texts: List[str],
+    max_prompt_tokens: int = DEFAULT_MAX_PROMPT_TOKENS,
+    max_items: int = DEFAULT_MAX_ITEMS
+) -> List[List[int]]:
+    """按 token 预算和条目上限将文本下标分组
+
+    超出预算的单条文本独占一组，由调用方单独翻译。
+    """
+    batches: List[List[int]] = []
+    current: List[int] = []
+    used = PROMPT_OVERHEAD_TOKENS
+
+    for index, text in enumerate(texts):
+        cost = estimate_tokens(text) + ITEM_OVERHEAD_TOKENS
+        if current and (used + cost > max_prompt_tokens or len(current) >= max_items):
+            batches.append(current)
+            current = []
+            used = PROMPT_OVERHEAD_TOKENS
+        current.append(index)
+        used += cost
+
+    if current:
+        batches.append(current)
+    return batches
+
+
+def parse_batch_response(content: str, count: int) -> Dict[int, Tuple[str, List[str]]]:
+    """解析带编号的批量回复
+
+    Args:
+        content: 模型返回的内容
+        count: 批次中的条目数量
+
+    Returns:
+        条目下标（从 0 开始）到 (translation, keywords) 的映射；
+        无法解析的条目不会出现在结果中
+    """
+    results: Dict[int, Tuple[str, List[str]]] = {}
+    headers = list(_ITEM_HEADER.finditer(content))
+
+    for position, header in enumerate(headers):
+        number = int(header.group(1))
+        if not 1 <= number <= count or (number - 1) in results:
+            continue
+        end = headers[position + 1].start() if position + 1 < len(headers) else len(content)
+        parsed = _parse_item_block(content[header.end():end])
+        if parsed is not None:
+            results[number - 1] = parsed
+
+    return results
+
+
+def _parse_item_block(block: str) -> Optional[Tuple[str, List[str]]]:
+    """解析单个条目的 翻译/关键词 段落，翻译可以跨多行"""
+    translation_lines: List[str] = []
+    keywords: List[str] = []
+    in_translation = False
+
+    for line in block.strip().split("\n"):
+        stripped = line.strip()
+        if stripped.startswith("翻译："):
+            translation_lines = [stripped[len("翻译："):].strip()]
+            in_translation = True
+        elif stripped.startswith("关键词："):
+            keywords_str = stripped[len("关键词："):].strip()
+            if keywords_str.startswith("[") and keywords_str.endswith("]"):
+                keywords_str = keywords_str[1:-1]
+            keywords = [k.strip() for k in keywords_str.split(",") if k.strip()]
+            in_translation = False
+        elif in_translation:
+            translation_lines.append(stripped)
+
+    translation = "\n".join(translation_lines).strip()
+    if not translation:
+        return None
+    return translation, keywords[:3]
+
+
+async def gather_or_cancel(*awaitables: Awaitable[T]) -> List[T]:
+    """与 asyncio.gather 相同，但任一项抛出异常时取消其余各项，等它们结束后再抛出该异常
+
+    asyncio.gather 在一项失败后不会取消其他项，请求已经返回 503/504 时它们仍在占用上游容量
+    """
+    tasks = [asyncio.ensure_future(awaitable) for awaitable in awaitables]
+    if not tasks:
+        return []
+    try:
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+    finally:
+        # 调用方被取消时一并取消
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+    if pending:
+        await asyncio.wait(pending)
+        for task in pending:
+            if not task.cancelled():
+                task.exception()
+    for task in tasks:
+        if task in done and not task.cancelled() and task.exception() is not None:
+            raise task.exception()
+    return [task.result() for task in tasks]
+
+
+async def translate_items(
+    client,
+    texts: List[str],
+    direction: str,
+    max_prompt_tokens: int = DEFAULT_MAX_PROMPT_TOKENS,
+    max_items: int = DEFAULT_MAX_ITEMS
+) -> List[Tuple[str, List[str]]]:
+    """批量翻译一组相同方向的文本
+
+    先按 token 预算打包并发调用 client.translate_batch，
+    解析失败或批量调用失败的条目再逐条调用 translate_and_extract 重试。
+    排队已满、截止时间已到或没有健康的提供商时直接抛出，不再拆成逐条调用放大上游负载；
+    任一调用抛出时取消其余仍在进行的调用。
+    """
+    results: List[Optional[Tuple[str, List[str]]]] = [None] * len(texts)
+    batches = pack_batches(texts, max_prompt_tokens, max_items)
+
+    async def run_batch(indices: List[int]) -> None:
+        if len(indices) == 1:
+            return
+        try:
+            parsed = await client.translate_batch([texts[i] for i in indices], direction)
+        except (QueueFullError, DeadlineExceeded, NoHealthyProviderError):
+            raise
+        except Exception:
+            # 整批失败时交给下面的逐条重试
+            return
+        for position, result in enumerate(parsed):
+            if result is not None:
+                results[indices[position]] = result
+
+    await gather_or_cancel(*(run_batch(indices) for indices in batches))
+
+    missing = [i for i, result in enumerate(results) if result is None]
+    retried = await gather_or_cancel(
+        *(client.translate_and_extract(texts[i], direction) for i in missing)
+    )
+    for index, result in zip(missing, retried):
+        results[index] = result
+
+    return results
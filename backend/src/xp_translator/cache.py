@@ -0,0 +1,344 @@
+"""
+翻译结果缓存模块
+进程内 LRU 缓存，按字节数限制容量，并支持条目过期时间（TTL）；
+以及基于 SQLite 的持久化缓存层，供同一主机上的多个 worker 进程共享
+"""
+
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from .logging_config import get_logger
+
+logger = get_logger("cache")
+
+# 每个条目除文本外的固定开销估算（OrderedDict 节点、元组、字符串对象头等）
+ENTRY_OVERHEAD_BYTES = 200
+# 磁盘缓存压缩时每批删除的条目数，批与批之间释放锁，读写不会被整个压缩过程阻塞
+COMPACTION_BATCH_SIZE = 500
+
+
+def normalize_text(text: str) -> str:
+    """规范化缓存键中的文本：统一全角/半角字符并折叠空白"""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+def make_cache_key(text: str, direction: str, provider: str, model: str) -> str:
+    """根据规范化文本、翻译方向、提供商和模型名称生成缓存键"""
+    return "\x1f".join((direction, provider, model, normalize_text(text)))
+
+
+class TranslationCache:
+    """带 TTL 的字节容量 LRU 翻译缓存
+
+    缓存值为 (translation, keywords)。容量超过 max_bytes 时从最久未使用的
+    条目开始淘汰；过期条目在读取时惰性删除。
+    """
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024, ttl: float = 3600.0):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        # key -> (expires_at, size, translation, keywords)
+        self._entries: "OrderedDict[str, Tuple[float, int, str, Tuple[str, ...]]]" = OrderedDict()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @classmethod
+    def from_env(cls) -> "TranslationCache":
+        """从环境变量创建缓存实例"""
+        return cls(
+            max_bytes=int(os.getenv("TRANSLATION_CACHE_MAX_BYTES", str(32 * 1024 * 1024))),
+            ttl=float(os.getenv("TRANSLATION_CACHE_TTL", "3600"))
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0 and self.ttl > 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Tuple[str, List[str]]]:
+        """读取缓存，命中时将条目移到 LRU 队尾"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, size, translation, keywords = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.current_bytes -= size
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return translation, list(keywords)
+
+    def set(self, key: str, translation: str, keywords: List[str]) -> None:
+        """写入缓存，必要时淘汰最久未使用的条目"""
+        if not self.enabled:
+            return
+
+        size = self._entry_size(key, translation, keywords)
+        if size > self.max_bytes:
+            return
+
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.current_bytes -= old[1]
+
+        self._entries[key] = (time.monotonic() + self.ttl, size, translation, tuple(keywords))
+        self.current_bytes += size
+
+        while self.current_bytes > self.max_bytes:
+            _, (_, evicted_size, _, _) = self._entries.popitem(last=False)
+            self.current_bytes -= evicted_size
+            self.evictions += 1
+
+    def clear(self) -> None:
+        """清空缓存（统计计数保留）"""
+        self._entries.clear()
+        self.current_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        """返回缓存统计信息"""
+        return {
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+    @staticmethod
+    def _entry_size(key: str, translation: str, keywords: List[str]) -> int:
+        size = ENTRY_OVERHEAD_BYTES + len(key.encode("utf-8")) + len(translation.encode("utf-8"))
+        for keyword in keywords:
+            size += len(keyword.encode("utf-8"))
+        return size
+
+
+class DiskTranslationCache:
+    """基于 SQLite（WAL 模式）的持久化翻译缓存
+
+    同一主机上的多个 uvicorn worker 共享同一个数据库文件，重启后缓存依然有效。
+    数据库在后台线程中打开，打开完成前的读写直接视为未命中/跳过，
+    因此不会阻塞首个请求。后台任务定期清理过期条目并按容量淘汰；
+    打开或压缩失败（路径不可写、数据库被锁定等）时记录日志，下一个周期重试。
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int = 256 * 1024 * 1024,
+        ttl: float = 7 * 24 * 3600.0,
+        compaction_interval: float = 300.0
+    ):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.compaction_interval = compaction_interval
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self.compactions = 0
+        self.errors = 0
+
+    @classmethod
+    def from_env(cls) -> Optional["DiskTranslationCache"]:
+        """从环境变量创建实例，未配置 TRANSLATION_DISK_CACHE_PATH 时返回 None"""
+        path = os.getenv("TRANSLATION_DISK_CACHE_PATH", "")
+        if not path:
+            return None
+        return cls(
+            path=path,
+            max_bytes=int(os.getenv("TRANSLATION_DISK_CACHE_MAX_BYTES", str(256 * 1024 * 1024))),
+            ttl=float(os.getenv("TRANSLATION_DISK_CACHE_TTL", str(7 * 24 * 3600))),
+            compaction_interval=float(os.getenv("TRANSLATION_DISK_CACHE_COMPACT_INTERVAL", "300"))
+        )
+
+    @property
+    def ready(self) -> bool:
+        return self._conn is not None
+
+    async def start(self) -> None:
+        """启动后台任务：打开数据库并定期压缩，不等待其完成"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            # 尚未打开时（包括上次打开失败）先打开，之后每个周期压缩一次
+            opening = self._conn is None
+            try:
+                await loop.run_in_executor(None, self.open if opening else self.compact)
+            except Exception as e:
+                self.errors += 1
+                logger.warning(
+                    "打开磁盘缓存失败，稍后重试" if opening else "压缩磁盘缓存失败，稍后重试",
+                    extra={"path": self.path, "error": str(e)}
+                )
+            await asyncio.sleep(self.compaction_interval)
+
+    def open(self) -> None:
+        """打开（必要时创建）数据库文件"""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS translations ("
+                "key TEXT PRIMARY KEY, translation TEXT NOT NULL, keywords TEXT NOT NULL, "
+                "size INTEGER NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_translations_accessed ON translations (accessed_at)")
+        except Exception:
+            conn.close()
+            raise
+        with self._lock:
+            self._conn = conn
+
+    async def get(self, key: str) -> Optional[Tuple[str, List[str]]]:
+        """读取缓存；数据库尚未就绪时直接返回未命中"""
+        if self._conn is None:
+            self.misses += 1
+            return None
+        result = await asyncio.get_running_loop().run_in_executor(None, self._get, key)
+        if result is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return result
+
+    async def set(self, key: str, translation: str, keywords: List[str]) -> None:
+        """写入缓存；数据库尚未就绪时跳过"""
+        if self._conn is None or self.max_bytes <= 0:
+            return
+        await asyncio.get_running_loop().run_in_executor(None, self._set, key, translation, keywords)
+
+    def _get(self, key: str) -> Optional[Tuple[str, List[str]]]:
+        now = time.time()
+        with self._lock:
+            if self._conn is None:
+                return None
+            row = self._conn.execute(
+                "SELECT translation, keywords, expires_at, accessed_at FROM translations WHERE key = ?",
+                (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            translation, keywords, expires_at, accessed_at = row
+            if expires_at <= now:
+                self._conn.execute("DELETE FROM translations WHERE key = ?", (key,))
+                return None
+            # 访问时间只需粗粒度更新，避免每次读取都产生一次写入
+            if now - accessed_at > 60:
+                self._conn.execute("UPDATE translations SET accessed_at = ? WHERE key = ?", (now, key))
+        return translation, json.loads(keywords)
+
+    def _set(self, key: str, translation: str, keywords: List[str]) -> None:
+        now = time.time()
+        keywords_json = json.dumps(keywords, ensure_ascii=False)
+        size = ENTRY_OVERHEAD_BYTES + len(key.encode("utf-8")) + len(translation.encode("utf-8")) + len(keywords_json.encode("utf-8"))
+        with self._lock:
+            if self._conn is None:
+                return
+            self._conn.execute(
+                "INSERT OR REPLACE INTO translations (key, translation, keywords, size, expires_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, translation, keywords_json, size, now + self.ttl, now)
+            )
+        self.writes += 1
+
+    def compact(self) -> None:
+        """删除过期条目，超过容量时按最久未访问淘汰，并截断 WAL 文件
+
+        每批最多删除 COMPACTION_BATCH_SIZE 条，每批单独持有锁，其间的读写可以穿插进行
+        """
+        now = time.time()
+        while True:
+            with self._lock:
+                if self._conn is None:
+                    return
+                deleted = self._conn.execute(
+                    "DELETE FROM translations WHERE key IN "
+                    "(SELECT key FROM translations WHERE expires_at <= ? LIMIT ?)",
+                    (now, COMPACTION_BATCH_SIZE)
+                ).rowcount
+            if deleted < COMPACTION_BATCH_SIZE:
+                break
+
+        with self._lock:
+            if self._conn is None:
+                return
+            excess = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM translations").fetchone()[0] - self.max_bytes
+        while excess > 0:
+            with self._lock:
+                if self._conn is None:
+                    return
+                # accessed_at 有索引，每批只读取最久未访问的若干条
+                victims = []
+                for key, size in self._conn.execute(
+                    "SELECT key, size FROM translations ORDER BY accessed_at LIMIT ?", (COMPACTION_BATCH_SIZE,)
+                ):
+                    victims.append((key,))
+                    excess -= size
+                    if excess <= 0:
+                        break
+                if not victims:
+                    break
+                self._conn.executemany("DELETE FROM translations WHERE key = ?", victims)
+            self.evictions += len(victims)
+
+        with self._lock:
+            if self._conn is None:
+                return
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self.compactions += 1
+
+    async def aclose(self) -> None:
+        """停止后台任务并关闭数据库连接"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def stats(self) -> Dict[str, int]:
+        """返回磁盘缓存统计信息"""
+        return {
+            "ready": self.ready,
+            "hits": self.hits,
+            "misses": self.misses,
+            "writes": self.writes,
+            "evictions": self.evictions,
+            "compactions": self.compactions,
+            "errors": self.errors,
+        }
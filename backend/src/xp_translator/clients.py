@@ -4,9 +4,118 @@ AI 客户端模块
 """
 
 import os
+import re
+import time
 import asyncio
-from typing import List, Optional
-from openai import OpenAI
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+from .batch import parse_batch_response
+from .tokens import TokenBudget, estimate_tokens
+from .glossary import Glossary
+from .prompts import (
+    OUTPUT_FORMATS, FallbackReply, build_messages, build_translation_prompt, build_batch_prompt, parse_json_reply, parse_reply,
+    resolve_direction
+)
+from .limiter import AdaptiveLimiter, QueueFullError
+from .ratelimit import ProviderRateLimiter
+from .retry import DeadlineExceeded, RetryPolicy, remaining
+from .logging_config import get_logger
+from .tracing import span
+from .metrics import (
+    UPSTREAM_DURATION, UPSTREAM_IN_FLIGHT, UPSTREAM_TOKENS, UPSTREAM_TRUNCATIONS, PARSE_FALLBACKS, REPLY_PARSES,
+    UPSTREAM_RETRIES, UPSTREAM_CANCELLED
+)
+
+logger = get_logger("clients")
+
+
+class ReplyFormatError(Exception):
+    """JSON 模式下模型回复不符合约定格式"""
+
+
+class IncrementalResponseParser:
+    """流式回复的增量解析器（_parse_response 的增量版本）
+    
+    逐块接收模型输出，在 翻译： 段落到达时立即返回新增的译文片段，
+    遇到 关键词： 段落后停止输出译文。可能是 关键词： 前缀的行尾和
+    行尾空白会暂缓输出，因此所有片段拼接后与最终译文一致。
+    """
+    
+    TRANSLATION_PREFIX = "翻译："
+    KEYWORDS_PREFIX = "关键词："
+    
+    def __init__(self):
+        self.content = ""
+        self._start = -1
+        self._end = -1
+        self._emitted = 0
+    
+    def feed(self, chunk: str) -> str:
+        """追加一段模型输出，返回可以安全输出的新增译文片段"""
+        self.content += chunk
+        if self._end >= 0:
+            return ""
+        
+        if self._start < 0:
+            index = self._find_line_prefix(self.TRANSLATION_PREFIX, 0)
+            if index < 0:
+                return ""
+            self._start = index + len(self.TRANSLATION_PREFIX)
+        
+        keywords_index = self._find_line_prefix(self.KEYWORDS_PREFIX, self._start)
+        if keywords_index >= 0:
+            self._end = keywords_index
+            safe_end = keywords_index
+        else:
+            safe_end = len(self.content)
+            last_newline = self.content.rfind("\n", self._start)
+            if last_newline >= 0:
+                tail = self.content[last_newline + 1:].lstrip()
+                if self.KEYWORDS_PREFIX.startswith(tail):
+                    # 最后一行可能是尚未完整到达的 关键词： 前缀
+                    safe_end = last_newline
+        
+        translation = self.content[self._start:safe_end].strip()
+        delta = translation[self._emitted:]
+        self._emitted = len(translation)
+        return delta
+    
+    def finish(self) -> Tuple[str, List[str]]:
+        """流结束后返回完整的译文和关键词（解析失败的部分为空）"""
+        translation = ""
+        if self._start >= 0:
+            end = self._end if self._end >= 0 else len(self.content)
+            translation = self.content[self._start:end].strip()
+        
+        keywords: List[str] = []
+        keywords_index = self._find_line_prefix(self.KEYWORDS_PREFIX, max(self._start, 0))
+        if keywords_index >= 0:
+            line = self.content[keywords_index + len(self.KEYWORDS_PREFIX):].split("\n", 1)[0].strip()
+            if line.startswith('[') and line.endswith(']'):
+                line = line[1:-1]
+            keywords = [k.strip() for k in line.split(',') if k.strip()][:3]
+        
+        return translation, keywords
+    
+    def _find_line_prefix(self, prefix: str, start: int) -> int:
+        """查找以 prefix 开头（允许前导空白）的行，返回 prefix 的位置"""
+        index = self.content.find(prefix, start)
+        while index >= 0:
+            line_start = self.content.rfind("\n", 0, index) + 1
+            if not self.content[line_start:index].strip():
+                return index
+            index = self.content.find(prefix, index + 1)
+        return -1
+
+
+def output_format_from_env() -> str:
+    """读取单条翻译的回复格式 OUTPUT_FORMAT，无效时抛出 ValueError"""
+    output_format = os.getenv("OUTPUT_FORMAT", "text").lower()
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"无效的 OUTPUT_FORMAT: {output_format}，必须是: {', '.join(OUTPUT_FORMATS)}")
+    return output_format
 
 
 class BaseAIClient:
@@ -21,11 +130,329 @@ class BaseAIClient:
         if not self.api_key:
             raise ValueError(f"{provider.upper()}_API_KEY 未配置，请检查 .env 文件")
             
-        # 使用 OpenAI SDK 初始化客户端（兼容模式）
-        self.client = OpenAI(
+        # 按 RPM/TPM 配额排速，并从每个上游响应的限速响应头校准
+        self.rate_limiter = ProviderRateLimiter.from_env(provider)
+        # 按原文长度和该提供商实际的输出/输入比例计算 max_tokens
+        self.token_budget = TokenBudget.from_env()
+        # 单条翻译的回复格式：json 时以 response_format 要求 JSON 对象并直接校验
+        self.output_format = output_format_from_env()
+        
+        # 瞬时错误按退避重试，每次尝试的超时不超过请求剩余的时间
+        self.retry_policy = RetryPolicy.from_env()
+        
+        # 使用 OpenAI SDK 的异步客户端（兼容模式），上游调用不会阻塞事件循环；
+        # 重试由 retry_policy 负责，关闭 SDK 自带的重试以免次数相乘
+        self.client = AsyncOpenAI(
             api_key=self.api_key,
-            base_url=self.base_url
+            base_url=self.base_url,
+            max_retries=0,
+            http_client=DefaultAsyncHttpxClient(
+                event_hooks={"response": [self._observe_response]}
+            )
         )
+        # 限制同时进行的上游调用数，上限根据延迟和 429 自动调整
+        self.limiter = AdaptiveLimiter.from_env(provider)
+        
+        # 提前绑定指标的子项，热路径上不再查找标签
+        self._upstream_success = UPSTREAM_DURATION.labels(provider, model, "success")
+        self._upstream_error = UPSTREAM_DURATION.labels(provider, model, "error")
+        self._upstream_in_flight = UPSTREAM_IN_FLIGHT.labels(provider)
+        self._upstream_cancelled = UPSTREAM_CANCELLED.labels(provider, model)
+        self._prompt_tokens = UPSTREAM_TOKENS.labels(provider, model, "prompt")
+        self._completion_tokens = UPSTREAM_TOKENS.labels(provider, model, "completion")
+        self._cached_tokens = UPSTREAM_TOKENS.labels(provider, model, "cached")
+        self._translation_fallbacks = PARSE_FALLBACKS.labels(provider, "translation")
+        self._keyword_fallbacks = PARSE_FALLBACKS.labels(provider, "keywords")
+        self._truncations = UPSTREAM_TRUNCATIONS.labels(provider, model)
+        self._retries = {
+            reason: UPSTREAM_RETRIES.labels(provider, reason)
+            for reason in ("timeout", "connection", "rate_limited", "server_error")
+        }
+        self._reply_parses = {
+            (output_format, outcome): REPLY_PARSES.labels(provider, output_format, outcome)
+            for output_format in OUTPUT_FORMATS for outcome in ("success", "failure")
+        }
+    
+    @asynccontextmanager
+    async def _upstream_call(self):
+        """在并发限制下执行一次上游调用，并记录耗时和进行中调用数"""
+        async with self.limiter.slot():
+            self._upstream_in_flight.inc()
+            start = time.perf_counter()
+            try:
+                with span("llm"):
+                    yield
+            except asyncio.CancelledError:
+                # 调用方已经不需要结果（客户端断开、截止时间到达或对冲落败），名额在 finally 中归还
+                self._upstream_cancelled.inc()
+                raise
+            except Exception:
+                self._upstream_error.observe(time.perf_counter() - start)
+                raise
+            else:
+                self._upstream_success.observe(time.perf_counter() - start)
+            finally:
+                self._upstream_in_flight.dec()
+    
+    async def _observe_response(self, response) -> None:
+        """httpx 响应钩子：每个上游响应（包括 RetryPolicy 重试的每次尝试）都用于校准配额"""
+        self.rate_limiter.observe(response.headers, response.status_code)
+    
+    def _build_messages(self, prompt: str, output_format: str = "text") -> List[dict]:
+        """构建 chat completions 的消息列表：固定前缀加本次的用户消息"""
+        return build_messages(prompt, output_format)
+    
+    def _build_translation_prompt(self, text: str, direction: str) -> str:
+        """构建翻译提示词（只包含翻译方向和原文，固定的说明在前缀中）"""
+        return build_translation_prompt(text, direction)
+    
+    def _parse_response(self, content: str, direction: str, original_text: str) -> tuple[str, List[str]]:
+        """解析 API 响应，用了备用方案时返回 FallbackReply
+        
+        Args:
+            content: API 返回的内容
+            direction: 翻译方向
+            original_text: 原始文本
+        """
+        translation, keywords = parse_reply(content)
+        # 解析出非空译文即算成功（关键词可以为空），与 JSON 模式的口径一致；每次解析只计一次
+        self._reply_parses["text", "success" if translation else "failure"].inc()
+        
+        fell_back = not translation or not keywords
+        
+        # 如果解析失败，使用备用方案
+        if not translation:
+            self._translation_fallbacks.inc()
+            if direction == "zh_to_en" or direction == "auto":
+                translation = f"Translated: {original_text}"
+            else:
+                translation = f"翻译：{original_text}"
+        
+        if not keywords:
+            self._keyword_fallbacks.inc()
+            if direction == "zh_to_en" or direction == "auto":
+                keywords = ["translation", "text", "content"]
+            else:
+                keywords = ["翻译", "文本", "内容"]
+        
+        # 限制关键词数量
+        keywords = keywords[:3]
+        
+        if fell_back:
+            return FallbackReply((translation, keywords))
+        return translation, keywords
+    
+    def _parse_json_response(self, content: str) -> tuple[str, List[str]]:
+        """解析 JSON 模式的回复，不符合格式时抛出 ReplyFormatError 而不是返回占位结果"""
+        try:
+            reply = parse_json_reply(content)
+        except ValueError as e:
+            self._reply_parses["json", "failure"].inc()
+            raise ReplyFormatError(f"回复不是有效的 JSON 翻译结果: {e}") from e
+        self._reply_parses["json", "success"].inc()
+        return reply.translation, reply.keywords
+    
+    def _translate_reply(self, content: str, direction: str, original_text: str) -> tuple[str, List[str]]:
+        """按客户端的回复格式解析单条翻译的回复"""
+        if self.output_format == "json":
+            return self._parse_json_response(content)
+        return self._parse_response(content, direction, original_text)
+    
+    def _plan_tokens(self, text: str, direction: str) -> Tuple[str, int, int]:
+        """返回 (具体翻译方向, 原文估算 token 数, 本次调用的 max_tokens)"""
+        direction = resolve_direction(text, direction)
+        source_tokens = estimate_tokens(text)
+        return direction, source_tokens, self.token_budget.max_tokens(source_tokens, direction)
+    
+    async def _create_completion(
+        self,
+        prompt: str,
+        max_tokens: int = 500,
+        direction: Optional[str] = None,
+        source_tokens: int = 0,
+        items: int = 1,
+        output_format: str = "text"
+    ) -> str:
+        """异步调用上游 chat completions 接口，返回模型回复文本
+        
+        给出 direction 时用实际输出 token 数校准该方向的输出/输入比例；
+        output_format 为 json 时使用 JSON 前缀并要求 response_format=json_object
+        """
+        messages = self._build_messages(prompt, output_format)
+        extra = {"response_format": {"type": "json_object"}} if output_format == "json" else {}
+        # 按提示词估算加 max_tokens 预约 TPM 配额，完成后按实际用量修正
+        reserved = self._estimate_request_tokens(messages, max_tokens)
+        
+        async def attempt(timeout: float):
+            # 每次尝试重新排速和占用并发名额，退避等待期间不占用名额
+            await self.rate_limiter.acquire(reserved)
+            try:
+                async with self._upstream_call():
+                    return await self.client.chat.completions.create(
+                        model=self.model,
+                        messages=messages,
+                        temperature=0.3,
+                        max_tokens=max_tokens,
+                        timeout=timeout,
+                        **extra
+                    )
+            except Exception:
+                # 失败的尝试没有产生输出，归还预约的 token
+                self.rate_limiter.refund(reserved)
+                raise
+        
+        response = await self.retry_policy.run(attempt, self._on_retry)
+        self._record_usage(getattr(response, "usage", None), reserved, direction, source_tokens, items)
+        choice = response.choices[0]
+        if getattr(choice, "finish_reason", None) == "length":
+            self._truncations.inc()
+        return choice.message.content.strip()
+    
+    def _on_retry(self, reason: str) -> None:
+        self._retries[reason].inc()
+    
+    def _record_usage(
+        self,
+        usage,
+        reserved: int,
+        direction: Optional[str] = None,
+        source_tokens: int = 0,
+        items: int = 1
+    ) -> None:
+        """记录 response.usage 中的 token 数，修正 TPM 预约并校准输出/输入比例"""
+        prompt_tokens = getattr(usage, "prompt_tokens", None)
+        completion_tokens = getattr(usage, "completion_tokens", None)
+        if isinstance(prompt_tokens, int):
+            self._prompt_tokens.inc(prompt_tokens)
+        if isinstance(completion_tokens, int):
+            self._completion_tokens.inc(completion_tokens)
+            if direction is not None:
+                self.token_budget.observe(direction, source_tokens, completion_tokens, items)
+        # 命中上下文缓存的输入 token：通义千问在 prompt_tokens_details.cached_tokens，
+        # DeepSeek 在 prompt_cache_hit_tokens
+        cached_tokens = getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", None)
+        if not isinstance(cached_tokens, int):
+            cached_tokens = getattr(usage, "prompt_cache_hit_tokens", None)
+        if isinstance(cached_tokens, int):
+            self._cached_tokens.inc(cached_tokens)
+        total_tokens = getattr(usage, "total_tokens", None)
+        if isinstance(total_tokens, int):
+            self.rate_limiter.settle(reserved, total_tokens)
+    
+    @staticmethod
+    def _estimate_request_tokens(messages: List[dict], max_tokens: int) -> int:
+        """估算一次调用最多消耗的 token 数"""
+        return sum(estimate_tokens(message["content"]) for message in messages) + max_tokens
+    
+    async def stream_translate(self, text: str, direction: str = "zh_to_en") -> AsyncIterator[Tuple[str, object]]:
+        """以流式方式翻译文本
+        
+        依次产出 ("delta", 译文片段)，流结束后产出 ("result", (translation, keywords))。
+        
+        Args:
+            text: 要翻译的文本
+            direction: 翻译方向，可选值：zh_to_en（中文到英文），en_to_zh（英文到中文），auto（自动检测）
+        """
+        prompt = self._build_translation_prompt(text, direction)
+        # 流式调用始终使用 翻译：/关键词： 格式，译文可以在生成过程中逐段推送
+        messages = self._build_messages(prompt)
+        parser = IncrementalResponseParser()
+        
+        resolved, source_tokens, max_tokens = self._plan_tokens(text, direction)
+        reserved = self._estimate_request_tokens(messages, max_tokens)
+        usage = None
+        
+        async def attempt(timeout: float):
+            # 与 _create_completion 相同，每次尝试预约配额并占用并发名额，建立连接失败时立即归还，
+            # 退避等待期间不占用名额；成功的那次尝试把名额连同流一起交给调用方
+            await self.rate_limiter.acquire(reserved)
+            call = AsyncExitStack()
+            try:
+                await call.enter_async_context(self._upstream_call())
+                stream = await self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    temperature=0.3,
+                    max_tokens=max_tokens,
+                    stream=True,
+                    # 最后一个数据块带上 usage，流式调用也能统计 token 和缓存命中
+                    stream_options={"include_usage": True},
+                    # 同时是读取每个数据块的超时
+                    timeout=timeout
+                )
+            except BaseException as e:
+                await call.__aexit__(type(e), e, e.__traceback__)
+                if isinstance(e, Exception):
+                    self.rate_limiter.refund(reserved)
+                raise
+            return stream, call
+        
+        try:
+            # 只重试建立连接，已经输出译文后不再重试
+            stream, call = await self.retry_policy.run(attempt, self._on_retry)
+            # 建立连接的那次尝试一直占用并发名额，直到流式响应结束
+            async with call:
+                received = False
+                try:
+                    async for chunk in stream:
+                        received = True
+                        left = remaining()
+                        if left is not None and left <= 0:
+                            raise DeadlineExceeded("请求已超过截止时间")
+                        if not chunk.choices:
+                            usage = getattr(chunk, "usage", None) or usage
+                            continue
+                        if chunk.choices[0].finish_reason == "length":
+                            self._truncations.inc()
+                        piece = chunk.choices[0].delta.content
+                        if piece:
+                            delta = parser.feed(piece)
+                            if delta:
+                                yield "delta", delta
+                except Exception:
+                    if not received:
+                        # 连接建立后第一个数据块之前就失败，没有产生输出，归还预约的 token
+                        self.rate_limiter.refund(reserved)
+                    raise
+                finally:
+                    # 提前结束（取消、截止时间到达）时关闭上游连接，让上游停止生成
+                    await stream.aclose()
+        except (QueueFullError, DeadlineExceeded):
+            raise
+        except Exception as e:
+            raise Exception(f"{self.provider} 流式调用失败: {str(e)}")
+        
+        self._record_usage(usage, reserved, resolved, source_tokens)
+        translation, keywords = parser.finish()
+        if not translation or not keywords:
+            # 格式不完整时沿用 _parse_response 的备用方案，结果不写入缓存
+            fallback_translation, fallback_keywords = self._parse_response(parser.content, direction, text)
+            yield "result", FallbackReply((translation or fallback_translation, keywords or fallback_keywords))
+            return
+        yield "result", (translation, keywords)
+    
+    async def translate_batch(self, texts: List[str], direction: str) -> List[Optional[tuple[str, List[str]]]]:
+        """用一次上游调用翻译多条相同方向的文本
+        
+        Args:
+            texts: 要翻译的文本列表
+            direction: 已确定的翻译方向（zh_to_en 或 en_to_zh）
+        
+        Returns:
+            与 texts 一一对应的结果列表，无法从回复中解析的条目为 None
+        """
+        prompt = build_batch_prompt(texts, direction)
+        source_tokens = sum(estimate_tokens(text) for text in texts)
+        max_tokens = self.token_budget.max_tokens(source_tokens, direction, items=len(texts))
+        try:
+            content = await self._create_completion(prompt, max_tokens, direction, source_tokens, len(texts))
+        except (QueueFullError, DeadlineExceeded):
+            raise
+        except Exception as e:
+            raise Exception(f"{self.provider} 批量翻译调用失败: {str(e)}")
+        
+        parsed = parse_batch_response(content, len(texts))
+        return [parsed.get(i) for i in range(len(texts))]
     
     async def translate_and_extract(self, text: str, direction: str = "zh_to_en") -> tuple[str, List[str]]:
         """翻译文本并提取关键词（子类必须实现）"""
@@ -34,6 +461,10 @@ class BaseAIClient:
     def translate_sync(self, text: str, direction: str = "zh_to_en") -> tuple[str, List[str]]:
         """同步版本的翻译方法"""
         return asyncio.run(self.translate_and_extract(text, direction))
+    
+    async def aclose(self) -> None:
+        """关闭底层 HTTP 连接池"""
+        await self.client.close()
 
 
 class DeepSeekClient(BaseAIClient):
@@ -54,25 +485,20 @@ class DeepSeekClient(BaseAIClient):
             text: 要翻译的文本
             direction: 翻译方向，可选值：zh_to_en（中文到英文），en_to_zh（英文到中文），auto（自动检测）
         """
-        prompt = self._build_translation_prompt(text, direction)
+        with span("prompt"):
+            prompt = self._build_translation_prompt(text, direction)
+            resolved, source_tokens, max_tokens = self._plan_tokens(text, direction)
         
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "你是一个专业的翻译助手，擅长多语言翻译和关键词提取。"
-                    },
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.3,
-                max_tokens=500
+            content = await self._create_completion(
+                prompt, max_tokens, resolved, source_tokens, output_format=self.output_format
             )
+            with span("parse"):
+                return self._translate_reply(content, direction, text)
             
-            content = response.choices[0].message.content.strip()
-            return self._parse_response(content, direction, text)
-            
+        except (QueueFullError, DeadlineExceeded):
+            # 本地排队已满时保留重试时间交给调用方返回 503，超过截止时间时返回 504
+            raise
         except Exception as e:
             raise Exception(f"DeepSeek API 调用失败: {str(e)}")
     
@@ -80,83 +506,6 @@ class DeepSeekClient(BaseAIClient):
     async def translate(self, text: str, direction: str = "zh_to_en") -> tuple[str, List[str]]:
         """翻译方法（translate_and_extract 的别名）"""
         return await self.translate_and_extract(text, direction)
-    
-    def _build_translation_prompt(self, text: str, direction: str) -> str:
-        """构建翻译提示词"""
-        if direction == "zh_to_en":
-            source_lang = "中文"
-            target_lang = "英文"
-            keyword_lang = "英文"
-        elif direction == "en_to_zh":
-            source_lang = "英文"
-            target_lang = "中文"
-            keyword_lang = "中文"
-        else:  # auto 或默认
-            # 简单检测：如果包含中文字符，则认为是中文到英文
-            import re
-            if re.search(r'[\u4e00-\u9fff]', text):
-                source_lang = "中文"
-                target_lang = "英文"
-                keyword_lang = "英文"
-            else:
-                source_lang = "英文"
-                target_lang = "中文"
-                keyword_lang = "中文"
-        
-        return f'''请将以下{source_lang}文本翻译成{target_lang}，并提取3个最重要的关键词（{keyword_lang}）：
-
-{source_lang}文本：{text}
-
-请严格按照以下格式回复：
-翻译：[{target_lang}翻译]
-关键词：[关键词1, 关键词2, 关键词3]
-
-注意：
-1. 翻译要准确自然
-2. 关键词要是{keyword_lang}名词或短语
-3. 关键词用逗号分隔，不要有编号
-4. 只返回上述格式，不要有其他内容'''
-    
-    def _parse_response(self, content: str, direction: str, original_text: str) -> tuple[str, List[str]]:
-        """解析 API 响应
-        
-        Args:
-            content: API 返回的内容
-            direction: 翻译方向
-            original_text: 原始文本
-        """
-        translation = ""
-        keywords = []
-        
-        lines = content.split('\n')
-        for line in lines:
-            line = line.strip()
-            if line.startswith("翻译："):
-                translation = line.replace("翻译：", "").strip()
-            elif line.startswith("关键词："):
-                keywords_str = line.replace("关键词：", "").strip()
-                # 移除方括号并分割
-                if keywords_str.startswith('[') and keywords_str.endswith(']'):
-                    keywords_str = keywords_str[1:-1]
-                keywords = [k.strip() for k in keywords_str.split(',')]
-        
-        # 如果解析失败，使用备用方案
-        if not translation:
-            if direction == "zh_to_en" or direction == "auto":
-                translation = f"Translated: {original_text}"
-            else:
-                translation = f"翻译：{original_text}"
-        
-        if not keywords:
-            if direction == "zh_to_en" or direction == "auto":
-                keywords = ["translation", "text", "content"]
-            else:
-                keywords = ["翻译", "文本", "内容"]
-        
-        # 限制关键词数量
-        keywords = keywords[:3]
-        
-        return translation, keywords
 
 
 class AliyunQwenClient(BaseAIClient):
@@ -177,25 +526,20 @@ class AliyunQwenClient(BaseAIClient):
             text: 要翻译的文本
             direction: 翻译方向，可选值：zh_to_en（中文到英文），en_to_zh（英文到中文），auto（自动检测）
         """
-        prompt = self._build_translation_prompt(text, direction)
+        with span("prompt"):
+            prompt = self._build_translation_prompt(text, direction)
+            resolved, source_tokens, max_tokens = self._plan_tokens(text, direction)
         
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "你是一个专业的翻译助手，擅长多语言翻译和关键词提取。"
-                    },
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.3,
-                max_tokens=500
+            content = await self._create_completion(
+                prompt, max_tokens, resolved, source_tokens, output_format=self.output_format
             )
+            with span("parse"):
+                return self._translate_reply(content, direction, text)
             
-            content = response.choices[0].message.content.strip()
-            return self._parse_response(content, direction, text)
-            
+        except (QueueFullError, DeadlineExceeded):
+            # 本地排队已满时保留重试时间交给调用方返回 503，超过截止时间时返回 504
+            raise
         except Exception as e:
             raise Exception(f"通义千问 API 调用失败: {str(e)}")
     
@@ -203,91 +547,24 @@ class AliyunQwenClient(BaseAIClient):
     async def translate(self, text: str, direction: str = "zh_to_en") -> tuple[str, List[str]]:
         """翻译方法（translate_and_extract 的别名）"""
         return await self.translate_and_extract(text, direction)
-    
-    def _build_translation_prompt(self, text: str, direction: str) -> str:
-        """构建翻译提示词（与 DeepSeek 相同）"""
-        if direction == "zh_to_en":
-            source_lang = "中文"
-            target_lang = "英文"
-            keyword_lang = "英文"
-        elif direction == "en_to_zh":
-            source_lang = "英文"
-            target_lang = "中文"
-            keyword_lang = "中文"
-        else:  # auto 或默认
-            # 简单检测：如果包含中文字符，则认为是中文到英文
-            import re
-            if re.search(r'[\u4e00-\u9fff]', text):
-                source_lang = "中文"
-                target_lang = "英文"
-                keyword_lang = "英文"
-            else:
-                source_lang = "英文"
-                target_lang = "中文"
-                keyword_lang = "中文"
-        
-        return f'''请将以下{source_lang}文本翻译成{target_lang}，并提取3个最重要的关键词（{keyword_lang}）：
-
-{source_lang}文本：{text}
-
-请严格按照以下格式回复：
-翻译：[{target_lang}翻译]
-关键词：[关键词1, 关键词2, 关键词3]
-
-注意：
-1. 翻译要准确自然
-2. 关键词要是{keyword_lang}名词或短语
-3. 关键词用逗号分隔，不要有编号
-4. 只返回上述格式，不要有其他内容'''
-    
-    def _parse_response(self, content: str, direction: str, original_text: str) -> tuple[str, List[str]]:
-        """解析 API 响应（与 DeepSeek 相同）
-        
-        Args:
-            content: API 返回的内容
-            direction: 翻译方向
-            original_text: 原始文本
-        """
-        translation = ""
-        keywords = []
-        
-        lines = content.split('\n')
-        for line in lines:
-            line = line.strip()
-            if line.startswith("翻译："):
-                translation = line.replace("翻译：", "").strip()
-            elif line.startswith("关键词："):
-                keywords_str = line.replace("关键词：", "").strip()
-                # 移除方括号并分割
-                if keywords_str.startswith('[') and keywords_str.endswith(']'):
-                    keywords_str = keywords_str[1:-1]
-                keywords = [k.strip() for k in keywords_str.split(',')]
-        
-        # 如果解析失败，使用备用方案
-        if not translation:
-            if direction == "zh_to_en" or direction == "auto":
-                translation = f"Translated: {original_text}"
-            else:
-                translation = f"翻译：{original_text}"
-        
-        if not keywords:
-            if direction == "zh_to_en" or direction == "auto":
-                keywords = ["translation", "text", "content"]
-            else:
-                keywords = ["翻译", "文本", "内容"]
-        
-        # 限制关键词数量
-        keywords = keywords[:3]
-        
-        return translation, keywords
 
 
 class MockAIClient:
-    """模拟大模型 API 调用（备用方案）"""
+    """模拟大模型 API 调用（备用方案）
     
-    def __init__(self):
+    基于术语表的离线翻译：一次扫描找出文本中的术语，替换为译法并按出现次数排序关键词。
+    术语表由 MOCK_GLOSSARY_PATHS 指定（默认为内置术语表），只加载一次；
+    MOCK_LATENCY_MS 可模拟上游延迟（默认 0）。
+    """
+    
+    def __init__(self, glossary: Optional[Glossary] = None, latency_ms: Optional[float] = None):
         self.provider = "mock"
-        pass
+        self.model = "mock"
+        self.glossary = glossary if glossary is not None else Glossary.from_env()
+        if latency_ms is None:
+            latency_ms = float(os.getenv("MOCK_LATENCY_MS", "0"))
+        self.latency = latency_ms / 1000
+        self.token_budget = TokenBudget.from_env()
     
     async def translate_and_extract(self, text: str, direction: str = "zh_to_en") -> tuple[str, List[str]]:
         """模拟翻译和关键词提取（当真实 API 不可用时使用）
@@ -296,108 +573,19 @@ class MockAIClient:
             text: 要翻译的文本
             direction: 翻译方向，可选值：zh_to_en（中文到英文），en_to_zh（英文到中文），auto（自动检测）
         """
-        # 中文到英文翻译映射
-        zh_to_en_map = {
-            "你好": "Hello",
-            "世界": "World",
-            "翻译": "Translation",
-            "人工智能": "Artificial Intelligence",
-            "学习": "Learning",
-            "项目": "Project",
-            "测试": "Test",
-            "开发": "Development",
-            "代码": "Code",
-            "程序": "Program"
-        }
-        
-        # 英文到中文翻译映射
-        en_to_zh_map = {
-            "hello": "你好",
-            "world": "世界",
-            "translation": "翻译",
-            "artificial intelligence": "人工智能",
-            "learning": "学习",
-            "project": "项目",
-            "test": "测试",
-            "development": "开发",
-            "code": "代码",
-            "program": "程序"
-        }
+        direction = resolve_direction(text, direction)
+        matches = self.glossary.find(text, direction)
         
-        # 关键词映射
-        zh_keywords_map = {
-            "你好": ["问候", "打招呼", "欢迎"],
-            "世界": ["世界", "全球", "地球"],
-            "翻译": ["翻译", "语言", "转换"],
-            "人工智能": ["人工智能", "AI", "机器学习"],
-            "学习": ["学习", "教育", "知识"],
-            "项目": ["项目", "任务", "工作"],
-            "测试": ["测试", "检验", "验证"],
-            "开发": ["开发", "编程", "软件"],
-            "代码": ["代码", "编程", "源码"],
-            "程序": ["程序", "应用", "软件"]
-        }
-        
-        en_keywords_map = {
-            "hello": ["greeting", "hello", "welcome"],
-            "world": ["world", "global", "earth"],
-            "translation": ["translation", "language", "convert"],
-            "artificial intelligence": ["AI", "artificial intelligence", "machine learning"],
-            "learning": ["learning", "study", "education"],
-            "project": ["project", "task", "assignment"],
-            "test": ["test", "testing", "validation"],
-            "development": ["development", "coding", "programming"],
-            "code": ["code", "programming", "source"],
-            "program": ["program", "application", "software"]
-        }
-        
-        # 根据方向选择翻译映射
         if direction == "zh_to_en":
-            translation_map = zh_to_en_map
-            keywords_map = en_keywords_map
-            default_translation = f"Translated: {text}"
-            default_keywords = ["translation", "text", "content"]
-        elif direction == "en_to_zh":
-            translation_map = en_to_zh_map
-            keywords_map = zh_keywords_map
-            default_translation = f"翻译：{text}"
-            default_keywords = ["翻译", "文本", "内容"]
-        else:  # auto
-            # 简单检测：如果包含中文字符，则认为是中文到英文
-            import re
-            if re.search(r'[\u4e00-\u9fff]', text):
-                translation_map = zh_to_en_map
-                keywords_map = en_keywords_map
-                default_translation = f"Translated: {text}"
-                default_keywords = ["translation", "text", "content"]
-            else:
-                translation_map = en_to_zh_map
-                keywords_map = zh_keywords_map
-                default_translation = f"翻译：{text}"
-                default_keywords = ["翻译", "文本", "内容"]
-        
-        # 查找匹配的翻译
-        translation = default_translation
-        for key, value in translation_map.items():
-            if key.lower() in text.lower():
-                translation = value
-                break
-        
-        # 提取关键词
-        keywords = []
-        for key, value in keywords_map.items():
-            if key.lower() in text.lower():
-                keywords.extend(value)
-        
-        # 如果没有找到关键词，使用默认关键词
-        if not keywords:
-            keywords = default_keywords
-        
-        # 限制关键词数量
-        keywords = list(set(keywords))[:3]
+            translation = self.glossary.substitute(text, matches, direction) if matches else f"Translated: {text}"
+            keywords = self.glossary.rank_keywords(matches, direction) or ["translation", "text", "content"]
+        else:
+            translation = self.glossary.substitute(text, matches, direction) if matches else f"翻译：{text}"
+            keywords = self.glossary.rank_keywords(matches, direction) or ["翻译", "文本", "内容"]
         
         # 模拟 API 调用延迟
-        await asyncio.sleep(0.1)
+        if self.latency > 0:
+            await asyncio.sleep(self.latency)
         
         return translation, keywords
     
@@ -405,50 +593,151 @@ class MockAIClient:
         """同步版本的翻译方法"""
         return asyncio.run(self.translate_and_extract(text, direction))
     
+    async def stream_translate(self, text: str, direction: str = "zh_to_en") -> AsyncIterator[Tuple[str, object]]:
+        """模拟流式翻译：按词切分完整译文逐段产出"""
+        translation, keywords = await self.translate_and_extract(text, direction)
+        for piece in re.findall(r'\S+\s*|\s+', translation):
+            yield "delta", piece
+        yield "result", (translation, keywords)
+    
+    async def translate_batch(self, texts: List[str], direction: str) -> List[Optional[tuple[str, List[str]]]]:
+        """模拟批量翻译：逐条调用 translate_and_extract"""
+        return list(await asyncio.gather(
+            *(self.translate_and_extract(text, direction) for text in texts)
+        ))
+    
+    async def aclose(self) -> None:
+        """模拟客户端没有需要释放的资源"""
+        pass
+    
     # 为了兼容性，添加 translate 方法作为 translate_and_extract 的别名
     async def translate(self, text: str, direction: str = "zh_to_en") -> tuple[str, List[str]]:
         """翻译方法（translate_and_extract 的别名）"""
         return await self.translate_and_extract(text, direction)
 
 
+# 客户端构造失败时的降级顺序
+PROVIDER_FALLBACK_CHAIN = ["deepseek", "aliyun", "mock"]
+
+PROVIDER_CLASSES = {
+    "deepseek": DeepSeekClient,
+    "aliyun": AliyunQwenClient,
+}
+
+PROVIDER_DISPLAY_NAMES = {
+    "deepseek": "DeepSeek",
+    "aliyun": "通义千问",
+}
+
+
 # 创建 AI 客户端实例
 def create_ai_client(provider: Optional[str] = None):
     """创建 AI 客户端实例
     
+    按 PROVIDER_FALLBACK_CHAIN 从指定的提供商开始依次尝试构造，
+    配置缺失或初始化失败时降级到下一个，最终使用模拟客户端。
+    OUTPUT_FORMAT 无效时抛出 ValueError，不降级。
+    运行时的健康路由和失败切换由 routing.ProviderRouter 负责。
+    
     Args:
         provider: AI 提供商，可选值：deepseek, aliyun, mock
                 如果为 None，则使用环境变量 AI_PROVIDER 的值
     """
     if provider is None:
         provider = os.getenv("AI_PROVIDER", "deepseek").lower()
+    # 回复格式对所有提供商相同，配置错误时直接报错（启动时预热客户端即失败），
+    # 而不是让每个提供商都构造失败、最终降级为模拟客户端
+    output_format_from_env()
     
-    print(f"🔧 尝试创建 {provider} 客户端...")
+    if provider in PROVIDER_FALLBACK_CHAIN:
+        chain = PROVIDER_FALLBACK_CHAIN[PROVIDER_FALLBACK_CHAIN.index(provider):]
+    else:
+        chain = ["mock"]
     
-    if provider == "deepseek":
+    for name in chain:
+        if name == "mock":
+            break
+        
+        display_name = PROVIDER_DISPLAY_NAMES[name]
         try:
-            client = DeepSeekClient()
-            print(f"✅ 使用 DeepSeek API 客户端 (模型: {client.model})")
+            client = PROVIDER_CLASSES[name]()
+            logger.info(f"使用 {display_name} API 客户端", extra={"provider": name, "model": client.model})
             return client
         except ValueError as e:
-            print(f"⚠️  DeepSeek 配置错误: {str(e)}，尝试其他提供商")
-            return create_ai_client("aliyun")  # 尝试通义千问
+            logger.warning(f"{display_name} 配置错误，尝试其他提供商", extra={"provider": name, "error": str(e)})
         except Exception as e:
-            print(f"⚠️  初始化 DeepSeek 客户端失败: {str(e)}，尝试其他提供商")
-            return create_ai_client("aliyun")  # 尝试通义千问
+            logger.warning(f"初始化 {display_name} 客户端失败，尝试其他提供商", extra={"provider": name, "error": str(e)})
     
-    elif provider == "aliyun":
-        try:
-            client = AliyunQwenClient()
-            print(f"✅ 使用通义千问 API 客户端 (模型: {client.model})")
-            return client
-        except ValueError as e:
-            print(f"⚠️  通义千问配置错误: {str(e)}，尝试模拟客户端")
-            return create_ai_client("mock")
-        except Exception as e:
-            print(f"⚠️  初始化通义千问客户端失败: {str(e)}，尝试模拟客户端")
-            return create_ai_client("mock")
+    logger.warning("使用模拟客户端", extra={"requested_provider": provider})
+    return MockAIClient()
+
+
+class ClientRegistry:
+    """进程级 AI 客户端注册表
+    
+    每个提供商的客户端只创建一次，之后所有请求复用同一个实例及其
+    keep-alive 连接池，避免每个请求重新建立 TLS 连接。应用关闭时统一释放。
+    """
+    
+    def __init__(self, factory=None):
+        self._factory = factory or create_ai_client
+        self._clients: Dict[str, object] = {}
+        # 构造时降级成了其他客户端的提供商（例如缺少 API 密钥）
+        self._degraded: set = set()
     
-    else:  # mock 或默认
-        client = MockAIClient()
-        print(f"⚠️  使用模拟客户端")
-        return client
\ No newline at end of file
+    def get(self, provider: Optional[str] = None):
+        """获取指定提供商的客户端，首次访问时创建
+        
+        Args:
+            provider: AI 提供商，为 None 时使用环境变量 AI_PROVIDER 的值
+        """
+        if provider is None:
+            provider = os.getenv("AI_PROVIDER", "deepseek").lower()
+        
+        client = self._clients.get(provider)
+        if client is None:
+            client = self._factory(provider)
+            self._clients[provider] = client
+            if client.provider != provider:
+                self._degraded.add(provider)
+        return client
+    
+    def is_configured(self, provider: str) -> bool:
+        """提供商的客户端是否按配置创建成功（没有降级）"""
+        self.get(provider)
+        return provider not in self._degraded
+    
+    def warm_up(self, providers: Iterable[str]) -> None:
+        """预先创建一组提供商的客户端"""
+        for provider in providers:
+            self.get(provider)
+    
+    def register(self, provider: str, client) -> None:
+        """注册一个已创建的客户端（用于自定义提供商或测试注入）"""
+        self._clients[provider] = client
+        self._degraded.discard(provider)
+    
+    def unregister(self, provider: str):
+        """移除并返回已注册的客户端（不会关闭它）"""
+        self._degraded.discard(provider)
+        return self._clients.pop(provider, None)
+    
+    def __contains__(self, provider: str) -> bool:
+        return provider in self._clients
+    
+    def items(self) -> List[Tuple[str, object]]:
+        """返回已创建的 (提供商, 客户端) 列表"""
+        return list(self._clients.items())
+    
+    async def aclose(self) -> None:
+        """关闭所有已创建的客户端并清空注册表"""
+        # 降级时不同的提供商名称可能指向同一个实例，按对象去重
+        clients = list({id(client): client for client in self._clients.values()}.values())
+        self._clients.clear()
+        self._degraded.clear()
+        for client in clients:
+            await client.aclose()
+
+
+# 进程级共享的客户端注册表，由 FastAPI lifespan 管理生命周期
+client_registry = ClientRegistry()
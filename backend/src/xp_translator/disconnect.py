@@ -0,0 +1,66 @@
+"""
+客户端断开检测模块
+请求体读完之后，ASGI 服务器在客户端断开连接时向 receive() 投递 http.disconnect。
+在等待上游结果的同时监听该消息，客户端先离开时取消上游任务：进行中的模型调用、
+并发名额和排速配额随之释放，不再为没有人接收的结果消耗上游容量
+"""
+
+import asyncio
+from typing import AsyncIterator, Awaitable, TypeVar
+
+from starlette.requests import Request
+
+T = TypeVar("T")
+
+
+class ClientDisconnected(Exception):
+    """客户端在结果返回之前断开了连接"""
+
+
+async def wait_for_disconnect(request: Request) -> None:
+    """等待客户端断开连接（请求体已经读完后调用）"""
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+async def cancel_on_disconnect(request: Request, awaitable: Awaitable[T]) -> T:
+    """等待 awaitable；客户端先断开时取消它并抛出 ClientDisconnected"""
+    task = asyncio.ensure_future(awaitable)
+    watcher = asyncio.ensure_future(wait_for_disconnect(request))
+    try:
+        await asyncio.wait((task, watcher), return_when=asyncio.FIRST_COMPLETED)
+        if task.done():
+            return task.result()
+        raise ClientDisconnected("客户端已断开连接")
+    finally:
+        watcher.cancel()
+        if not task.done():
+            task.cancel()
+
+
+async def iterate_until_disconnect(request: Request, iterator: AsyncIterator[T]) -> AsyncIterator[T]:
+    """逐项产出 iterator 的元素；客户端断开时取消正在进行的那一步并抛出 ClientDisconnected
+
+    每一步在单独的任务中执行，取消时上游的流式读取收到 CancelledError，
+    iterator 随之结束并释放连接和并发名额
+    """
+    watcher = asyncio.ensure_future(wait_for_disconnect(request))
+    step = None
+    try:
+        while True:
+            step = asyncio.ensure_future(iterator.__anext__())
+            await asyncio.wait((step, watcher), return_when=asyncio.FIRST_COMPLETED)
+            if not step.done():
+                raise ClientDisconnected("客户端已断开连接")
+            try:
+                item = step.result()
+            except StopAsyncIteration:
+                return
+            step = None
+            yield item
+    finally:
+        watcher.cancel()
+        if step is not None and not step.done():
+            step.cancel()
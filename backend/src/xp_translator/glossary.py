@@ -0,0 +1,276 @@
+"""
+术语表模块
+从外部 TSV 文件加载中英术语表（只加载一次，支持数万条），用 Aho-Corasick 自动机
+一次扫描文本找出所有术语，供 MockAIClient 离线翻译、关键词排序以及翻译记忆识别术语使用
+
+TSV 每行一个术语：中文<TAB>英文<TAB>中文关键词<TAB>英文关键词，关键词用逗号分隔、可省略，
+# 开头的行为注释
+"""
+
+import os
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+DEFAULT_GLOSSARY_PATH = Path(__file__).resolve().parent / "data" / "glossary.tsv"
+
+
+class GlossaryEntry(NamedTuple):
+    zh: str
+    en: str
+    zh_keywords: Tuple[str, ...] = ()
+    en_keywords: Tuple[str, ...] = ()
+
+
+class TermMatch(NamedTuple):
+    start: int
+    end: int
+    entry: GlossaryEntry
+    # 术语在所属方向自动机中的编号
+    pattern: int
+
+
+def fold(text: str) -> str:
+    """转小写并保持长度不变，匹配位置可以直接对应原文"""
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        return lowered
+    # 少数字符（如 İ）转小写后长度会变化，逐字符处理
+    return "".join(ch.lower() if len(ch.lower()) == 1 else ch for ch in text)
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isascii() and ch.isalnum()
+
+
+class AhoCorasick:
+    """多模式匹配自动机：构建后一次扫描即可找出文本中的所有模式"""
+
+    def __init__(self, patterns: Iterable[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # 以该节点结尾的模式编号，以及沿失败链最近的另一个终止节点
+        self._output: List[int] = [-1]
+        self._dict_link: List[int] = [0]
+        self.patterns: List[str] = []
+        for pattern in patterns:
+            self._add(pattern)
+        self._build()
+
+    def _add(self, pattern: str) -> None:
+        if not pattern:
+            return
+        node = 0
+        for ch in pattern:
+            child = self._goto[node].get(ch)
+            if child is None:
+                child = len(self._goto)
+                self._goto[node][ch] = child
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(-1)
+                self._dict_link.append(0)
+            node = child
+        if self._output[node] == -1:
+            self._output[node] = len(self.patterns)
+            self.patterns.append(pattern)
+
+    def _build(self) -> None:
+        # 按层次遍历计算失败链接
+        queue = list(self._goto[0].values())
+        head = 0
+        while head < len(queue):
+            node = queue[head]
+            head += 1
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                state = self._fail[node]
+                while state and ch not in self._goto[state]:
+                    state = self._fail[state]
+                fail = self._goto[state].get(ch, 0)
+                self._fail[child] = fail if fail != child else 0
+                self._dict_link[child] = fail if self._output[fail] != -1 else self._dict_link[fail]
+        self._lengths = [len(pattern) for pattern in self.patterns]
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int, int]]:
+        """依次产出 (起始位置, 结束位置, 模式编号)，包括重叠的匹配"""
+        return iter(self.scan(text))
+
+    def scan(self, text: str) -> List[Tuple[int, int, int]]:
+        """返回所有 (起始位置, 结束位置, 模式编号)，包括重叠的匹配"""
+        goto, fail, output, dict_link = self._goto, self._fail, self._output, self._dict_link
+        root = goto[0]
+        lengths = self._lengths
+        matches = []
+        state = 0
+        for index, ch in enumerate(text):
+            if not state:
+                # 大部分字符不是任何术语的开头，停在根节点时直接跳过
+                state = root.get(ch, 0)
+                if not state:
+                    continue
+            else:
+                while state and ch not in goto[state]:
+                    state = fail[state]
+                state = goto[state].get(ch, 0)
+            node = state if output[state] != -1 else dict_link[state]
+            while node:
+                pattern = output[node]
+                matches.append((index + 1 - lengths[pattern], index + 1, pattern))
+                node = dict_link[node]
+        return matches
+
+
+class Glossary:
+    """双向术语表
+
+    每个方向一个自动机：zh_to_en 匹配中文术语，en_to_zh 匹配英文术语（不区分大小写，
+    英文术语要求完整单词）。重叠的匹配取最左最长的一个。
+    """
+
+    def __init__(self, entries: Iterable[GlossaryEntry]):
+        # 同一术语出现多次时后面的覆盖前面的
+        by_source: Dict[str, Dict[str, GlossaryEntry]] = {"zh_to_en": {}, "en_to_zh": {}}
+        for entry in entries:
+            if entry.zh:
+                by_source["zh_to_en"][fold(entry.zh)] = entry
+            if entry.en:
+                by_source["en_to_zh"][fold(entry.en)] = entry
+        self._entries: Dict[str, List[GlossaryEntry]] = {}
+        self._automata: Dict[str, AhoCorasick] = {}
+        # 按模式编号预先计算的目标译法、(关键词, 规范化关键词) 和是否需要检查单词边界
+        self._targets: Dict[str, List[str]] = {}
+        self._keywords: Dict[str, List[Tuple[Tuple[str, str], ...]]] = {}
+        self._bounds: Dict[str, List[Tuple[bool, bool]]] = {}
+        for direction, terms in by_source.items():
+            automaton = AhoCorasick(terms)
+            entries = [terms[pattern] for pattern in automaton.patterns]
+            self._automata[direction] = automaton
+            self._entries[direction] = entries
+            self._targets[direction] = [self.target(entry, direction) for entry in entries]
+            self._keywords[direction] = [
+                tuple((k, fold(k)) for k in (entry.en_keywords if direction == "zh_to_en" else entry.zh_keywords)
+                      or (self.target(entry, direction),))
+                for entry in entries
+            ]
+            self._bounds[direction] = [
+                (_is_word_char(pattern[0]), _is_word_char(pattern[-1])) for pattern in automaton.patterns
+            ]
+
+    @classmethod
+    def load(cls, paths: Sequence[str]) -> "Glossary":
+        """从一个或多个 TSV 文件加载术语表"""
+        entries = []
+        for path in paths:
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    line = line.rstrip("\n")
+                    if not line.strip() or line.startswith("#"):
+                        continue
+                    columns = line.split("\t")
+                    if len(columns) < 2:
+                        continue
+                    zh_keywords, en_keywords = (
+                        tuple(k.strip() for k in column.split(",") if k.strip())
+                        for column in (columns + ["", ""])[2:4]
+                    )
+                    entries.append(GlossaryEntry(columns[0].strip(), columns[1].strip(), zh_keywords, en_keywords))
+        return cls(entries)
+
+    @classmethod
+    def from_env(cls) -> "Glossary":
+        """按 MOCK_GLOSSARY_PATHS（逗号分隔，默认为内置术语表）加载，相同路径只加载一次"""
+        paths = os.getenv("MOCK_GLOSSARY_PATHS", "") or str(DEFAULT_GLOSSARY_PATH)
+        return _load_cached(tuple(p.strip() for p in paths.split(",") if p.strip()))
+
+    def __len__(self) -> int:
+        return max(len(entries) for entries in self._entries.values())
+
+    def find(self, text: str, direction: str) -> List[TermMatch]:
+        """找出文本中的术语（direction 为 zh_to_en 或 en_to_zh），结果不重叠且按位置排序"""
+        raw = self._automata[direction].scan(fold(text))
+        if not raw:
+            return []
+        entries = self._entries[direction]
+        bounds = self._bounds[direction]
+        candidates = []
+        for start, end, pattern in raw:
+            left, right = bounds[pattern]
+            if left and start > 0 and _is_word_char(text[start - 1]):
+                continue
+            if right and end < len(text) and _is_word_char(text[end]):
+                continue
+            candidates.append((start, -end, pattern))
+        # 最左最长：按起点排序，同一起点取最长，跳过与已选术语重叠的匹配
+        candidates.sort()
+        matches = []
+        covered = 0
+        for start, negative_end, pattern in candidates:
+            if start >= covered:
+                matches.append(TermMatch(start, -negative_end, entries[pattern], pattern))
+                covered = -negative_end
+        return matches
+
+    @staticmethod
+    def target(entry: GlossaryEntry, direction: str) -> str:
+        """术语在目标语言中的译法"""
+        return entry.en if direction == "zh_to_en" else entry.zh
+
+    def substitute(self, text: str, matches: List[TermMatch], direction: str) -> str:
+        """把文本中的术语替换为译法，其余部分保持原样"""
+        targets = self._targets[direction]
+        pieces: List[str] = []
+        position = 0
+        for match in matches:
+            gap = text[position:match.start]
+            translated = targets[match.pattern]
+            if direction == "zh_to_en":
+                # 译成英文时，译法与相邻的字母数字之间补空格
+                if gap and gap[-1].isalnum():
+                    gap += " "
+                elif not gap and pieces and pieces[-1][-1:].isalnum():
+                    gap = " "
+                if text[match.end:match.end + 1].isalnum():
+                    translated += " "
+            pieces.append(gap)
+            pieces.append(translated)
+            position = match.end
+        pieces.append(text[position:])
+        return "".join(pieces)
+
+    def rank_keywords(self, matches: List[TermMatch], direction: str, limit: int = 3) -> List[str]:
+        """按术语出现次数（多者优先）、首次出现位置、术语长度排序，取目标语言关键词
+
+        结果只取决于文本本身，多次调用顺序一致
+        """
+        ranks: Dict[int, List[int]] = {}
+        for match in matches:
+            rank = ranks.get(match.pattern)
+            if rank is None:
+                ranks[match.pattern] = [-1, match.start, match.start - match.end]
+            else:
+                rank[0] -= 1
+        table = self._keywords[direction]
+        ordered = sorted(ranks, key=ranks.__getitem__) if len(ranks) > 1 else list(ranks)
+        keywords: List[str] = []
+        seen = set()
+        for pattern in ordered:
+            for keyword, folded in table[pattern]:
+                if folded not in seen:
+                    seen.add(folded)
+                    keywords.append(keyword)
+                    if len(keywords) == limit:
+                        return keywords
+        return keywords
+
+    def translate(self, text: str, direction: str) -> Optional[Tuple[str, List[str]]]:
+        """按术语表翻译，没有任何术语时返回 None"""
+        matches = self.find(text, direction)
+        if not matches:
+            return None
+        return self.substitute(text, matches, direction), self.rank_keywords(matches, direction)
+
+
+@lru_cache(maxsize=8)
+def _load_cached(paths: Tuple[str, ...]) -> Glossary:
+    return Glossary.load(paths)
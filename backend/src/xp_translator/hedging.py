@@ -0,0 +1,162 @@
+"""
+对冲请求模块
+主提供商在基于延迟分位数的等待时间内没有返回时，向备用提供商发出第二个请求，
+先返回有效结果的一方胜出，另一方被取消，用少量额外调用换取更低的尾延迟。
+回复格式不完整时的占位结果（FallbackReply）不算有效结果，只有双方都没有有效结果时才返回
+"""
+
+import os
+import time
+import asyncio
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, Tuple, TypeVar
+
+from .metrics import HEDGED_REQUESTS
+from .prompts import FallbackReply
+
+T = TypeVar("T")
+
+
+class LatencyTracker:
+    """滑动窗口内的成功调用延迟统计"""
+
+    def __init__(self, window: int = 200):
+        self._samples: Deque[float] = deque(maxlen=window)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        """返回窗口内的 p 分位数（0 < p <= 1），没有样本时返回 None"""
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, max(0, int(round(p * len(ordered))) - 1))
+        return ordered[index]
+
+
+class HedgedTranslator:
+    """对冲调用执行器
+
+    对冲等待时间取主提供商近期成功调用延迟的分位数，并限制在
+    [min_delay, max_delay] 之间；样本不足时使用 default_delay。
+    主请求在等待时间内失败时立即发出对冲请求。
+    """
+
+    def __init__(
+        self,
+        percentile: float = 0.95,
+        min_delay: float = 0.3,
+        max_delay: float = 5.0,
+        default_delay: float = 2.0,
+        min_samples: int = 20,
+        window: int = 200
+    ):
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.default_delay = default_delay
+        self.min_samples = min_samples
+        self.window = window
+        self._latencies: Dict[str, LatencyTracker] = {}
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self._requests = HEDGED_REQUESTS.labels("requests")
+        self._hedged = HEDGED_REQUESTS.labels("hedged")
+        self._hedge_wins = HEDGED_REQUESTS.labels("hedge_wins")
+
+    @classmethod
+    def from_env(cls) -> Optional["HedgedTranslator"]:
+        """从环境变量创建实例，未开启 HEDGING_ENABLED 时返回 None"""
+        if os.getenv("HEDGING_ENABLED", "false").lower() not in ("1", "true", "yes"):
+            return None
+        return cls(
+            percentile=float(os.getenv("HEDGING_PERCENTILE", "0.95")),
+            min_delay=float(os.getenv("HEDGING_MIN_DELAY", "0.3")),
+            max_delay=float(os.getenv("HEDGING_MAX_DELAY", "5.0")),
+            default_delay=float(os.getenv("HEDGING_DEFAULT_DELAY", "2.0"))
+        )
+
+    def _tracker(self, provider: str) -> LatencyTracker:
+        tracker = self._latencies.get(provider)
+        if tracker is None:
+            tracker = self._latencies[provider] = LatencyTracker(self.window)
+        return tracker
+
+    def hedge_delay(self, provider: str) -> float:
+        """返回对该提供商发出对冲请求前的等待时间（秒）"""
+        tracker = self._tracker(provider)
+        if len(tracker) < self.min_samples:
+            return self.default_delay
+        return min(self.max_delay, max(self.min_delay, tracker.percentile(self.percentile)))
+
+    async def run(
+        self,
+        primary: str,
+        primary_call: Callable[[], Awaitable[T]],
+        secondary: str,
+        secondary_call: Callable[[], Awaitable[T]]
+    ) -> Tuple[T, str]:
+        """执行对冲调用，返回 (结果, 实际返回结果的提供商)
+
+        占位结果（FallbackReply）按失败处理并继续等待另一方；双方都没有有效结果时
+        返回占位结果（优先主请求的），两个请求都失败时抛出主请求的异常。
+        """
+        self.requests += 1
+        self._requests.inc()
+        tasks = {asyncio.ensure_future(self._timed(primary, primary_call)): primary}
+        placeholders: Dict[str, T] = {}
+        errors: Dict[str, BaseException] = {}
+
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay(primary))
+            for task in done:
+                if task.exception() is None and not isinstance(task.result(), FallbackReply):
+                    return task.result(), primary
+
+            self.hedged += 1
+            self._hedged.inc()
+            tasks[asyncio.ensure_future(self._timed(secondary, secondary_call))] = secondary
+
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    provider = tasks[task]
+                    if task.exception() is not None:
+                        errors[provider] = task.exception()
+                    elif isinstance(task.result(), FallbackReply):
+                        placeholders[provider] = task.result()
+                    else:
+                        if provider == secondary:
+                            self.hedge_wins += 1
+                            self._hedge_wins.inc()
+                        return task.result(), provider
+            for provider in (primary, secondary):
+                if provider in placeholders:
+                    return placeholders[provider], provider
+            raise errors.get(primary) or errors[secondary]
+        finally:
+            # 胜出后取消仍在进行的另一方；调用方被取消时两者都取消
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def _timed(self, provider: str, call: Callable[[], Awaitable[T]]) -> T:
+        start = time.perf_counter()
+        result = await call()
+        self._tracker(provider).record(time.perf_counter() - start)
+        return result
+
+    def stats(self) -> Dict[str, float]:
+        """返回对冲统计信息"""
+        return {
+            "requests": self.requests,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "hedge_rate": self.hedged / self.requests if self.requests else 0.0,
+        }
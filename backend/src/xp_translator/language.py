@@ -0,0 +1,97 @@
+"""
+语言检测模块
+为 direction=auto 判断原文是中文还是英文：按汉字数与拉丁字母单词数的比例判断，
+而不是"出现一个汉字就认为是中文"，英文段落中夹杂的个别汉字不会改变方向
+
+汉字范围包括基本区、扩展 A 到 H 区和兼容汉字。长文本只统计均匀分布的若干窗口，
+检测结果以文本的 BLAKE2b 摘要加长度为键缓存，同一请求中的多次解析（缓存键、提示词、分段等）只计算一次
+"""
+
+import re
+import hashlib
+from collections import OrderedDict
+from typing import NamedTuple, Tuple
+
+CJK_RANGES = (
+    "\u3007"                  # 〇
+    "\u3400-\u4dbf"           # 扩展 A
+    "\u4e00-\u9fff"           # 基本区
+    "\uf900-\ufaff"           # 兼容汉字
+    "\U00020000-\U0002ebef"   # 扩展 B–F、I
+    "\U0002f800-\U0002fa1f"   # 兼容汉字补充
+    "\U00030000-\U000323af"   # 扩展 G、H
+)
+# 一次扫描同时统计两种文字：分组捕获连续的汉字，未捕获的匹配是一个拉丁字母单词
+_SCRIPT_RUN = re.compile(f"([{CJK_RANGES}]+)|[A-Za-z\u00c0-\u024f]+")
+
+# 平均每个中文词的汉字数，用于把汉字数折算为与英文单词可比的词数
+CJK_CHARS_PER_WORD = 1.5
+# 少数一方的占比达到该值时认为是中英混合文本
+MIXED_THRESHOLD = 0.2
+# 超过该长度的文本只统计 SAMPLE_WINDOWS 个均匀分布的窗口，总长约为 SAMPLE_CHARS
+SAMPLE_CHARS = 1024
+SAMPLE_WINDOWS = 8
+CACHE_SIZE = 8192
+
+
+class Detection(NamedTuple):
+    # zh、en，或 unknown（没有汉字也没有拉丁字母）
+    language: str
+    # 折算后中文所占的比例
+    cjk_share: float
+    mixed: bool
+
+
+def _sample(text: str) -> str:
+    """长文本取均匀分布的窗口拼接，窗口之间以空格分隔避免把两个单词连在一起"""
+    if len(text) <= SAMPLE_CHARS:
+        return text
+    window = SAMPLE_CHARS // SAMPLE_WINDOWS
+    step = (len(text) - window) / (SAMPLE_WINDOWS - 1)
+    return " ".join(text[int(i * step):int(i * step) + window] for i in range(SAMPLE_WINDOWS))
+
+
+def script_counts(text: str) -> Tuple[int, int]:
+    """统计 (汉字数, 拉丁字母单词数)，长文本按抽样窗口统计"""
+    if text.isascii():
+        # 纯 ASCII 文本不可能包含汉字，只需知道有没有字母
+        return 0, 1 if any(ch.isalpha() for ch in text) else 0
+    runs = _SCRIPT_RUN.findall(_sample(text))
+    return sum(map(len, runs)), runs.count("")
+
+
+def _detect(text: str) -> Detection:
+    cjk, words = script_counts(text)
+    if not cjk and not words:
+        return Detection("unknown", 0.0, False)
+    cjk_words = cjk / CJK_CHARS_PER_WORD
+    share = cjk_words / (cjk_words + words)
+    return Detection("zh" if share >= 0.5 else "en", round(share, 4), MIXED_THRESHOLD <= share <= 1 - MIXED_THRESHOLD)
+
+
+# 键是 (长度, 128 位 BLAKE2b 摘要)：不保留原文，8192 条长文本也只占几百 KB；
+# 与 hash() 不同，摘要冲突的概率可以忽略，不会让两段文本共用一个检测结果
+_cache: "OrderedDict[Tuple[int, bytes], Detection]" = OrderedDict()
+
+
+def _cache_key(text: str) -> Tuple[int, bytes]:
+    # surrogatepass：JSON 中的孤立代理项也能编码
+    return len(text), hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+
+def detect_language(text: str) -> Detection:
+    """检测原文语言，结果以文本摘要为键做 LRU 缓存"""
+    key = _cache_key(text)
+    detection = _cache.get(key)
+    if detection is not None:
+        _cache.move_to_end(key)
+        return detection
+    detection = _cache[key] = _detect(text)
+    if len(_cache) > CACHE_SIZE:
+        _cache.popitem(last=False)
+    return detection
+
+
+def clear_cache() -> None:
+    """清空检测缓存"""
+    _cache.clear()
@@ -0,0 +1,174 @@
+"""
+自适应并发限制模块
+按提供商限制同时进行的上游调用数，超出限制的调用在有界队列中等待；
+并发上限按 AIMD 根据观测到的延迟和 429 响应自动调整
+"""
+
+import os
+import time
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict, Optional
+
+from .tracing import span
+
+
+class QueueFullError(Exception):
+    """等待队列已满或排队超时，调用被拒绝"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} 上游调用排队已满")
+        self.retry_after = retry_after
+
+
+class AdaptiveLimiter:
+    """基于 AIMD 的自适应并发限制器
+
+    - 成功调用的延迟不超过基线延迟的 latency_tolerance 倍且并发已被充分使用时，
+      上限加性增长（约每个往返 +1）
+    - 延迟超过容忍范围时上限乘以 backoff_ratio，遇到 429 时乘以 overload_ratio
+    - 基线延迟取最近 window 次成功调用的最小值
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial_limit: int = 10,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        max_queue: int = 100,
+        queue_timeout: Optional[float] = 10.0,
+        latency_tolerance: float = 2.0,
+        backoff_ratio: float = 0.9,
+        overload_ratio: float = 0.5,
+        window: int = 100
+    ):
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = float(min(max(initial_limit, min_limit), max_limit))
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.latency_tolerance = latency_tolerance
+        self.backoff_ratio = backoff_ratio
+        self.overload_ratio = overload_ratio
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._latencies: Deque[float] = deque(maxlen=window)
+        self.rejected = 0
+        self.overloads = 0
+
+    @classmethod
+    def from_env(cls, name: str) -> "AdaptiveLimiter":
+        """从环境变量读取并发限制参数"""
+        queue_timeout = float(os.getenv("UPSTREAM_QUEUE_TIMEOUT", "10"))
+        return cls(
+            name,
+            initial_limit=int(os.getenv("UPSTREAM_CONCURRENCY_INITIAL", "10")),
+            min_limit=int(os.getenv("UPSTREAM_CONCURRENCY_MIN", "1")),
+            max_limit=int(os.getenv("UPSTREAM_CONCURRENCY_MAX", "64")),
+            max_queue=int(os.getenv("UPSTREAM_QUEUE_SIZE", "100")),
+            queue_timeout=queue_timeout if queue_timeout > 0 else None,
+            latency_tolerance=float(os.getenv("UPSTREAM_LATENCY_TOLERANCE", "2.0"))
+        )
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def retry_after(self) -> float:
+        """按当前队列长度和平均延迟估算排空队列所需的秒数（至少 1 秒）"""
+        if not self._latencies:
+            return 1.0
+        average = sum(self._latencies) / len(self._latencies)
+        return max(1.0, average * (len(self._waiters) + 1) / max(1, int(self.limit)))
+
+    async def acquire(self) -> None:
+        """获取一个并发名额，必要时排队；队列已满或排队超时时抛出 QueueFullError"""
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            return
+
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            raise QueueFullError(self.name, self.retry_after())
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            with span("queue"):
+                await asyncio.wait_for(waiter, self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._discard(waiter)
+            self.rejected += 1
+            raise QueueFullError(self.name, self.retry_after())
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # 名额已经分配给这个等待者，归还给下一个
+                self.release()
+            else:
+                self._discard(waiter)
+            raise
+
+    def release(self) -> None:
+        """归还并发名额并唤醒排队的调用"""
+        self.in_flight -= 1
+        self._wake()
+
+    def _discard(self, waiter: asyncio.Future) -> None:
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    def _wake(self) -> None:
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if waiter.done():
+                continue
+            self.in_flight += 1
+            waiter.set_result(None)
+
+    def on_success(self, latency: float) -> None:
+        """记录一次成功调用并调整上限"""
+        self._latencies.append(latency)
+        baseline = min(self._latencies)
+        if latency <= baseline * self.latency_tolerance:
+            # 只有并发被充分使用时才增长，避免空闲时上限无限膨胀
+            if self.in_flight >= self.limit / 2:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        else:
+            self.limit = max(self.min_limit, self.limit * self.backoff_ratio)
+        self._wake()
+
+    def on_overload(self) -> None:
+        """上游返回 429 时大幅降低上限"""
+        self.overloads += 1
+        self.limit = max(self.min_limit, self.limit * self.overload_ratio)
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """在并发限制下执行一次上游调用，并根据结果调整上限"""
+        await self.acquire()
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            if getattr(e, "status_code", None) == 429:
+                self.on_overload()
+            raise
+        else:
+            self.on_success(time.perf_counter() - start)
+        finally:
+            self.release()
+
+    def stats(self) -> Dict[str, float]:
+        """返回并发限制统计信息"""
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            "rejected": self.rejected,
+            "overloads": self.overloads,
+        }
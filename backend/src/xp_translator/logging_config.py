@@ -0,0 +1,156 @@
+"""
+日志配置模块
+输出结构化 JSON 日志：请求路径上只把日志记录放入内存队列，
+由后台线程的 QueueListener 负责格式化和写出，避免同步写 stdout 阻塞事件循环
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import random
+import logging
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+# 本服务所有日志记录器的公共前缀，与包的导入路径无关
+LOGGER_NAME = "xp_translator"
+
+# LogRecord 自带的属性，其余属性视为通过 extra 传入的结构化字段
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+_listener: Optional[QueueListener] = None
+
+
+def get_logger(name: str) -> logging.Logger:
+    """返回本服务的子日志记录器，例如 get_logger("access")"""
+    return logging.getLogger(f"{LOGGER_NAME}.{name}")
+
+
+class JsonFormatter(logging.Formatter):
+    """将日志记录格式化为单行 JSON，extra 字段原样合并到顶层"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class _EnqueueHandler(QueueHandler):
+    """只入队不预先格式化，格式化在后台线程中完成"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def configure_logging(stream=None) -> QueueListener:
+    """配置本服务的日志记录器（可重复调用，只生效一次）
+
+    环境变量：
+    - LOG_LEVEL：日志级别，默认 INFO
+    - LOG_FORMAT：json（默认）或 text
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    handler = logging.StreamHandler(stream or sys.stdout)
+    if os.getenv("LOG_FORMAT", "json").lower() == "text":
+        handler.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s"))
+    else:
+        handler.setFormatter(JsonFormatter())
+
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    logger.addHandler(_EnqueueHandler(log_queue))
+    logger.propagate = False
+
+    _listener = QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return _listener
+
+
+def shutdown_logging() -> None:
+    """停止后台写出线程并写完队列中剩余的日志"""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    _listener = None
+    logger = logging.getLogger(LOGGER_NAME)
+    for handler in list(logger.handlers):
+        if isinstance(handler, _EnqueueHandler):
+            logger.removeHandler(handler)
+
+
+class AccessLogMiddleware:
+    """ASGI 访问日志中间件
+
+    每个请求在响应结束后记录一行，包含方法、路径、状态码、总耗时、首字节耗时
+    和响应大小。非 5xx 请求按 sample_rate 采样，5xx 请求总是记录。
+    """
+
+    def __init__(self, app, sample_rate: float = 1.0, logger: Optional[logging.Logger] = None):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.logger = logger or get_logger("access")
+
+    @classmethod
+    def sample_rate_from_env(cls) -> float:
+        """从 ACCESS_LOG_SAMPLE_RATE 读取采样率（0 到 1，默认 1）"""
+        return min(1.0, max(0.0, float(os.getenv("ACCESS_LOG_SAMPLE_RATE", "1.0"))))
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.logger.isEnabledFor(logging.INFO):
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        state = {"status": 500, "ttfb": None, "bytes": 0, "cache": None}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+                state["ttfb"] = time.perf_counter() - start
+                for name, value in message.get("headers", ()):
+                    if name == b"x-cache":
+                        state["cache"] = value.decode("latin-1")
+            elif message["type"] == "http.response.body":
+                state["bytes"] += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            status = state["status"]
+            if status >= 500 or self.sample_rate >= 1.0 or random.random() < self.sample_rate:
+                duration = time.perf_counter() - start
+                client = scope.get("client")
+                self.logger.info(
+                    "access",
+                    extra={
+                        "method": scope["method"],
+                        "path": scope["path"],
+                        "status": status,
+                        "duration_ms": round(duration * 1000, 2),
+                        "ttfb_ms": round(state["ttfb"] * 1000, 2) if state["ttfb"] is not None else None,
+                        "bytes": state["bytes"],
+                        "cache": state["cache"],
+                        "client": client[0] if client else None,
+                        "sampled": status < 500 and self.sample_rate < 1.0,
+                    }
+                )
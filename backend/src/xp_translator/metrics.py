@@ -0,0 +1,284 @@
+"""
+Prometheus 指标模块
+实现计数器、仪表和直方图，并以 Prometheus 文本格式导出
+
+指标只在事件循环线程中更新，使用普通的数值累加，不需要加锁；
+每组标签值对应的子指标创建一次后缓存，热路径上的调用方可以提前绑定子指标，
+标签字符串只在抓取时格式化。
+"""
+
+from bisect import bisect_left
+from typing import Dict, List, Sequence, Tuple
+
+# 请求级延迟的直方图桶（秒），覆盖缓存命中到长文本翻译
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+
+class _GaugeChild(_CounterChild):
+    __slots__ = ()
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class _HistogramChild:
+    __slots__ = ("upper_bounds", "counts", "sum", "count")
+
+    def __init__(self, upper_bounds: Tuple[float, ...]):
+        self.upper_bounds = upper_bounds
+        # 每个桶单独计数，导出时再累加成 Prometheus 的累计桶
+        self.counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.upper_bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _Metric:
+    """带标签的指标族，子指标按标签值缓存"""
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+
+    def labels(self, *values: str):
+        """返回指定标签值的子指标（首次访问时创建）"""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} 需要标签 {self.labelnames}")
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        self._children.clear()
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in list(self._children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+    def _render_child(self, values, child) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.upper_bounds = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.upper_bounds)
+
+    def _render_child(self, values, child) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.upper_bounds + (float("inf"),), child.counts):
+            cumulative += count
+            le = f'le="{_format_value(bound)}"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, values, le)} {cumulative}")
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+        lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def clear(self) -> None:
+        """清空所有指标的数据（用于测试）"""
+        for metric in self._metrics:
+            metric.clear()
+
+    def render(self) -> str:
+        """以 Prometheus 文本格式导出所有指标"""
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# 进程级指标注册表
+registry = MetricsRegistry()
+
+REQUESTS_TOTAL = registry.counter(
+    "xp_translation_requests_total",
+    "翻译请求数",
+    ("endpoint", "provider", "model", "direction", "outcome")
+)
+REQUEST_DURATION = registry.histogram(
+    "xp_translation_request_duration_seconds",
+    "翻译请求处理耗时",
+    ("endpoint", "provider", "model", "direction", "outcome")
+)
+REQUESTS_IN_FLIGHT = registry.gauge(
+    "xp_translation_requests_in_flight",
+    "正在处理的翻译请求数",
+    ("endpoint",)
+)
+UPSTREAM_DURATION = registry.histogram(
+    "xp_upstream_request_duration_seconds",
+    "上游模型调用耗时",
+    ("provider", "model", "outcome")
+)
+UPSTREAM_IN_FLIGHT = registry.gauge(
+    "xp_upstream_requests_in_flight",
+    "正在进行的上游模型调用数",
+    ("provider",)
+)
+UPSTREAM_TOKENS = registry.counter(
+    "xp_upstream_tokens_total",
+    "上游 response.usage 报告的 token 数",
+    ("provider", "model", "type")
+)
+PARSE_FALLBACKS = registry.counter(
+    "xp_parse_fallback_total",
+    "模型回复无法解析而使用备用结果的次数",
+    ("provider", "field")
+)
+UPSTREAM_TRUNCATIONS = registry.counter(
+    "xp_upstream_truncated_total",
+    "上游回复因达到 max_tokens 被截断（finish_reason=length）的次数",
+    ("provider", "model")
+)
+REPLY_PARSES = registry.counter(
+    "xp_reply_parse_total",
+    "单条翻译回复的解析次数，按回复格式和是否解析出非空译文区分",
+    ("provider", "format", "outcome")
+)
+UPSTREAM_RETRIES = registry.counter(
+    "xp_upstream_retries_total",
+    "上游调用因瞬时错误重试的次数",
+    ("provider", "reason")
+)
+UPSTREAM_CANCELLED = registry.counter(
+    "xp_upstream_cancelled_total",
+    "进行中的上游调用被取消的次数（客户端断开、截止时间到达或对冲落败），即释放出的上游容量",
+    ("provider", "model")
+)
+SINGLEFLIGHT_CALLS = registry.counter(
+    "xp_singleflight_calls_total",
+    "相同缓存键的上游调用合并情况：leader 发起上游调用，coalesced 加入进行中的调用，cancelled 因无人等待被取消",
+    ("event",)
+)
+HEDGED_REQUESTS = registry.counter(
+    "xp_hedged_requests_total",
+    "对冲执行器的调用数：requests 为总调用数，hedged 为发出了对冲请求的调用数，hedge_wins 为备用提供商胜出的次数",
+    ("event",)
+)
+
+
+class RequestMetrics:
+    """请求级指标（请求数、耗时、进行中请求数）的预绑定表
+
+    每个 (endpoint, outcome) 的表在创建时建好，其下按 provider → model → direction
+    逐级缓存子指标；每组标签值只在第一次出现时调用 labels()，之后的记录只是按字符串
+    逐级查字典，热路径上不创建标签元组。
+    """
+
+    def __init__(self, endpoints: Sequence[str], outcomes: Sequence[str]):
+        self._children: Dict[str, Dict[str, Dict[str, Dict[str, Dict[str, tuple]]]]] = {
+            endpoint: {outcome: {} for outcome in outcomes} for endpoint in endpoints
+        }
+        self.in_flight = {endpoint: REQUESTS_IN_FLIGHT.labels(endpoint) for endpoint in endpoints}
+
+    def record(self, endpoint: str, provider: str, model: str, direction: str, outcome: str, seconds: float) -> None:
+        """记录一次请求的结果和耗时"""
+        by_model = self._children[endpoint][outcome].get(provider)
+        if by_model is None:
+            by_model = self._children[endpoint][outcome][provider] = {}
+        by_direction = by_model.get(model)
+        if by_direction is None:
+            by_direction = by_model[model] = {}
+        children = by_direction.get(direction)
+        if children is None:
+            labels = (endpoint, provider, model, direction, outcome)
+            children = by_direction[direction] = (REQUESTS_TOTAL.labels(*labels), REQUEST_DURATION.labels(*labels))
+        children[0].inc()
+        children[1].observe(seconds)
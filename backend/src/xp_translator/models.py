@@ -66,4 +66,39 @@ class TranslationResponse(BaseModel):
     provider: str = Field(
         default="deepseek",
         description="使用的 AI 提供商"
-    )
\ No newline at end of file
+    )
+    detected_language: Optional[str] = Field(
+        default=None,
+        description="direction=auto 时检测到的原文语言：zh、en 或 unknown"
+    )
+
+
+class BatchTranslationRequest(BaseModel):
+    """批量翻译请求模型"""
+    items: List[TranslationRequest] = Field(
+        min_length=1,
+        max_length=1000,
+        description="翻译条目列表，每个条目与单条翻译请求格式相同，最多1000条"
+    )
+
+
+class BatchTranslationResponse(BaseModel):
+    """批量翻译响应模型"""
+    results: List[TranslationResponse] = Field(
+        description="与请求条目一一对应的翻译结果"
+    )
+
+
+class TokenEstimateResponse(BaseModel):
+    """token 估算响应模型"""
+    direction: TranslationDirection = Field(description="实际使用的翻译方向")
+    provider: str = Field(description="估算所用的 AI 提供商")
+    input_tokens: int = Field(description="原文的估算 token 数")
+    prompt_tokens: int = Field(description="加上固定提示词前缀后的估算 token 数")
+    output_ratio: float = Field(description="该方向当前的输出/输入 token 比例")
+    expected_output_tokens: int = Field(description="预计的输出 token 数")
+    max_tokens: int = Field(description="单次上游调用使用的 max_tokens")
+    calls: int = Field(description="上游调用次数（长文本分段翻译时大于 1）")
+    within_budget: bool = Field(description="是否在预算内；为 false 时翻译接口返回 413")
+    max_input_tokens: int = Field(description="原文 token 数上限")
+    max_output_tokens: int = Field(description="单次调用的输出 token 上限")
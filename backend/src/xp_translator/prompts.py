@@ -0,0 +1,166 @@
+"""
+提示词模块
+DeepSeek 和通义千问共用的提示词。系统提示词和少样本示例构成逐字节固定的前缀，
+每次调用只有最后一条用户消息（翻译方向和原文）不同，使提供商侧的上下文缓存
+（按前缀匹配）能够命中：缓存命中的输入 token 计费更低，首 token 也更快
+
+JSON 输出模式使用另一套同样固定的前缀，要求模型以 JSON 对象回复
+"""
+
+from typing import Dict, List, Tuple
+
+from .language import detect_language
+from .models import TranslationResponse
+
+# 回复格式：text 为 翻译：/关键词： 行格式，json 为 JSON 对象（配合 response_format）
+OUTPUT_FORMATS = ("text", "json")
+
+
+class FallbackReply(tuple):
+    """回复格式不完整时用占位译文或默认关键词补齐的 (translation, keywords)
+
+    比较和解包与普通元组相同；调用方据此不把它写入缓存和翻译记忆
+    """
+
+    __slots__ = ()
+
+SYSTEM_PROMPT = '''你是一个专业的翻译助手，擅长中英文互译和关键词提取。
+
+每条用户消息的第一行给出翻译方向，之后是原文：
+- 方向：中文→英文：把中文原文翻译成英文，关键词用英文
+- 方向：英文→中文：把英文原文翻译成中文，关键词用中文
+
+原文是单条文本时，严格按照以下格式回复：
+翻译：[译文]
+关键词：[关键词1, 关键词2, 关键词3]
+
+原文是多条带编号的条目（[1] ……、[2] ……）时，逐条回复，编号与原文一一对应：
+[1]
+翻译：[译文]
+关键词：[关键词1, 关键词2, 关键词3]
+[2]
+翻译：[译文]
+关键词：[关键词1, 关键词2, 关键词3]
+
+注意：
+1. 翻译要准确自然，每条只翻译对应编号的原文
+2. 为每条原文提取3个最重要的关键词，关键词是名词或短语，语言与译文一致
+3. 关键词用逗号分隔，不要有编号
+4. 只返回上述格式，不要有其他内容'''
+
+# 固定的少样本示例：同时演示两个方向和批量格式，也让前缀达到提供商缓存的最小长度
+FEW_SHOT_MESSAGES: Tuple[Dict[str, str], ...] = (
+    {"role": "user", "content": "方向：中文→英文\n原文：人工智能正在改变我们的生活方式"},
+    {"role": "assistant", "content": "翻译：Artificial intelligence is changing the way we live\n"
+                                     "关键词：[artificial intelligence, lifestyle, change]"},
+    {"role": "user", "content": "方向：英文→中文\n原文：Cloud computing lowers the cost of running software."},
+    {"role": "assistant", "content": "翻译：云计算降低了运行软件的成本。\n关键词：[云计算, 成本, 软件]"},
+    {"role": "user", "content": "方向：中文→英文\n原文：\n[1] 今天天气很好\n[2] 欢迎使用翻译服务"},
+    {"role": "assistant", "content": "[1]\n翻译：The weather is nice today\n关键词：[weather, today, nice]\n"
+                                     "[2]\n翻译：Welcome to the translation service\n"
+                                     "关键词：[welcome, translation, service]"},
+)
+
+# 所有调用共享的前缀，模块加载后不再改变
+PREFIX_MESSAGES: Tuple[Dict[str, str], ...] = (
+    {"role": "system", "content": SYSTEM_PROMPT},
+) + FEW_SHOT_MESSAGES
+
+JSON_SYSTEM_PROMPT = '''你是一个专业的翻译助手，擅长中英文互译和关键词提取。
+
+每条用户消息的第一行给出翻译方向，之后是原文：
+- 方向：中文→英文：把中文原文翻译成英文，关键词用英文
+- 方向：英文→中文：把英文原文翻译成中文，关键词用中文
+
+只回复一个 JSON 对象，格式如下：
+{"translation": "译文", "keywords": ["关键词1", "关键词2", "关键词3"]}
+
+注意：
+1. 翻译要准确自然，原文有多行时译文保留相同的换行（在 JSON 字符串中写作 \\n）
+2. 提取3个最重要的关键词，关键词是名词或短语，语言与译文一致
+3. 不要输出 JSON 以外的任何内容，也不要用代码块包裹'''
+
+JSON_FEW_SHOT_MESSAGES: Tuple[Dict[str, str], ...] = (
+    {"role": "user", "content": "方向：中文→英文\n原文：人工智能正在改变我们的生活方式"},
+    {"role": "assistant", "content": '{"translation": "Artificial intelligence is changing the way we live", '
+                                     '"keywords": ["artificial intelligence", "lifestyle", "change"]}'},
+    {"role": "user", "content": "方向：英文→中文\n原文：Cloud computing lowers costs.\nIt also scales easily."},
+    {"role": "assistant", "content": '{"translation": "云计算降低了成本。\\n它也易于扩展。", '
+                                     '"keywords": ["云计算", "成本", "扩展"]}'},
+)
+
+JSON_PREFIX_MESSAGES: Tuple[Dict[str, str], ...] = (
+    {"role": "system", "content": JSON_SYSTEM_PROMPT},
+) + JSON_FEW_SHOT_MESSAGES
+
+_DIRECTION_LINES = {
+    "zh_to_en": "方向：中文→英文",
+    "en_to_zh": "方向：英文→中文",
+}
+
+
+def resolve_direction(text: str, direction: str) -> str:
+    """将 auto 方向解析为具体的翻译方向（检测为中文时为中文到英文，否则为英文到中文）"""
+    if direction in ("zh_to_en", "en_to_zh"):
+        return direction
+    return "zh_to_en" if detect_language(text).language == "zh" else "en_to_zh"
+
+
+def build_translation_prompt(text: str, direction: str) -> str:
+    """构建单条翻译的用户消息，只包含翻译方向和原文"""
+    return f"{_DIRECTION_LINES[resolve_direction(text, direction)]}\n原文：{text}"
+
+
+def build_batch_prompt(texts: List[str], direction: str) -> str:
+    """构建批量翻译的用户消息，原文按 [n] 编号逐行列出
+
+    Args:
+        texts: 要翻译的文本列表
+        direction: 已确定的翻译方向（zh_to_en 或 en_to_zh）
+    """
+    numbered = "\n".join(f"[{i}] {text}" for i, text in enumerate(texts, start=1))
+    return f"{_DIRECTION_LINES.get(direction, _DIRECTION_LINES['zh_to_en'])}\n原文：\n{numbered}"
+
+
+def build_messages(prompt: str, output_format: str = "text") -> List[Dict[str, str]]:
+    """在固定前缀之后追加本次调用的用户消息，json 格式使用 JSON 模式的前缀"""
+    prefix = JSON_PREFIX_MESSAGES if output_format == "json" else PREFIX_MESSAGES
+    return [*prefix, {"role": "user", "content": prompt}]
+
+
+def parse_reply(content: str) -> Tuple[str, List[str]]:
+    """解析 翻译：/关键词： 格式的回复，缺失的部分返回空值
+
+    翻译： 之后到 关键词： 之前的续行属于译文，多行译文保留换行
+    """
+    translation_lines: List[str] = []
+    keywords: List[str] = []
+    in_translation = False
+    for line in content.split('\n'):
+        line = line.strip()
+        if line.startswith("翻译："):
+            translation_lines = [line[len("翻译："):].strip()]
+            in_translation = True
+        elif line.startswith("关键词："):
+            keywords_str = line[len("关键词："):].strip()
+            # 移除方括号并分割
+            if keywords_str.startswith('[') and keywords_str.endswith(']'):
+                keywords_str = keywords_str[1:-1]
+            keywords = [k.strip() for k in keywords_str.split(',')]
+            in_translation = False
+        elif in_translation:
+            translation_lines.append(line)
+    return "\n".join(translation_lines).strip(), keywords
+
+
+def parse_json_reply(content: str) -> TranslationResponse:
+    """把 JSON 模式的回复直接校验为 TranslationResponse（pydantic-core 解析，不经过 json.loads）
+
+    回复不是合法 JSON、缺少字段或译文为空时抛出 ValueError（pydantic 的 ValidationError
+    是其子类），不生成占位结果
+    """
+    reply = TranslationResponse.model_validate_json(content)
+    if not reply.translation.strip():
+        raise ValueError("JSON 回复中的译文为空")
+    reply.keywords = [keyword.strip() for keyword in reply.keywords if keyword.strip()][:3]
+    return reply
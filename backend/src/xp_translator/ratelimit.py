@@ -0,0 +1,194 @@
+"""
+上游配额限速模块
+按提供商的每分钟请求数（RPM）和每分钟 token 数（TPM）配额用令牌桶为上游调用排速，
+并根据上游返回的限速响应头和 Retry-After 自动校准，调用方只会被延后而不会报错
+"""
+
+import os
+import re
+import time
+import asyncio
+from typing import Dict, Mapping, Optional
+
+from .tracing import span
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """解析限速响应头中的时长，支持 "1.5"、"20ms"、"6m0s" 等格式，返回秒数"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    units = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+    return sum(float(number) * units[unit] for number, unit in parts)
+
+
+def _parse_int(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(float(value)) if value is not None else None
+    except ValueError:
+        return None
+
+
+class TokenBucket:
+    """按分钟配额匀速补充的令牌桶
+
+    采用预约方式：取用时直接扣减（允许为负），返回需要等待的秒数，
+    因此并发的调用方按到达顺序依次排速。
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / 60.0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount: float) -> float:
+        """预约 amount 个令牌，返回需要等待的秒数"""
+        self._refill()
+        # 单次调用超过整个桶容量时按满桶计，避免永远等不到
+        self.tokens -= min(amount, self.capacity)
+        return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+    def refund(self, amount: float) -> None:
+        """归还未实际使用的令牌"""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+    def set_capacity(self, per_minute: float) -> None:
+        """按上游公布的配额调整容量"""
+        self._refill()
+        self.capacity = float(per_minute)
+        self.tokens = min(self.tokens, self.capacity)
+
+    def sync_remaining(self, remaining: float) -> None:
+        """用上游公布的剩余额度校准，只向下调整（本地可能还有未计入的预约）"""
+        self._refill()
+        self.tokens = min(self.tokens, float(remaining))
+
+    def available(self) -> float:
+        self._refill()
+        return self.tokens
+
+
+class ProviderRateLimiter:
+    """单个提供商的 RPM/TPM 排速器
+
+    未配置配额时，在首次收到上游的 x-ratelimit-limit-* 响应头后自动创建对应的令牌桶；
+    收到 Retry-After 或剩余额度为 0 时，在重置之前暂停所有新调用。
+    """
+
+    def __init__(self, name: str, rpm: Optional[int] = None, tpm: Optional[int] = None):
+        self.name = name
+        self.requests: Optional[TokenBucket] = TokenBucket(rpm) if rpm else None
+        self.tokens: Optional[TokenBucket] = TokenBucket(tpm) if tpm else None
+        self._paused_until = 0.0
+        self.paced = 0
+        self.waited_seconds = 0.0
+
+    @classmethod
+    def from_env(cls, name: str) -> "ProviderRateLimiter":
+        """从 <PROVIDER>_RPM 和 <PROVIDER>_TPM 环境变量读取配额（0 或未设置表示不限制）"""
+        prefix = name.upper()
+        return cls(
+            name,
+            rpm=int(os.getenv(f"{prefix}_RPM", "0")),
+            tpm=int(os.getenv(f"{prefix}_TPM", "0"))
+        )
+
+    def reserve(self, tokens: int) -> float:
+        """预约一次调用和 tokens 个 token，返回需要等待的秒数"""
+        wait = max(0.0, self._paused_until - time.monotonic())
+        if self.requests is not None:
+            wait = max(wait, self.requests.reserve(1))
+        if self.tokens is not None:
+            wait = max(wait, self.tokens.reserve(tokens))
+        return wait
+
+    async def acquire(self, tokens: int) -> None:
+        """等待直到配额允许发出一次调用"""
+        wait = self.reserve(tokens)
+        if wait <= 0:
+            return
+        self.paced += 1
+        self.waited_seconds += wait
+        try:
+            with span("rate_limit"):
+                await asyncio.sleep(wait)
+        except asyncio.CancelledError:
+            self.refund(tokens, requests=1)
+            raise
+
+    def refund(self, tokens: float, requests: int = 0) -> None:
+        """归还没有用掉的配额"""
+        if self.requests is not None and requests:
+            self.requests.refund(requests)
+        if self.tokens is not None and tokens > 0:
+            self.tokens.refund(tokens)
+
+    def settle(self, reserved: int, used: int) -> None:
+        """调用完成后按实际 token 用量修正预约"""
+        if self.tokens is None:
+            return
+        if used < reserved:
+            self.tokens.refund(reserved - used)
+        else:
+            self.tokens.reserve(used - reserved)
+
+    def pause(self, seconds: float) -> None:
+        """在 seconds 秒内暂停新的调用"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def observe(self, headers: Mapping[str, str], status_code: int = 200) -> None:
+        """根据上游响应头校准令牌桶"""
+        for kind in ("requests", "tokens"):
+            limit = _parse_int(headers.get(f"x-ratelimit-limit-{kind}"))
+            remaining = _parse_int(headers.get(f"x-ratelimit-remaining-{kind}"))
+            reset = parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+
+            bucket = getattr(self, kind)
+            if limit:
+                if bucket is None:
+                    bucket = TokenBucket(limit)
+                    setattr(self, kind, bucket)
+                elif bucket.capacity != limit:
+                    bucket.set_capacity(limit)
+            if bucket is not None and remaining is not None:
+                bucket.sync_remaining(remaining)
+            if remaining == 0 and reset:
+                self.pause(reset)
+
+        retry_after = parse_duration(headers.get("retry-after"))
+        if retry_after is None and status_code == 429:
+            # 没有给出等待时间的 429，保守地暂停一秒
+            retry_after = 1.0
+        if retry_after:
+            self.pause(retry_after)
+
+    def stats(self) -> Dict[str, object]:
+        """返回排速统计信息"""
+        return {
+            "rpm": self.requests.capacity if self.requests is not None else None,
+            "tpm": self.tokens.capacity if self.tokens is not None else None,
+            "requests_available": round(self.requests.available(), 2) if self.requests is not None else None,
+            "tokens_available": round(self.tokens.available(), 2) if self.tokens is not None else None,
+            "paused_for": round(max(0.0, self._paused_until - time.monotonic()), 3),
+            "paced": self.paced,
+            "waited_seconds": round(self.waited_seconds, 3),
+        }
@@ -0,0 +1,225 @@
+"""
+重试与截止时间模块
+上游调用的瞬时错误（5xx、429、连接中断、超时）按指数退避加完全抖动（full jitter）重试，
+参数错误、鉴权失败等其余错误立即返回
+
+请求的截止时间通过 contextvars 传递，同一请求内的所有上游调用（包括分段、对冲和故障切换
+产生的子任务）共享它：每次尝试的超时收缩到剩余时间，剩余时间不够退避时不再重试，
+重试不会让请求超过截止时间。合并后由多个请求共享的上游任务不带截止时间（no_deadline），
+每个请求只在等待时执行自己的截止时间
+"""
+
+import os
+import time
+import random
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Dict, Iterator, Optional, TypeVar
+
+import httpx
+import openai
+
+T = TypeVar("T")
+
+# 当前请求的截止时间（time.monotonic() 时刻），None 表示没有截止时间
+_deadline: ContextVar[Optional[float]] = ContextVar("xp_translator_deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """请求的截止时间已到"""
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]) -> Iterator[None]:
+    """在 with 块内设置从现在起 seconds 秒的截止时间，外层已有更早的截止时间时沿用外层的"""
+    if seconds is None:
+        yield
+        return
+    deadline = time.monotonic() + seconds
+    outer = _deadline.get()
+    if outer is not None:
+        deadline = min(deadline, outer)
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        try:
+            _deadline.reset(token)
+        except ValueError:
+            # 在异步生成器中使用时，生成器可能在另一个上下文中被关闭
+            pass
+
+
+@contextmanager
+def no_deadline() -> Iterator[None]:
+    """在 with 块内清除截止时间
+
+    由多个请求共享的上游任务在其中运行：任务创建时复制的是首个请求的上下文，
+    不清除的话所有等待者都会受首个请求的截止时间约束。各等待者用 within_deadline
+    执行自己的截止时间，最后一个等待者离开时共享任务被取消
+    """
+    token = _deadline.set(None)
+    try:
+        yield
+    finally:
+        try:
+            _deadline.reset(token)
+        except ValueError:
+            pass
+
+
+def remaining() -> Optional[float]:
+    """距离截止时间的秒数（可能为负），没有截止时间时返回 None"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+class _Expired(TimeoutError):
+    """_run_within 的等待时间已到"""
+
+
+async def _run_within(awaitable: Awaitable[T], timeout: float) -> T:
+    """等待 awaitable 至多 timeout 秒；超时时取消它，等它清理完毕后抛出 _Expired
+
+    与 asyncio.wait_for 不同，awaitable 自己抛出的 TimeoutError 原样传递，不会被当成超时
+    （asyncio.timeout 可以区分两者，但需要 Python 3.11）
+    """
+    task = asyncio.ensure_future(awaitable)
+    try:
+        await asyncio.wait((task,), timeout=timeout)
+    finally:
+        # 调用方被取消时一并取消
+        if not task.done():
+            task.cancel()
+    if task.done() and not task.cancelled():
+        return task.result()
+    # 等被取消的调用释放并发名额等资源后再返回，避免与下一次尝试重叠
+    await asyncio.wait((task,))
+    if not task.cancelled():
+        task.exception()
+    raise _Expired()
+
+
+async def within_deadline(awaitable: Awaitable[T]) -> T:
+    """等待 awaitable，截止时间到达时取消它并抛出 DeadlineExceeded"""
+    left = remaining()
+    if left is None:
+        return await awaitable
+    try:
+        return await _run_within(awaitable, max(left, 0.0))
+    except _Expired:
+        raise DeadlineExceeded("请求已超过截止时间") from None
+
+
+def classify(error: BaseException) -> Optional[str]:
+    """返回可重试错误的原因（timeout / connection / rate_limited / server_error），不可重试时返回 None"""
+    # APITimeoutError 是 APIConnectionError 的子类，先判断
+    if isinstance(error, (openai.APITimeoutError, TimeoutError, httpx.TimeoutException)):
+        return "timeout"
+    if isinstance(error, (openai.APIConnectionError, httpx.TransportError)):
+        return "connection"
+    if isinstance(error, openai.APIStatusError):
+        if error.status_code == 429:
+            return "rate_limited"
+        if error.status_code == 408:
+            return "timeout"
+        if error.status_code >= 500:
+            return "server_error"
+    return None
+
+
+class RetryPolicy:
+    """上游调用的重试策略
+
+    第 n 次重试前等待 uniform(0, min(max_delay, base_delay × 2ⁿ)) 秒；每次尝试的超时为
+    attempt_timeout 与截止时间剩余秒数中的较小者。429 的 Retry-After 由配额排速处理，
+    下一次尝试会在 acquire 时等待。
+    """
+
+    def __init__(
+        self,
+        max_retries: int = 2,
+        base_delay: float = 0.2,
+        max_delay: float = 5.0,
+        attempt_timeout: float = 30.0,
+        rng: Optional[random.Random] = None
+    ):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.attempt_timeout = attempt_timeout
+        self._rng = rng or random.Random()
+        self.retries = 0
+        self.deadline_exceeded = 0
+
+    @classmethod
+    def from_env(cls) -> "RetryPolicy":
+        """从环境变量创建实例"""
+        return cls(
+            max_retries=int(os.getenv("UPSTREAM_MAX_RETRIES", "2")),
+            base_delay=float(os.getenv("UPSTREAM_RETRY_BASE_DELAY", "0.2")),
+            max_delay=float(os.getenv("UPSTREAM_RETRY_MAX_DELAY", "5.0")),
+            attempt_timeout=float(os.getenv("UPSTREAM_ATTEMPT_TIMEOUT", "30"))
+        )
+
+    def backoff(self, retry: int) -> float:
+        """第 retry 次重试（从 0 开始）前的等待秒数"""
+        return self._rng.uniform(0.0, min(self.max_delay, self.base_delay * 2 ** retry))
+
+    def attempt_budget(self) -> float:
+        """本次尝试的超时；截止时间已到时抛出 DeadlineExceeded"""
+        left = remaining()
+        if left is None:
+            return self.attempt_timeout
+        if left <= 0:
+            self.deadline_exceeded += 1
+            raise DeadlineExceeded("请求已超过截止时间")
+        return min(self.attempt_timeout, left)
+
+    async def run(
+        self,
+        attempt: Callable[[float], Awaitable[T]],
+        on_retry: Optional[Callable[[str], None]] = None
+    ) -> T:
+        """执行 attempt(timeout)，可重试的错误按退避重试
+
+        Args:
+            attempt: 一次尝试，参数为本次尝试的超时秒数
+            on_retry: 每次重试前以错误原因调用
+        """
+        retry = 0
+        while True:
+            timeout = self.attempt_budget()
+            try:
+                return await _run_within(attempt(timeout), timeout)
+            except Exception as e:
+                reason = classify(e)
+                if reason is None:
+                    raise
+                left = remaining()
+                if left is not None and left <= 0:
+                    self.deadline_exceeded += 1
+                    raise DeadlineExceeded("请求已超过截止时间") from e
+                error = e
+                if isinstance(e, _Expired):
+                    error = TimeoutError(f"上游调用超过 {timeout:.3g} 秒未完成")
+                if retry >= self.max_retries:
+                    raise error
+                delay = self.backoff(retry)
+                if left is not None and delay >= left:
+                    # 退避后已经没有时间再试一次，直接返回这次的错误
+                    raise error
+                if on_retry is not None:
+                    on_retry(reason)
+                self.retries += 1
+                retry += 1
+                await asyncio.sleep(delay)
+
+    def stats(self) -> Dict[str, int]:
+        """返回重试统计信息"""
+        return {
+            "max_retries": self.max_retries,
+            "retries": self.retries,
+            "deadline_exceeded": self.deadline_exceeded,
+        }
@@ -0,0 +1,303 @@
+"""
+提供商路由模块
+为每个提供商维护熔断器，按健康状况选择提供商：熔断打开的提供商直接跳过，
+运行时失败自动切换到下一个健康的提供商，熔断时间结束后通过半开探测恢复
+"""
+
+import os
+import time
+import asyncio
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple, TypeVar
+
+from .limiter import QueueFullError
+from .retry import DeadlineExceeded
+
+T = TypeVar("T")
+
+# 真实提供商的优先顺序：请求的提供商排在最前，其余按此顺序作为备用
+PROVIDER_ORDER = ["deepseek", "aliyun"]
+
+
+class CircuitOpenError(Exception):
+    """熔断器打开，拒绝调用"""
+
+
+class NoHealthyProviderError(Exception):
+    """所有提供商的熔断器都处于打开状态"""
+
+    def __init__(self, retry_after: float):
+        super().__init__("所有 AI 提供商暂时不可用")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """基于滑动时间窗口的熔断器
+
+    - closed：正常放行，窗口内调用数达到 min_calls 且错误率或慢调用率超过阈值时打开
+    - open：拒绝所有调用，open_duration 秒后进入半开
+    - half_open：最多放行 half_open_max_calls 个探测调用，成功则关闭，失败则重新打开
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        window_seconds: float = 60.0,
+        min_calls: int = 10,
+        failure_rate_threshold: float = 0.5,
+        slow_call_seconds: float = 10.0,
+        slow_call_rate_threshold: float = 0.8,
+        open_duration: float = 30.0,
+        half_open_max_calls: int = 1
+    ):
+        self.name = name
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.open_duration = open_duration
+        self.half_open_max_calls = half_open_max_calls
+        self._state = self.CLOSED
+        # (时间戳, 是否失败, 是否慢调用)
+        self._calls: Deque[Tuple[float, bool, bool]] = deque()
+        self._failures = 0
+        self._slow = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self.times_opened = 0
+
+    @classmethod
+    def from_env(cls, name: str) -> "CircuitBreaker":
+        """从环境变量读取熔断参数"""
+        return cls(
+            name,
+            window_seconds=float(os.getenv("CIRCUIT_WINDOW_SECONDS", "60")),
+            min_calls=int(os.getenv("CIRCUIT_MIN_CALLS", "10")),
+            failure_rate_threshold=float(os.getenv("CIRCUIT_FAILURE_RATE", "0.5")),
+            slow_call_seconds=float(os.getenv("CIRCUIT_SLOW_CALL_SECONDS", "10")),
+            slow_call_rate_threshold=float(os.getenv("CIRCUIT_SLOW_CALL_RATE", "0.8")),
+            open_duration=float(os.getenv("CIRCUIT_OPEN_SECONDS", "30"))
+        )
+
+    @property
+    def state(self) -> str:
+        """当前状态；打开时间结束后自动变为半开"""
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.open_duration:
+            self._state = self.HALF_OPEN
+            self._probes = 0
+        return self._state
+
+    def retry_after(self) -> float:
+        """距离进入半开状态的剩余秒数"""
+        if self.state != self.OPEN:
+            return 0.0
+        return max(0.0, self.open_duration - (time.monotonic() - self._opened_at))
+
+    def available(self) -> bool:
+        """是否可能放行调用（不占用半开探测名额）"""
+        state = self.state
+        if state == self.OPEN:
+            return False
+        return state == self.CLOSED or self._probes < self.half_open_max_calls
+
+    def try_acquire(self) -> bool:
+        """申请一次调用许可，半开状态下占用一个探测名额"""
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and self._probes < self.half_open_max_calls:
+            self._probes += 1
+            return True
+        return False
+
+    def release(self) -> None:
+        """调用被取消、没有结果时归还许可"""
+        if self._state == self.HALF_OPEN and self._probes > 0:
+            self._probes -= 1
+
+    def record_success(self, latency: float) -> None:
+        if self._state == self.HALF_OPEN:
+            self._close()
+            return
+        self._record(False, latency)
+
+    def record_failure(self, latency: float) -> None:
+        if self._state == self.HALF_OPEN:
+            self._open()
+            return
+        self._record(True, latency)
+
+    def _record(self, failed: bool, latency: float) -> None:
+        now = time.monotonic()
+        slow = latency >= self.slow_call_seconds
+        self._calls.append((now, failed, slow))
+        self._failures += failed
+        self._slow += slow
+        self._trim(now)
+
+        if self._state == self.CLOSED and len(self._calls) >= self.min_calls:
+            if (self.failure_rate >= self.failure_rate_threshold
+                    or self.slow_call_rate >= self.slow_call_rate_threshold):
+                self._open()
+
+    def _trim(self, now: float) -> None:
+        cutoff = now - self.window_seconds
+        while self._calls and self._calls[0][0] < cutoff:
+            _, failed, slow = self._calls.popleft()
+            self._failures -= failed
+            self._slow -= slow
+
+    def _open(self) -> None:
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._probes = 0
+        self.times_opened += 1
+
+    def _close(self) -> None:
+        self._state = self.CLOSED
+        self._calls.clear()
+        self._failures = 0
+        self._slow = 0
+        self._probes = 0
+
+    @property
+    def failure_rate(self) -> float:
+        return self._failures / len(self._calls) if self._calls else 0.0
+
+    @property
+    def slow_call_rate(self) -> float:
+        return self._slow / len(self._calls) if self._calls else 0.0
+
+    def snapshot(self) -> Dict[str, object]:
+        """返回熔断器状态，用于健康检查"""
+        self._trim(time.monotonic())
+        return {
+            "state": self.state,
+            "calls": len(self._calls),
+            "failure_rate": round(self.failure_rate, 4),
+            "slow_call_rate": round(self.slow_call_rate, 4),
+            "times_opened": self.times_opened,
+            "retry_after": round(self.retry_after(), 3),
+        }
+
+
+class ProviderRouter:
+    """按熔断器状态在提供商之间路由请求"""
+
+    def __init__(self, registry, breaker_factory: Optional[Callable[[str], CircuitBreaker]] = None):
+        self.registry = registry
+        self._breaker_factory = breaker_factory or CircuitBreaker.from_env
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self.failovers = 0
+
+    def breaker(self, provider: str) -> CircuitBreaker:
+        breaker = self._breakers.get(provider)
+        if breaker is None:
+            breaker = self._breakers[provider] = self._breaker_factory(provider)
+        return breaker
+
+    def route(self, provider: str) -> List[Tuple[str, object]]:
+        """按优先顺序返回当前可用的 (提供商, 客户端) 列表
+
+        请求的提供商排在最前，其余已配置的真实提供商作为备用；未配置
+        （已降级为其他客户端）的提供商被跳过。没有任何真实提供商配置时
+        使用模拟客户端。熔断打开的提供商不会出现在结果中。
+        """
+        if provider not in PROVIDER_ORDER:
+            return [(provider, self.registry.get(provider))]
+
+        names = [provider] + [name for name in PROVIDER_ORDER if name != provider]
+        configured = [
+            (name, self.registry.get(name))
+            for name in names
+            if self.registry.is_configured(name)
+        ]
+
+        if not configured:
+            return [("mock", self.registry.get("mock"))]
+        return [(name, client) for name, client in configured if self.breaker(name).available()]
+
+    def retry_after(self) -> float:
+        """所有提供商都熔断时，距离最早恢复探测的秒数"""
+        waits = [breaker.retry_after() for breaker in self._breakers.values() if breaker.state == breaker.OPEN]
+        return min(waits) if waits else 0.0
+
+    def select(self, provider: str):
+        """返回当前首选的健康客户端（不记录调用结果）"""
+        routes = self.route(provider)
+        if not routes:
+            raise NoHealthyProviderError(self.retry_after())
+        return routes[0][1]
+
+    async def call(self, provider: str, client, fn: Callable[[object], Awaitable[T]]) -> T:
+        """在熔断器保护下调用一次提供商"""
+        breaker = self.breaker(provider)
+        if not breaker.try_acquire():
+            raise CircuitOpenError(f"{provider} 熔断器已打开")
+
+        start = time.perf_counter()
+        try:
+            result = await fn(client)
+        except (asyncio.CancelledError, QueueFullError, DeadlineExceeded):
+            # 被取消、本地排队已满或请求的截止时间已到时不计入熔断统计：
+            # 截止时间由调用方决定，很短的截止时间不应使提供商熔断
+            breaker.release()
+            raise
+        except Exception:
+            breaker.record_failure(time.perf_counter() - start)
+            raise
+        breaker.record_success(time.perf_counter() - start)
+        return result
+
+    async def call_with_failover(
+        self,
+        routes: List[Tuple[str, object]],
+        fn: Callable[[object], Awaitable[T]]
+    ) -> Tuple[T, str]:
+        """依次尝试各路由，返回 (结果, 实际返回结果的提供商)
+
+        某个提供商调用失败或排队已满时切换到下一个；全部失败时抛出最后一个错误，
+        全部排队已满时抛出 QueueFullError，全部被熔断拒绝时抛出 NoHealthyProviderError。
+        请求的截止时间已到时直接抛出 DeadlineExceeded，不再切换。
+        """
+        last_error: Optional[Exception] = None
+        queue_full: Optional[QueueFullError] = None
+        for name, client in routes:
+            try:
+                result = await self.call(name, client, fn)
+            except CircuitOpenError:
+                continue
+            except DeadlineExceeded:
+                raise
+            except QueueFullError as e:
+                queue_full = e
+                continue
+            except Exception as e:
+                last_error = e
+                continue
+            if last_error is not None:
+                self.failovers += 1
+            return result, name
+
+        if last_error is not None:
+            raise last_error
+        if queue_full is not None:
+            raise queue_full
+        raise NoHealthyProviderError(self.retry_after())
+
+    def reset(self) -> None:
+        """清空所有熔断器状态"""
+        self._breakers.clear()
+        self.failovers = 0
+
+    def snapshot(self) -> Dict[str, object]:
+        """返回各提供商熔断器状态"""
+        return {
+            "failovers": self.failovers,
+            "breakers": {name: breaker.snapshot() for name, breaker in self._breakers.items()},
+        }
@@ -0,0 +1,174 @@
+"""
+长文本分段模块
+按段落和句子边界将中英文长文本切分成适合模型处理的片段，并发翻译后按顺序重新拼接
+"""
+
+import re
+import asyncio
+from typing import List, NamedTuple, Tuple
+
+from .prompts import FallbackReply
+from .tokens import estimate_tokens
+
+# 单个片段的默认输入 token 上限，保证译文能放进单次调用的 max_tokens
+DEFAULT_CHUNK_MAX_TOKENS = 300
+# 同一请求内并发翻译的片段数上限
+DEFAULT_CHUNK_CONCURRENCY = 4
+
+# 段落边界：任意包含换行的空白
+_PARAGRAPH_BREAK = re.compile(r"\s*\n\s*")
+# 句子边界：中文句末标点之后，或英文句末标点后跟空白
+_SENTENCE_END = re.compile(r"(?<=[。！？；…])|(?<=[.!?;])\s+")
+# 句内次级边界：逗号、顿号、冒号之后
+_CLAUSE_END = re.compile(r"(?<=[，、：,:])\s*")
+
+
+class TextChunk(NamedTuple):
+    """切分后的文本片段"""
+    text: str
+    # 片段之后的原始段落分隔符（包含换行），同一段落内的片段为空字符串
+    separator: str
+
+
+def split_sentences(paragraph: str) -> List[str]:
+    """将一个段落切分为句子，保留句末标点"""
+    return [s for s in (part.strip() for part in _SENTENCE_END.split(paragraph)) if s]
+
+
+def _split_oversized(sentence: str, max_tokens: int) -> List[str]:
+    """将超过上限的句子先按分句标点、再按固定长度切开"""
+    pieces: List[str] = []
+    for clause in (c for c in _CLAUSE_END.split(sentence) if c):
+        while estimate_tokens(clause) > max_tokens:
+            # 中文按字、英文按词切分，尽量不截断单词
+            cut = max_tokens
+            if estimate_tokens(clause[:cut]) < max_tokens:
+                cut = max_tokens * 4
+                space = clause.rfind(" ", 0, cut)
+                if space > 0:
+                    cut = space
+            pieces.append(clause[:cut].strip())
+            clause = clause[cut:].strip()
+        if clause:
+            pieces.append(clause)
+    return pieces
+
+
+def chunk_text(text: str, max_tokens: int = DEFAULT_CHUNK_MAX_TOKENS) -> List[TextChunk]:
+    """按段落和句子边界切分文本，每个片段的估算 token 数不超过 max_tokens
+
+    同一段落内的相邻句子会合并到同一片段，段落边界总是片段边界。
+    """
+    chunks: List[TextChunk] = []
+    position = 0
+    text = text.strip()
+
+    for match in list(_PARAGRAPH_BREAK.finditer(text)) + [None]:
+        end = match.start() if match else len(text)
+        separator = match.group(0) if match else ""
+        paragraph = text[position:end]
+        position = match.end() if match else len(text)
+        if not paragraph.strip():
+            continue
+
+        current: List[str] = []
+        used = 0
+        paragraph_chunks: List[str] = []
+        for sentence in split_sentences(paragraph):
+            for piece in (_split_oversized(sentence, max_tokens) if estimate_tokens(sentence) > max_tokens else [sentence]):
+                cost = estimate_tokens(piece)
+                if current and used + cost > max_tokens:
+                    paragraph_chunks.append(_join_source(current))
+                    current, used = [], 0
+                current.append(piece)
+                used += cost
+        if current:
+            paragraph_chunks.append(_join_source(current))
+
+        for i, chunk in enumerate(paragraph_chunks):
+            is_last = i == len(paragraph_chunks) - 1
+            chunks.append(TextChunk(chunk, separator if is_last else ""))
+
+    if chunks:
+        chunks[-1] = TextChunk(chunks[-1].text, "")
+    return chunks
+
+
+def _join_source(sentences: List[str]) -> str:
+    """拼接同一片段内的原文句子：英文句子之间保留空格"""
+    joined = sentences[0]
+    for sentence in sentences[1:]:
+        if joined[-1].isascii() and sentence[0].isascii():
+            joined += " "
+        joined += sentence
+    return joined
+
+
+def join_translations(translations: List[str], chunks: List[TextChunk], direction: str) -> str:
+    """按原文顺序拼接各片段译文，段落分隔符保持不变
+
+    Args:
+        translations: 与 chunks 一一对应的译文
+        chunks: 原文片段
+        direction: 已确定的翻译方向，目标语言为英文时同一段落内的片段以空格连接
+    """
+    inline_joiner = " " if direction == "zh_to_en" else ""
+    parts: List[str] = []
+    for i, (translation, chunk) in enumerate(zip(translations, chunks)):
+        parts.append(translation.strip())
+        if i < len(chunks) - 1:
+            parts.append(chunk.separator if chunk.separator else inline_joiner)
+    return "".join(parts)
+
+
+def merge_keywords(keyword_lists: List[List[str]], limit: int = 3) -> List[str]:
+    """合并多个片段的关键词：按出现次数排序，次数相同时按首次出现顺序"""
+    counts = {}
+    first_seen = {}
+    display = {}
+    for keywords in keyword_lists:
+        for keyword in keywords:
+            normalized = keyword.strip().lower()
+            if not normalized:
+                continue
+            counts[normalized] = counts.get(normalized, 0) + 1
+            if normalized not in first_seen:
+                first_seen[normalized] = len(first_seen)
+                display[normalized] = keyword.strip()
+    ranked = sorted(counts, key=lambda k: (-counts[k], first_seen[k]))
+    return [display[k] for k in ranked[:limit]]
+
+
+async def translate_chunked(
+    client,
+    text: str,
+    direction: str,
+    max_tokens: int = DEFAULT_CHUNK_MAX_TOKENS,
+    concurrency: int = DEFAULT_CHUNK_CONCURRENCY
+) -> Tuple[str, List[str]]:
+    """翻译长文本：切分后并发翻译各片段，再按顺序拼接译文并合并关键词
+
+    Args:
+        client: AI 客户端
+        text: 要翻译的文本
+        direction: 已确定的翻译方向（zh_to_en 或 en_to_zh），所有片段使用同一方向
+        max_tokens: 单个片段的输入 token 上限
+        concurrency: 同时翻译的片段数上限
+    """
+    chunks = chunk_text(text, max_tokens)
+    if len(chunks) <= 1:
+        return await client.translate_and_extract(text, direction)
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def translate_one(chunk: TextChunk):
+        async with semaphore:
+            return await client.translate_and_extract(chunk.text, direction)
+
+    results = await asyncio.gather(*(translate_one(chunk) for chunk in chunks))
+    translation = join_translations([t for t, _ in results], chunks, direction)
+    keywords = merge_keywords([k for _, k in results])
+    if any(isinstance(result, FallbackReply) for result in results):
+        # 任一片段用了占位结果时整段都不写入缓存
+        return FallbackReply((translation, keywords))
+    return translation, keywords
@@ -0,0 +1,81 @@
+"""
+并发请求合并（single-flight）模块
+相同键的并发调用共享同一个上游任务，只发起一次上游请求
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+from .metrics import SINGLEFLIGHT_CALLS
+
+T = TypeVar("T")
+
+
+class _Call:
+    """一次进行中的上游调用及其等待者数量"""
+
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """按键合并进行中的异步调用
+
+    第一个调用者创建上游任务，之后到达的相同键调用直接等待该任务：
+    - 上游抛出的异常会传递给所有等待者
+    - 单个等待者被取消只影响它自己；所有等待者都离开后上游任务才会被取消
+    - 上游任务本身被取消时，所有等待者都会收到 CancelledError
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.cancelled = 0
+        self._leader_calls = SINGLEFLIGHT_CALLS.labels("leader")
+        self._coalesced_calls = SINGLEFLIGHT_CALLS.labels("coalesced")
+        self._cancelled_calls = SINGLEFLIGHT_CALLS.labels("cancelled")
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """执行 fn 或加入相同键的进行中调用，返回其结果"""
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _task: self._forget(key, call))
+            self.leaders += 1
+            self._leader_calls.inc()
+        else:
+            self.coalesced += 1
+            self._coalesced_calls.inc()
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # 没有人再等待结果，取消上游调用以释放资源
+                call.task.cancel()
+                self._forget(key, call)
+                self.cancelled += 1
+                self._cancelled_calls.inc()
+
+    def _forget(self, key: Hashable, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def stats(self) -> Dict[str, int]:
+        """返回合并统计信息"""
+        return {
+            "in_flight": len(self._calls),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "cancelled": self.cancelled,
+        }
@@ -0,0 +1,170 @@
+"""
+Token 预算模块
+本地估算中英文文本的 token 数，按原文长度和每个翻译方向实际观察到的输出/输入比例
+计算每次调用的 max_tokens：长文本不会因 max_tokens 过小被截断，短文本也不会预约过多
+输出额度；超出预算的输入在调用上游之前被拒绝（413）
+"""
+
+import os
+import re
+import math
+from typing import Dict, NamedTuple, Optional
+
+from .language import CJK_RANGES
+from .prompts import PREFIX_MESSAGES
+
+_CJK_RUN = re.compile(f"[{CJK_RANGES}]+")
+
+# 回复中译文以外的固定输出：翻译：/关键词： 两个前缀和三个关键词
+REPLY_OVERHEAD_TOKENS = 30
+# 输出 token 数与原文估算 token 数之比的初始值，之后按实际用量调整
+DEFAULT_OUTPUT_RATIOS = {"zh_to_en": 1.0, "en_to_zh": 1.5}
+# 原文太短时固定开销占主导，不用于更新比例
+MIN_OBSERVE_INPUT_TOKENS = 8
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算文本的 token 数：汉字约 1 token/字，其余约 4 字符/token
+
+    对两家提供商的分词器都略为高估，用作预算时偏安全
+    """
+    if text.isascii():
+        return (len(text) + 3) // 4
+    cjk = sum(map(len, _CJK_RUN.findall(text)))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+# 固定前缀（系统提示词和少样本示例）加用户消息中方向行的 token 数
+PROMPT_OVERHEAD_TOKENS = sum(estimate_tokens(message["content"]) for message in PREFIX_MESSAGES) + 10
+
+
+class TokenEstimate(NamedTuple):
+    direction: str
+    # 原文的估算 token 数
+    input_tokens: int
+    # 加上固定前缀后整个提示词的估算 token 数
+    prompt_tokens: int
+    output_ratio: float
+    # 按当前比例预计的输出 token 数（不含安全余量）
+    expected_output_tokens: int
+    # 单次上游调用使用的 max_tokens
+    max_tokens: int
+    # 上游调用次数（长文本分段翻译时大于 1）
+    calls: int
+    within_budget: bool
+
+
+class TokenBudgetExceeded(Exception):
+    """输入超出 token 预算"""
+
+    def __init__(self, estimate: TokenEstimate, reason: str):
+        super().__init__(reason)
+        self.estimate = estimate
+
+
+class TokenBudget:
+    """按翻译方向计算 max_tokens，并用实际用量持续校准输出/输入比例
+
+    max_tokens = 原文 token 数 × 比例 × safety_factor + 固定开销，限制在
+    [min_tokens, max_output_tokens] 之间；单次调用所需超过 max_output_tokens，
+    或原文超过 max_input_tokens 时视为超出预算。
+    """
+
+    def __init__(
+        self,
+        max_input_tokens: int = 6000,
+        max_output_tokens: int = 4096,
+        safety_factor: float = 1.5,
+        min_tokens: int = 64,
+        alpha: float = 0.1
+    ):
+        self.max_input_tokens = max_input_tokens
+        self.max_output_tokens = max_output_tokens
+        self.safety_factor = safety_factor
+        self.min_tokens = min_tokens
+        self.alpha = alpha
+        self._ratios: Dict[str, float] = dict(DEFAULT_OUTPUT_RATIOS)
+        self.observations = 0
+
+    @classmethod
+    def from_env(cls) -> "TokenBudget":
+        """从环境变量创建实例"""
+        return cls(
+            max_input_tokens=int(os.getenv("TOKEN_BUDGET_MAX_INPUT_TOKENS", "6000")),
+            max_output_tokens=int(os.getenv("TOKEN_BUDGET_MAX_OUTPUT_TOKENS", "4096")),
+            safety_factor=float(os.getenv("TOKEN_BUDGET_SAFETY_FACTOR", "1.5")),
+            min_tokens=int(os.getenv("TOKEN_BUDGET_MIN_TOKENS", "64"))
+        )
+
+    def ratio(self, direction: str) -> float:
+        """当前的输出/输入比例"""
+        return self._ratios.get(direction, max(self._ratios.values()))
+
+    def _required(self, input_tokens: int, direction: str, items: int = 1) -> int:
+        """不设上限时单次调用需要的 max_tokens"""
+        return math.ceil(input_tokens * self.ratio(direction) * self.safety_factor) + REPLY_OVERHEAD_TOKENS * items
+
+    def max_tokens(self, input_tokens: int, direction: str, items: int = 1) -> int:
+        """计算单次调用（items 条原文合计 input_tokens）的 max_tokens"""
+        return max(self.min_tokens, min(self._required(input_tokens, direction, items), self.max_output_tokens))
+
+    def estimate(self, text: str, direction: str, chunk_tokens: Optional[int] = None) -> TokenEstimate:
+        """估算一次翻译请求的 token 用量
+
+        Args:
+            text: 原文
+            direction: 已确定的翻译方向
+            chunk_tokens: 长文本按该 token 数分段翻译时传入，None 表示整段单次调用
+        """
+        input_tokens = estimate_tokens(text)
+        per_call = input_tokens
+        calls = 1
+        if chunk_tokens and input_tokens > chunk_tokens:
+            per_call = chunk_tokens
+            calls = math.ceil(input_tokens / chunk_tokens)
+        ratio = self.ratio(direction)
+        within_budget = (
+            input_tokens <= self.max_input_tokens
+            and self._required(per_call, direction) <= self.max_output_tokens
+        )
+        return TokenEstimate(
+            direction=direction,
+            input_tokens=input_tokens,
+            prompt_tokens=PROMPT_OVERHEAD_TOKENS + input_tokens,
+            output_ratio=round(ratio, 4),
+            expected_output_tokens=math.ceil(input_tokens * ratio) + REPLY_OVERHEAD_TOKENS * calls,
+            max_tokens=self.max_tokens(per_call, direction),
+            calls=calls,
+            within_budget=within_budget
+        )
+
+    def check(self, text: str, direction: str, chunk_tokens: Optional[int] = None) -> TokenEstimate:
+        """估算并检查预算，超出时抛出 TokenBudgetExceeded"""
+        estimate = self.estimate(text, direction, chunk_tokens)
+        if estimate.input_tokens > self.max_input_tokens:
+            raise TokenBudgetExceeded(
+                estimate, f"原文约 {estimate.input_tokens} token，超过上限 {self.max_input_tokens}"
+            )
+        if not estimate.within_budget:
+            raise TokenBudgetExceeded(
+                estimate, f"译文预计需要超过 {self.max_output_tokens} 个输出 token，请缩短原文或使用分段翻译"
+            )
+        return estimate
+
+    def observe(self, direction: str, input_tokens: int, completion_tokens: int, items: int = 1) -> None:
+        """用一次调用的实际输出 token 数更新该方向的比例（指数加权平均）"""
+        if input_tokens < MIN_OBSERVE_INPUT_TOKENS or direction not in self._ratios:
+            return
+        sample = max(completion_tokens - REPLY_OVERHEAD_TOKENS * items, 0) / input_tokens
+        sample = min(max(sample, 0.1), 10.0)
+        self._ratios[direction] += self.alpha * (sample - self._ratios[direction])
+        self.observations += 1
+
+    def stats(self) -> Dict[str, object]:
+        """返回当前比例和预算上限"""
+        return {
+            "output_ratios": {direction: round(ratio, 4) for direction, ratio in self._ratios.items()},
+            "observations": self.observations,
+            "max_input_tokens": self.max_input_tokens,
+            "max_output_tokens": self.max_output_tokens,
+        }
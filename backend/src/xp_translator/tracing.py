@@ -0,0 +1,165 @@
+"""
+请求追踪模块
+在一次请求内记录轻量的耗时片段（span），请求结束后导出到进程内环形缓冲区，
+并生成 Server-Timing 响应头
+
+当前请求的追踪通过 contextvars 传递，asyncio 子任务会继承它；没有进行中的追踪
+（未启用或不在请求内）时 span() 返回共享的空操作对象，不产生额外分配。
+"""
+
+import os
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Deque, Dict, List, Optional
+
+_current_trace: ContextVar[Optional["Trace"]] = ContextVar("xp_translator_trace", default=None)
+
+
+class _NoopSpan:
+    """未启用追踪时使用的空操作 span"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    """一个耗时片段"""
+
+    __slots__ = ("trace", "name", "start", "end")
+
+    def __init__(self, trace: "Trace", name: str):
+        self.trace = trace
+        self.name = name
+        self.start = 0.0
+        self.end = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end = time.perf_counter()
+        self.trace.spans.append(self)
+        return False
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+
+class Trace:
+    """一次请求的追踪，收集其中所有已结束的 span"""
+
+    __slots__ = ("name", "wall_start", "start", "end", "spans", "attributes", "_token")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.wall_start = time.time()
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.spans: List[Span] = []
+        self.attributes: Dict[str, object] = {}
+        self._token = None
+
+    def span(self, name: str) -> Span:
+        return Span(self, name)
+
+    @property
+    def duration(self) -> float:
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+    def breakdown(self) -> Dict[str, float]:
+        """按名称汇总各 span 的耗时（毫秒），同名 span（例如并发的分段）累加"""
+        totals: Dict[str, float] = {}
+        for span in self.spans:
+            totals[span.name] = totals.get(span.name, 0.0) + span.duration * 1000
+        return totals
+
+    def server_timing(self) -> str:
+        """生成 Server-Timing 响应头的值"""
+        entries = [f"{name};dur={ms:.2f}" for name, ms in self.breakdown().items()]
+        entries.append(f"total;dur={self.duration * 1000:.2f}")
+        return ", ".join(entries)
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "name": self.name,
+            "start": self.wall_start,
+            "duration_ms": round(self.duration * 1000, 3),
+            "attributes": dict(self.attributes),
+            "spans": [
+                {
+                    "name": span.name,
+                    "offset_ms": round((span.start - self.start) * 1000, 3),
+                    "duration_ms": round(span.duration * 1000, 3),
+                }
+                for span in sorted(self.spans, key=lambda s: s.start)
+            ],
+        }
+
+
+def span(name: str):
+    """在当前请求的追踪中记录一个 span；没有进行中的追踪时为空操作"""
+    trace = _current_trace.get()
+    if trace is None:
+        return _NOOP_SPAN
+    return Span(trace, name)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+class Tracer:
+    """追踪的开始、结束和进程内导出（环形缓冲区）"""
+
+    def __init__(self, enabled: bool = False, buffer_size: int = 256):
+        self.enabled = enabled
+        self._finished: Deque[Dict[str, object]] = deque(maxlen=buffer_size)
+
+    @classmethod
+    def from_env(cls) -> "Tracer":
+        """从环境变量读取配置：TRACING_ENABLED、TRACING_BUFFER_SIZE"""
+        return cls(
+            enabled=os.getenv("TRACING_ENABLED", "false").lower() in ("1", "true", "yes"),
+            buffer_size=int(os.getenv("TRACING_BUFFER_SIZE", "256"))
+        )
+
+    def start(self, name: str) -> Optional[Trace]:
+        """开始一次追踪并设为当前追踪，未启用时返回 None"""
+        if not self.enabled:
+            return None
+        trace = Trace(name)
+        trace._token = _current_trace.set(trace)
+        return trace
+
+    def finish(self, trace: Optional[Trace]) -> None:
+        """结束追踪并导出到环形缓冲区"""
+        if trace is None:
+            return
+        trace.end = time.perf_counter()
+        if trace._token is not None:
+            try:
+                _current_trace.reset(trace._token)
+            except ValueError:
+                # 在其他上下文中结束（例如流式响应的生成器），无需恢复
+                pass
+            trace._token = None
+        self._finished.append(trace.to_dict())
+
+    def recent(self, limit: Optional[int] = None) -> List[Dict[str, object]]:
+        """返回最近导出的追踪，最新的在前"""
+        traces = list(reversed(self._finished))
+        return traces[:limit] if limit is not None else traces
+
+    def clear(self) -> None:
+        self._finished.clear()
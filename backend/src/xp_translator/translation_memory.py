@@ -0,0 +1,343 @@
+"""
+翻译记忆模块
+保存成功的翻译结果，用字符 n-gram 倒排索引做模糊查找：近似重复的请求（同一句话，
+只有数字或产品名不同）直接复用已有译文，不再调用大模型
+
+比较前把数字和术语表中的术语替换为占位符，因此只有这些位置不同的句子被视为相同；
+复用时把译文中旧的数字和术语译法替换为新的。支持以 TMX 1.4 格式批量导入导出。
+"""
+
+import os
+import re
+import math
+import unicodedata
+import xml.etree.ElementTree as ET
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+from .glossary import Glossary, fold
+from .prompts import resolve_direction
+
+_NUMBER = re.compile(r"\d+(?:[.,]\d+)*")
+# 占位符使用私有区字符，不会出现在正常文本中，在 n-gram 中只占一个字符
+_NUMBER_SLOT = "\ue000"
+_TERM_SLOT = "\ue001"
+
+# 模糊查找的工作量上限：遍历的倒排表条目编号总数，以及逐个计算相似度的候选数
+MAX_SCANNED_POSTINGS = 20000
+MAX_CANDIDATES = 64
+
+_LANGUAGES = {"zh_to_en": ("zh-CN", "en"), "en_to_zh": ("en", "zh-CN")}
+_XML_LANG = "{http://www.w3.org/XML/1998/namespace}lang"
+
+
+def _match_case(original: str, replacement: str) -> str:
+    """让替换后的术语沿用译文中原有写法的大小写"""
+    if original.islower():
+        return replacement.lower()
+    if original[:1].isupper() and replacement[:1].islower():
+        return replacement[:1].upper() + replacement[1:]
+    return replacement
+
+
+def _indent(element: ET.Element, level: int = 0) -> None:
+    """就地缩进 XML 元素（每层两个空格），等同于 Python 3.9 的 ET.indent，兼容 3.8"""
+    if not len(element):
+        return
+    inner = "\n" + "  " * (level + 1)
+    if not (element.text or "").strip():
+        element.text = inner
+    for child in element:
+        _indent(child, level + 1)
+        if not (child.tail or "").strip():
+            child.tail = inner
+    child.tail = "\n" + "  " * level
+
+
+class Slot(NamedTuple):
+    kind: str
+    # 原文中的值（术语为规范化后的术语）
+    source: str
+    # 译文中对应的写法
+    target: str
+
+
+class MemoryHit(NamedTuple):
+    translation: str
+    keywords: List[str]
+    score: float
+    source: str
+
+
+@dataclass
+class _Entry:
+    source: str
+    direction: str
+    translation: str
+    keywords: List[str]
+    masked: str
+    slots: List[Slot]
+    grams: Set[str] = field(default_factory=set)
+
+
+class TranslationMemory:
+    """带模糊匹配的翻译记忆
+
+    相似度为占位后文本的字符 n-gram 集合的 Dice 系数；达到 threshold 且占位符
+    能够一一替换时命中。条目数超过 max_entries 时淘汰最早写入的条目。
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.9,
+        max_entries: int = 100000,
+        ngram: int = 2,
+        glossary: Optional[Glossary] = None,
+        tmx_path: Optional[str] = None
+    ):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ngram = ngram
+        self.glossary = glossary
+        self.tmx_path = tmx_path
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        # (direction, 占位后文本) -> 条目编号，用于精确匹配
+        self._exact: Dict[Tuple[str, str], int] = {}
+        # (direction, n-gram) -> 条目编号集合
+        self._index: Dict[Tuple[str, str], Set[int]] = {}
+        self._next_id = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_env(cls) -> Optional["TranslationMemory"]:
+        """从环境变量创建实例，未设置 TRANSLATION_MEMORY_ENABLED=true 时返回 None"""
+        if os.getenv("TRANSLATION_MEMORY_ENABLED", "false").lower() not in ("1", "true", "yes"):
+            return None
+        return cls(
+            threshold=float(os.getenv("TRANSLATION_MEMORY_THRESHOLD", "0.9")),
+            max_entries=int(os.getenv("TRANSLATION_MEMORY_MAX_ENTRIES", "100000")),
+            glossary=Glossary.from_env(),
+            tmx_path=os.getenv("TRANSLATION_MEMORY_TMX", "") or None
+        )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _mask(self, text: str, direction: str) -> Tuple[str, List[Slot]]:
+        """规范化文本并把数字和术语替换为占位符，返回 (占位后文本, 占位符列表)"""
+        text = " ".join(unicodedata.normalize("NFKC", text).split())
+        spans = [(m.start(), m.end(), Slot("number", m.group(), m.group())) for m in _NUMBER.finditer(text)]
+        if self.glossary is not None:
+            for match in self.glossary.find(text, direction):
+                if not any(start < match.end and match.start < end for start, end, _ in spans):
+                    spans.append((match.start, match.end, Slot(
+                        "term", fold(text[match.start:match.end]), Glossary.target(match.entry, direction)
+                    )))
+        spans.sort()
+        pieces, slots, position = [], [], 0
+        for start, end, slot in spans:
+            pieces.append(fold(text[position:start]))
+            pieces.append(_NUMBER_SLOT if slot.kind == "number" else _TERM_SLOT)
+            slots.append(slot)
+            position = end
+        pieces.append(fold(text[position:]))
+        return "".join(pieces), slots
+
+    def _grams(self, masked: str) -> Set[str]:
+        if len(masked) <= self.ngram:
+            return {masked}
+        return {masked[i:i + self.ngram] for i in range(len(masked) - self.ngram + 1)}
+
+    def add(self, text: str, direction: str, translation: str, keywords: List[str]) -> None:
+        """写入一条翻译结果，相同（占位后）原文的旧条目被替换"""
+        direction = resolve_direction(text, direction)
+        masked, slots = self._mask(text, direction)
+        if not masked.strip():
+            return
+        existing = self._exact.get((direction, masked))
+        if existing is not None:
+            self._remove(existing)
+        entry = _Entry(text, direction, translation, list(keywords), masked, slots, self._grams(masked))
+        entry_id = self._next_id
+        self._next_id += 1
+        self._entries[entry_id] = entry
+        self._exact[(direction, masked)] = entry_id
+        for gram in entry.grams:
+            self._index.setdefault((direction, gram), set()).add(entry_id)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id)
+        self._exact.pop((entry.direction, entry.masked), None)
+        for gram in entry.grams:
+            postings = self._index.get((entry.direction, gram))
+            if postings is not None:
+                postings.discard(entry_id)
+                if not postings:
+                    del self._index[(entry.direction, gram)]
+
+    def _candidates(self, direction: str, grams: Set[str]) -> List[Tuple[float, int]]:
+        """按 Dice 系数从高到低返回达到阈值的候选条目
+
+        Dice 系数 2|A∩B| / (|A|+|B|) 达到阈值 t 要求共有的 n-gram 至少 ⌈t/(2-t)·|A|⌉ 个，
+        因此只需从倒排表最短（最少见）的 |A| - ⌈t/(2-t)·|A|⌉ + 1 个 n-gram 收集候选（前缀过滤），
+        候选按共有的前缀 n-gram 数取前 MAX_CANDIDATES 个，跳过长度 |B| 不在
+        [t/(2-t)·|A|, (2-t)/t·|A|] 之间的条目，再逐个求交集计算系数。
+
+        常见 n-gram 的倒排表很长（英文的字母二元组几乎每句都有），遍历的条目编号累计超过
+        MAX_SCANNED_POSTINGS 时不再加入更长的倒排表：查找耗时有上限，代价是少数相似条目
+        可能漏掉，此时只是多一次上游调用
+        """
+        if self.threshold <= 0:
+            ratio, prefix = 0.0, len(grams)
+        else:
+            ratio = self.threshold / (2 - self.threshold)
+            prefix = len(grams) - math.ceil(ratio * len(grams) - 1e-9) + 1
+        min_size = ratio * len(grams) - 1e-9
+        max_size = len(grams) / ratio + 1e-9 if ratio else math.inf
+        postings = sorted((self._index.get((direction, gram), ()) for gram in grams), key=len)
+        shared: Counter = Counter()
+        scanned = 0
+        for entry_ids in postings[:max(prefix, 0)]:
+            if scanned and scanned + len(entry_ids) > MAX_SCANNED_POSTINGS:
+                break
+            shared.update(entry_ids)
+            scanned += len(entry_ids)
+        scored = []
+        for entry_id, _ in shared.most_common(MAX_CANDIDATES):
+            entry_grams = self._entries[entry_id].grams
+            if not min_size <= len(entry_grams) <= max_size:
+                continue
+            score = 2 * len(grams & entry_grams) / (len(grams) + len(entry_grams))
+            if score >= self.threshold:
+                scored.append((score, entry_id))
+        scored.sort(key=lambda item: (-item[0], -item[1]))
+        return scored
+
+    @staticmethod
+    def _adapt(entry: _Entry, slots: List[Slot]) -> Optional[Tuple[str, List[str]]]:
+        """把译文中旧的数字和术语译法替换为新的，无法对应时返回 None
+
+        语序可能与原文不同，每个占位符在整段译文中查找（不区分大小写），已对应的位置不再使用
+        """
+        if [slot.kind for slot in slots] != [slot.kind for slot in entry.slots]:
+            return None
+        folded = fold(entry.translation)
+        used: List[Tuple[int, int]] = []
+        replacements = []
+        for old, new in zip(entry.slots, slots):
+            target = fold(old.target)
+            index = folded.find(target)
+            while index >= 0 and any(index < end and start < index + len(target) for start, end in used):
+                index = folded.find(target, index + 1)
+            if index < 0:
+                return None
+            used.append((index, index + len(target)))
+            if old.source != new.source:
+                replacements.append((index, index + len(target), new.target))
+        translation = entry.translation
+        for start, end, text in sorted(replacements, reverse=True):
+            translation = translation[:start] + _match_case(translation[start:end], text) + translation[end:]
+        replaced = {fold(old.target): new.target for old, new in zip(entry.slots, slots) if old.source != new.source}
+        keywords = [_match_case(k, replaced[fold(k)]) if fold(k) in replaced else k for k in entry.keywords]
+        return translation, keywords
+
+    def lookup(self, text: str, direction: str) -> Optional[MemoryHit]:
+        """查找近似的已有翻译，命中时返回替换数字和术语后的译文"""
+        direction = resolve_direction(text, direction)
+        masked, slots = self._mask(text, direction)
+        exact = self._exact.get((direction, masked))
+        candidates = [(1.0, exact)] if exact is not None else self._candidates(direction, self._grams(masked))
+        for score, entry_id in candidates:
+            entry = self._entries[entry_id]
+            adapted = self._adapt(entry, slots)
+            if adapted is not None:
+                self.hits += 1
+                return MemoryHit(adapted[0], adapted[1], round(score, 4), entry.source)
+        self.misses += 1
+        return None
+
+    def stats(self) -> Dict[str, object]:
+        """返回翻译记忆统计信息"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+    def export_tmx(self) -> str:
+        """以 TMX 1.4 格式导出所有条目"""
+        root = ET.Element("tmx", version="1.4")
+        ET.SubElement(root, "header", {
+            "creationtool": "xp-translator",
+            "creationtoolversion": "1.0.0",
+            "segtype": "sentence",
+            "o-tmf": "xp-translator",
+            "adminlang": "en",
+            "srclang": "*all*",
+            "datatype": "plaintext",
+        })
+        body = ET.SubElement(root, "body")
+        for entry in self._entries.values():
+            source_lang, target_lang = _LANGUAGES[entry.direction]
+            tu = ET.SubElement(body, "tu", srclang=source_lang)
+            if entry.keywords:
+                prop = ET.SubElement(tu, "prop", type="x-keywords")
+                prop.text = ", ".join(entry.keywords)
+            for lang, text in ((source_lang, entry.source), (target_lang, entry.translation)):
+                tuv = ET.SubElement(tu, "tuv", {_XML_LANG: lang})
+                ET.SubElement(tuv, "seg").text = text
+        _indent(root)
+        return '<?xml version="1.0" encoding="UTF-8"?>\n' + ET.tostring(root, encoding="unicode") + "\n"
+
+    def import_tmx(self, content: str) -> int:
+        """导入 TMX 中的中英翻译单元，返回导入的条目数
+
+        翻译单元的 srclang（或 header 的 srclang）决定方向；为 *all* 或缺失时两个方向都导入
+        """
+        root = ET.fromstring(content)
+        header = root.find("header")
+        default_srclang = header.get("srclang", "*all*") if header is not None else "*all*"
+        imported = 0
+        for tu in root.iter("tu"):
+            segments = {}
+            for tuv in tu.findall("tuv"):
+                lang = (tuv.get(_XML_LANG) or tuv.get("lang") or "").lower()
+                seg = tuv.find("seg")
+                if seg is not None and lang[:2] in ("zh", "en"):
+                    segments[lang[:2]] = "".join(seg.itertext()).strip()
+            if not segments.get("zh") or not segments.get("en"):
+                continue
+            prop = tu.find("prop[@type='x-keywords']")
+            keywords = [k.strip() for k in prop.text.split(",") if k.strip()] if prop is not None and prop.text else []
+            srclang = tu.get("srclang", default_srclang).lower()[:2]
+            if srclang in ("zh", "*a"):
+                self.add(segments["zh"], "zh_to_en", segments["en"], keywords if srclang == "zh" else [])
+                imported += 1
+            if srclang in ("en", "*a"):
+                self.add(segments["en"], "en_to_zh", segments["zh"], keywords if srclang == "en" else [])
+                imported += 1
+        return imported
+
+    def load(self) -> int:
+        """从 tmx_path 导入（文件不存在时跳过）"""
+        if not self.tmx_path or not os.path.exists(self.tmx_path):
+            return 0
+        with open(self.tmx_path, encoding="utf-8") as f:
+            return self.import_tmx(f.read())
+
+    def save(self) -> None:
+        """导出到 tmx_path"""
+        if not self.tmx_path:
+            return
+        with open(self.tmx_path, "w", encoding="utf-8") as f:
+            f.write(self.export_tmx())
@@ -13,8 +13,8 @@ from fastapi.testclient import TestClient
 # 添加父目录到路径，以便导入模块
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from src.xp_translator.api import app
-from src.xp_translator.clients import BaseAIClient, DeepSeekClient, AliyunQwenClient, MockAIClient
+from src.xp_translator.api import app, provider_router
+from src.xp_translator.clients import BaseAIClient, DeepSeekClient, AliyunQwenClient, MockAIClient, client_registry
 
 
 @pytest.fixture
@@ -60,6 +60,27 @@ def mock_aliyun_client():
         return client
 
 
+@pytest.fixture
+def register_client():
+    """向全局客户端注册表注入客户端，测试结束后移除
+    
+    注入前后都会清空熔断器状态，避免其他测试的上游失败影响路由
+    """
+    registered = []
+    provider_router.reset()
+    
+    def _register(provider, client):
+        client_registry.register(provider, client)
+        registered.append(provider)
+        return client
+    
+    yield _register
+    
+    for provider in registered:
+        client_registry.unregister(provider)
+    provider_router.reset()
+
+
 @pytest.fixture
 def sample_translation_request():
     """提供示例翻译请求数据"""
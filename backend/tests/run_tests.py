@@ -8,6 +8,7 @@ XP-Translator 测试运行器
 3. 运行特定测试类
 4. 运行特定测试方法
 5. 生成测试报告
+6. 运行热点函数微基准并与基线比较（--benchmark）
 """
 
 import os
@@ -126,6 +127,34 @@ def run_unittest_tests(test_paths: List[str] = None, verbose: bool = False) -> i
     return 0 if result.wasSuccessful() else 1
 
 
+def run_benchmarks(
+    baseline: Optional[str] = None,
+    threshold: float = 0.25,
+    update_baseline: bool = False,
+    repeat: int = 5
+) -> int:
+    """
+    运行微基准并与基线比较
+    
+    Args:
+        baseline: 基线文件路径，默认 benchmarks/micro_baseline.json
+        threshold: 允许的变慢比例，超过即视为回退
+        update_baseline: 是否用本次结果覆盖基线
+        repeat: 每个基准的重复轮数
+    
+    Returns:
+        退出代码，有回退或缺少基线时为 1
+    """
+    from benchmarks.micro import DEFAULT_BASELINE, run_regression_gate
+    
+    return run_regression_gate(
+        baseline_path=Path(baseline) if baseline else DEFAULT_BASELINE,
+        threshold=threshold,
+        update_baseline=update_baseline,
+        repeat=repeat
+    )
+
+
 def list_available_tests():
     """列出所有可用的测试"""
     test_dir = Path(__file__).parent
@@ -217,6 +246,8 @@ def main():
   %(prog)s --unittest         # 使用 unittest 而不是 pytest
   %(prog)s test_api::TestAPIFunctionality  # 运行特定测试类
   %(prog)s test_api::TestAPIFunctionality::test_root_endpoint  # 运行特定测试方法
+  %(prog)s --benchmark        # 运行微基准，与基线比较（没有基线时失败）
+  %(prog)s --benchmark --update-baseline  # 用本次结果更新基线
         """
     )
     
@@ -273,6 +304,37 @@ def main():
         help="运行特定模块的测试（已弃用，使用位置参数）"
     )
     
+    parser.add_argument(
+        "--benchmark",
+        action="store_true",
+        help="运行热点函数微基准，比基线慢超过阈值时失败"
+    )
+    
+    parser.add_argument(
+        "--baseline",
+        help="微基准基线文件，默认 benchmarks/micro_baseline.json"
+    )
+    
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.25,
+        help="允许的变慢比例，默认 0.25（即 25%%）"
+    )
+    
+    parser.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help="用本次微基准结果覆盖基线"
+    )
+    
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=5,
+        help="每个微基准的重复轮数，取最快一轮"
+    )
+    
     args = parser.parse_args()
     
     # 列出测试
@@ -280,6 +342,12 @@ def main():
         list_available_tests()
         return 0
     
+    # 微基准
+    if args.benchmark:
+        print("XP-Translator 微基准")
+        print("=" * 60)
+        return run_benchmarks(args.baseline, args.threshold, args.update_baseline, args.repeat)
+    
     # 处理测试指定器
     test_paths = []
     if args.test_specifiers:
@@ -33,6 +33,19 @@ class TestAPIFunctionality:
         assert data["status"] == "healthy"
         assert data["service"] == "xp-translator"
     
+    def test_lifespan_manages_client_registry(self):
+        """测试 lifespan 启动时创建客户端，关闭时释放"""
+        from src.xp_translator.api import app
+        from src.xp_translator.clients import client_registry
+        
+        with TestClient(app) as client:
+            assert "deepseek" in client_registry
+            assert "aliyun" in client_registry
+            response = client.get("/health")
+            assert response.status_code == 200
+        
+        assert "deepseek" not in client_registry
+    
     def test_translate_endpoint_empty_text(self, test_client: TestClient):
         """测试翻译接口 - 空文本"""
         response = test_client.post("/translate", json={"text": ""})
@@ -241,4 +254,41 @@ class TestAPIPerformance:
         
         # 检查所有请求都成功（或至少没有崩溃）
         for response in results:
-            assert response.status_code in [200, 500]  # 成功或 API 错误
\ No newline at end of file
+            assert response.status_code in [200, 500, 503]  # 成功、API 错误或提供商熔断
+    
+    def test_parallel_requests_do_not_block_event_loop(self, env_vars, register_client):
+        """测试并发翻译请求共享一次上游往返时间，而不是串行累加"""
+        import asyncio
+        import time
+        from unittest.mock import Mock
+        import httpx
+        from src.xp_translator.api import app
+        from src.xp_translator.clients import DeepSeekClient
+        
+        upstream_delay = 0.2
+        parallel = 8
+        
+        async def slow_create(**kwargs):
+            await asyncio.sleep(upstream_delay)
+            return Mock(choices=[Mock(message=Mock(content="翻译：Hello\n关键词：[hello, greeting, test]"))])
+        
+        client = DeepSeekClient()
+        client.client = Mock()
+        client.client.chat.completions.create = slow_create
+        register_client("deepseek", client)
+        
+        async def run():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+                start = time.perf_counter()
+                responses = await asyncio.gather(*[
+                    http.post("/translate", json={"text": f"并发测试{i}"})
+                    for i in range(parallel)
+                ])
+                return time.perf_counter() - start, responses
+        
+        elapsed, responses = asyncio.run(run())
+        
+        assert all(response.status_code == 200 for response in responses)
+        # 串行执行需要 parallel * upstream_delay 秒，非阻塞时应接近一次往返
+        assert elapsed < upstream_delay * 3
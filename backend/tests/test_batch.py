@@ -0,0 +1,239 @@
+"""
+测试批量翻译
+
+包含对打包、提示词构建、编号回复解析、逐条重试以及 /translate/batch 接口的测试
+"""
+
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, Mock, patch
+
+from src.xp_translator.batch import (
+    estimate_tokens,
+    pack_batches,
+    build_batch_prompt,
+    parse_batch_response,
+    translate_items
+)
+from src.xp_translator.clients import DeepSeekClient, MockAIClient
+from src.xp_translator.limiter import QueueFullError
+from src.xp_translator.retry import DeadlineExceeded
+
+
+class TestBatchPacking:
+    """测试批次打包"""
+    
+    def test_estimate_tokens(self):
+        """测试中英文 token 估算"""
+        assert estimate_tokens("你好世界") == 4
+        assert estimate_tokens("abcdefgh") == 2
+    
+    def test_pack_respects_item_limit(self):
+        """测试每批条目数不超过上限"""
+        batches = pack_batches(["短文本"] * 7, max_prompt_tokens=10000, max_items=3)
+        assert batches == [[0, 1, 2], [3, 4, 5], [6]]
+    
+    def test_pack_respects_token_budget(self):
+        """测试每批 token 数不超过预算"""
+        texts = ["字" * 100] * 5
+        batches = pack_batches(texts, max_prompt_tokens=400, max_items=100)
+        assert [i for batch in batches for i in batch] == [0, 1, 2, 3, 4]
+        assert all(len(batch) <= 2 for batch in batches)
+    
+    def test_oversized_item_alone(self):
+        """测试超出预算的条目单独成批"""
+        batches = pack_batches(["a", "字" * 5000, "b"], max_prompt_tokens=500)
+        assert [1] in batches
+
+
+class TestBatchPrompt:
+    """测试批量提示词和回复解析"""
+    
+    def test_prompt_numbers_items(self):
+        """测试提示词包含编号条目"""
+        prompt = build_batch_prompt(["你好", "世界"], "zh_to_en")
+        assert "[1] 你好" in prompt
+        assert "[2] 世界" in prompt
+        assert prompt.startswith("方向：中文→英文")
+    
+    def test_parse_numbered_reply(self):
+        """测试解析编号回复"""
+        content = (
+            "[1]\n翻译：Hello\n关键词：[hello, greeting, welcome]\n"
+            "[2]\n翻译：World\n关键词：world, earth"
+        )
+        parsed = parse_batch_response(content, 2)
+        assert parsed[0] == ("Hello", ["hello", "greeting", "welcome"])
+        assert parsed[1] == ("World", ["world", "earth"])
+    
+    def test_parse_multiline_translation(self):
+        """测试跨多行的翻译被完整保留"""
+        content = "[1]\n翻译：First line\nSecond line\n关键词：[a, b, c]"
+        parsed = parse_batch_response(content, 1)
+        assert parsed[0][0] == "First line\nSecond line"
+    
+    def test_parse_skips_missing_and_invalid(self):
+        """测试缺失、越界和重复编号不会产生结果"""
+        content = (
+            "[1]\n翻译：One\n关键词：[a]\n"
+            "[1]\n翻译：Duplicate\n关键词：[b]\n"
+            "[3]\n关键词：[no translation]\n"
+            "[9]\n翻译：Out of range\n关键词：[c]"
+        )
+        parsed = parse_batch_response(content, 3)
+        assert parsed == {0: ("One", ["a"])}
+
+
+class TestTranslateItems:
+    """测试批量翻译流程"""
+    
+    def test_unparsed_items_retried_individually(self, env_vars):
+        """测试解析失败的条目逐条重试"""
+        client = DeepSeekClient()
+        client.client = Mock()
+        client.client.chat.completions.create = AsyncMock(return_value=Mock(
+            choices=[Mock(message=Mock(content="[1]\n翻译：Hello\n关键词：[hello]"))]
+        ))
+        client.translate_and_extract = AsyncMock(return_value=("Retried", ["retry"]))
+        
+        results = asyncio.run(translate_items(client, ["你好", "世界"], "zh_to_en"))
+        
+        assert results == [("Hello", ["hello"]), ("Retried", ["retry"])]
+        client.client.chat.completions.create.assert_awaited_once()
+        client.translate_and_extract.assert_awaited_once_with("世界", "zh_to_en")
+    
+    def test_failed_batch_falls_back(self):
+        """测试整批调用失败时逐条翻译"""
+        client = MockAIClient()
+        client.translate_batch = AsyncMock(side_effect=Exception("boom"))
+        
+        results = asyncio.run(translate_items(client, ["你好", "世界"], "zh_to_en"))
+        assert [translation for translation, _ in results] == ["Hello", "World"]
+
+    @pytest.mark.parametrize("error", [QueueFullError("deepseek", 1.0), DeadlineExceeded("请求已超过截止时间")])
+    def test_overload_not_split(self, error):
+        """测试排队已满或截止时间已到时直接抛出，不拆成逐条调用"""
+        client = MockAIClient()
+        client.translate_batch = AsyncMock(side_effect=error)
+        client.translate_and_extract = AsyncMock(return_value=("ok", ["k"]))
+        
+        with pytest.raises(type(error)):
+            asyncio.run(translate_items(client, ["你好", "世界"], "zh_to_en"))
+        client.translate_and_extract.assert_not_awaited()
+
+
+class TestBatchAPI:
+    """测试 /translate/batch 接口"""
+    
+    def test_batch_endpoint(self, test_client, register_client):
+        """测试批量接口返回与请求一一对应的结果并对重复条目去重"""
+        from src.xp_translator.api import translation_cache
+        
+        client = MockAIClient()
+        calls = []
+        
+        async def translate_batch(texts, direction):
+            calls.append(list(texts))
+            return [(f"T:{text}", ["k"]) for text in texts]
+        
+        client.translate_batch = translate_batch
+        register_client("deepseek", client)
+        translation_cache.clear()
+        
+        response = test_client.post("/translate/batch", json={"items": [
+            {"text": "你好"},
+            {"text": "世界"},
+            {"text": "你好"},
+        ]})
+        
+        assert response.status_code == 200
+        results = response.json()["results"]
+        assert [r["translation"] for r in results] == ["T:你好", "T:世界", "T:你好"]
+        assert calls == [["你好", "世界"]]
+    
+    def test_batch_queue_full_returns_503(self, test_client, register_client):
+        """测试所有提供商的批量调用都排队已满时返回 503，而不是逐条重试"""
+        from src.xp_translator.api import translation_cache
+        
+        client = MockAIClient()
+        client.translate_batch = AsyncMock(side_effect=QueueFullError("deepseek", 2.0))
+        client.translate_and_extract = AsyncMock(return_value=("ok", ["k"]))
+        register_client("deepseek", client)
+        register_client("aliyun", client)
+        translation_cache.clear()
+        
+        response = test_client.post("/translate/batch", json={"items": [{"text": "排队一"}, {"text": "排队二"}]})
+        
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "2"
+        client.translate_and_extract.assert_not_awaited()
+    
+    def test_batch_failover_recorded_by_breaker(self, test_client, register_client):
+        """测试批量调用经过熔断器：请求的提供商失败时整组切换到备用提供商，失败计入熔断统计"""
+        from src.xp_translator.api import translation_cache, provider_router
+        
+        failing = MockAIClient()
+        failing.translate_batch = AsyncMock(side_effect=Exception("upstream down"))
+        failing.translate_and_extract = AsyncMock(side_effect=Exception("upstream down"))
+        backup = MockAIClient()
+        backup.provider = "aliyun"
+        backup.translate_batch = AsyncMock(return_value=[("A", ["a"]), ("B", ["b"])])
+        register_client("deepseek", failing)
+        register_client("aliyun", backup)
+        translation_cache.clear()
+        
+        response = test_client.post("/translate/batch", json={"items": [{"text": "切换一"}, {"text": "切换二"}]})
+        
+        assert response.status_code == 200
+        assert [r["provider"] for r in response.json()["results"]] == ["aliyun", "aliyun"]
+        assert [r["translation"] for r in response.json()["results"]] == ["A", "B"]
+        assert provider_router.breaker("deepseek").snapshot()["failure_rate"] == 1.0
+        assert provider_router.breaker("aliyun").snapshot()["calls"] == 1
+    
+    def test_failed_group_cancels_others(self, register_client):
+        """测试一组失败（503）时取消仍在进行的其他组"""
+        import httpx
+        from src.xp_translator.api import app, translation_cache
+        
+        state = {}
+        
+        async def slow_batch(texts, direction):
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                state["cancelled"] = True
+                raise
+            return [("slow", ["k"]) for _ in texts]
+        
+        async def full_batch(texts, direction):
+            await asyncio.sleep(0.05)
+            raise QueueFullError("deepseek", 1.0)
+        
+        slow, full = MockAIClient(), MockAIClient()
+        slow.translate_batch, full.translate_batch = slow_batch, full_batch
+        register_client("deepseek", full)
+        register_client("aliyun", slow)
+        clients = {"deepseek": full, "aliyun": slow}
+        # 每组只路由到请求的提供商，排队已满的 DeepSeek 组不会切换到通义千问
+        
+        async def run():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+                response = await http.post("/translate/batch", json={"items": [
+                    {"text": "一", "provider": "deepseek"}, {"text": "二", "provider": "deepseek"},
+                    {"text": "三", "provider": "aliyun"}, {"text": "四", "provider": "aliyun"},
+                ]})
+                # 在事件循环结束之前检查：其他组必须在返回 503 之前被取消
+                return response, dict(state)
+        
+        translation_cache.clear()
+        with patch("src.xp_translator.api.provider_router.route", lambda provider: [(provider, clients[provider])]):
+            response, state_at_response = asyncio.run(run())
+        
+        assert response.status_code == 503
+        assert state_at_response == {"cancelled": True}
+    
+    def test_batch_endpoint_validation(self, test_client):
+        """测试空批次和无效条目返回 422"""
+        assert test_client.post("/translate/batch", json={"items": []}).status_code == 422
+        assert test_client.post("/translate/batch", json={"items": [{"text": ""}]}).status_code == 422
@@ -0,0 +1,308 @@
+"""
+测试翻译结果缓存
+
+包含对 TranslationCache 的 LRU 淘汰、TTL 过期和统计计数的测试，
+以及 DiskTranslationCache 的持久化、分批压缩、后台任务容错和非阻塞启动测试
+"""
+
+import asyncio
+from unittest.mock import patch
+
+from src.xp_translator.cache import (
+    TranslationCache,
+    DiskTranslationCache,
+    make_cache_key,
+    normalize_text
+)
+
+
+class TestCacheKey:
+    """测试缓存键生成"""
+    
+    def test_normalize_whitespace_and_width(self):
+        """测试空白折叠和全角字符规范化"""
+        assert normalize_text("  你好   世界 ") == "你好 世界"
+        assert normalize_text("ＡＢＣ") == "ABC"
+    
+    def test_key_includes_all_dimensions(self):
+        """测试方向、提供商和模型都会影响缓存键"""
+        base = make_cache_key("你好", "zh_to_en", "deepseek", "deepseek-chat")
+        assert base == make_cache_key(" 你好 ", "zh_to_en", "deepseek", "deepseek-chat")
+        assert base != make_cache_key("你好", "auto", "deepseek", "deepseek-chat")
+        assert base != make_cache_key("你好", "zh_to_en", "aliyun", "deepseek-chat")
+        assert base != make_cache_key("你好", "zh_to_en", "deepseek", "deepseek-reasoner")
+
+
+class TestTranslationCache:
+    """测试 TranslationCache"""
+    
+    def test_hit_and_miss(self):
+        """测试命中与未命中计数"""
+        cache = TranslationCache()
+        assert cache.get("k") is None
+        
+        cache.set("k", "Hello", ["hello", "greeting"])
+        assert cache.get("k") == ("Hello", ["hello", "greeting"])
+        
+        stats = cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["entries"] == 1
+    
+    def test_returned_keywords_are_copies(self):
+        """测试调用方修改返回的关键词列表不会污染缓存"""
+        cache = TranslationCache()
+        cache.set("k", "Hello", ["hello"])
+        cache.get("k")[1].append("polluted")
+        assert cache.get("k")[1] == ["hello"]
+    
+    def test_lru_eviction_by_bytes(self):
+        """测试超过字节容量时淘汰最久未使用的条目"""
+        entry_size = TranslationCache._entry_size("a", "x" * 100, [])
+        cache = TranslationCache(max_bytes=entry_size * 2)
+        
+        cache.set("a", "x" * 100, [])
+        cache.set("b", "x" * 100, [])
+        cache.get("a")  # a 变为最近使用
+        cache.set("c", "x" * 100, [])
+        
+        assert cache.get("b") is None
+        assert cache.get("a") is not None
+        assert cache.get("c") is not None
+        assert cache.stats()["evictions"] == 1
+        assert cache.current_bytes <= cache.max_bytes
+    
+    def test_oversized_entry_not_stored(self):
+        """测试单个条目超过容量时不写入"""
+        cache = TranslationCache(max_bytes=100)
+        cache.set("k", "x" * 1000, [])
+        assert len(cache) == 0
+    
+    def test_ttl_expiration(self):
+        """测试条目过期后视为未命中"""
+        cache = TranslationCache(ttl=10)
+        with patch("src.xp_translator.cache.time.monotonic", return_value=100.0):
+            cache.set("k", "Hello", [])
+        with patch("src.xp_translator.cache.time.monotonic", return_value=105.0):
+            assert cache.get("k") is not None
+        with patch("src.xp_translator.cache.time.monotonic", return_value=111.0):
+            assert cache.get("k") is None
+        
+        stats = cache.stats()
+        assert stats["expirations"] == 1
+        assert stats["entries"] == 0
+        assert stats["bytes"] == 0
+    
+    def test_disabled_cache(self):
+        """测试容量为 0 时不缓存"""
+        cache = TranslationCache(max_bytes=0)
+        cache.set("k", "Hello", [])
+        assert cache.get("k") is None
+    
+    def test_from_env(self):
+        """测试从环境变量读取配置"""
+        with patch.dict('os.environ', {
+            'TRANSLATION_CACHE_MAX_BYTES': '1024',
+            'TRANSLATION_CACHE_TTL': '60'
+        }):
+            cache = TranslationCache.from_env()
+        assert cache.max_bytes == 1024
+        assert cache.ttl == 60
+
+
+class TestDiskTranslationCache:
+    """测试 SQLite 磁盘缓存"""
+    
+    def test_not_ready_before_open(self, tmp_path):
+        """测试数据库打开前读写不阻塞，直接视为未命中"""
+        cache = DiskTranslationCache(str(tmp_path / "cache.db"))
+        
+        async def run():
+            await cache.set("k", "Hello", ["hello"])
+            return await cache.get("k")
+        
+        assert asyncio.run(run()) is None
+        assert cache.stats()["misses"] == 1
+        assert cache.stats()["writes"] == 0
+    
+    def test_persist_across_instances(self, tmp_path):
+        """测试缓存在进程重启（新实例）后依然有效"""
+        path = str(tmp_path / "cache.db")
+        
+        async def write():
+            cache = DiskTranslationCache(path)
+            cache.open()
+            await cache.set("k", "你好", ["问候", "你好"])
+            await cache.aclose()
+        
+        async def read():
+            cache = DiskTranslationCache(path)
+            cache.open()
+            result = await cache.get("k")
+            await cache.aclose()
+            return result
+        
+        asyncio.run(write())
+        assert asyncio.run(read()) == ("你好", ["问候", "你好"])
+    
+    def test_expired_entry(self, tmp_path):
+        """测试过期条目视为未命中"""
+        cache = DiskTranslationCache(str(tmp_path / "cache.db"), ttl=-1)
+        cache.open()
+        
+        async def run():
+            await cache.set("k", "Hello", [])
+            result = await cache.get("k")
+            await cache.aclose()
+            return result
+        
+        assert asyncio.run(run()) is None
+    
+    def test_compaction_enforces_size_limit(self, tmp_path):
+        """测试压缩时按最久未访问淘汰超出容量的条目"""
+        cache = DiskTranslationCache(str(tmp_path / "cache.db"), max_bytes=1000)
+        cache.open()
+        
+        async def run():
+            for i in range(10):
+                await cache.set(f"k{i}", "x" * 100, [])
+            cache.compact()
+            remaining = [await cache.get(f"k{i}") for i in range(10)]
+            await cache.aclose()
+            return remaining
+        
+        remaining = asyncio.run(run())
+        assert remaining[0] is None
+        assert remaining[-1] is not None
+        assert cache.stats()["evictions"] > 0
+        assert cache.stats()["compactions"] == 1
+    
+    def test_compaction_in_batches(self, tmp_path):
+        """测试分批压缩同样按最久未访问淘汰到容量以内，过期条目分批删除"""
+        cache = DiskTranslationCache(str(tmp_path / "cache.db"), max_bytes=1000)
+        cache.open()
+        
+        async def run():
+            for i in range(10):
+                await cache.set(f"k{i}", "x" * 100, [])
+            with patch("src.xp_translator.cache.COMPACTION_BATCH_SIZE", 2):
+                cache.compact()
+            remaining = [await cache.get(f"k{i}") for i in range(10)]
+            await cache.aclose()
+            return remaining
+        
+        remaining = asyncio.run(run())
+        assert remaining[:5] == [None] * 5
+        assert all(r is not None for r in remaining[-3:])
+        
+        expired = DiskTranslationCache(str(tmp_path / "expired.db"), ttl=-1)
+        expired.open()
+        for i in range(5):
+            expired._set(f"k{i}", "x", [])
+        with patch("src.xp_translator.cache.COMPACTION_BATCH_SIZE", 2):
+            expired.compact()
+        assert expired._conn.execute("SELECT COUNT(*) FROM translations").fetchone()[0] == 0
+        asyncio.run(expired.aclose())
+    
+    def test_background_task_survives_errors(self, tmp_path):
+        """测试打开或压缩失败时后台任务不退出，下个周期重试"""
+        cache = DiskTranslationCache(str(tmp_path / "cache.db"), compaction_interval=0.01)
+        real_open = cache.open
+        calls = {"open": 0, "compact": 0}
+        
+        def flaky_open():
+            calls["open"] += 1
+            if calls["open"] == 1:
+                raise OSError("database is locked")
+            real_open()
+        
+        def failing_compact():
+            calls["compact"] += 1
+            raise OSError("database is locked")
+        
+        cache.open = flaky_open
+        cache.compact = failing_compact
+        
+        async def run():
+            await cache.start()
+            for _ in range(200):
+                if calls["compact"] >= 2:
+                    break
+                await asyncio.sleep(0.01)
+            ready = cache.ready
+            await cache.aclose()
+            return ready
+        
+        assert asyncio.run(run()) is True
+        assert calls["open"] == 2
+        assert calls["compact"] >= 2
+        assert cache.stats()["errors"] >= 3
+    
+    def test_start_opens_in_background(self, tmp_path):
+        """测试 start() 在后台打开数据库"""
+        cache = DiskTranslationCache(str(tmp_path / "sub" / "cache.db"))
+        
+        async def run():
+            await cache.start()
+            for _ in range(100):
+                if cache.ready:
+                    break
+                await asyncio.sleep(0.01)
+            ready = cache.ready
+            await cache.aclose()
+            return ready
+        
+        assert asyncio.run(run()) is True
+        assert cache.ready is False
+    
+    def test_from_env_disabled_by_default(self):
+        """测试未配置路径时不启用磁盘缓存"""
+        with patch.dict('os.environ', {'TRANSLATION_DISK_CACHE_PATH': ''}):
+            assert DiskTranslationCache.from_env() is None
+
+
+class TestCacheAPI:
+    """测试 /translate 接口的缓存行为"""
+    
+    def test_x_cache_header(self, test_client, register_client):
+        """测试重复请求命中缓存并返回 X-Cache 头"""
+        from unittest.mock import AsyncMock
+        from src.xp_translator.api import translation_cache
+        from src.xp_translator.clients import MockAIClient
+        
+        client = MockAIClient()
+        client.translate_and_extract = AsyncMock(return_value=("Cached", ["a", "b", "c"]))
+        register_client("deepseek", client)
+        translation_cache.clear()
+        
+        payload = {"text": "缓存测试", "direction": "zh_to_en"}
+        first = test_client.post("/translate", json=payload)
+        second = test_client.post("/translate", json=payload)
+        
+        assert first.status_code == 200
+        assert first.headers["X-Cache"] == "MISS"
+        assert second.headers["X-Cache"] == "HIT"
+        assert second.json() == first.json()
+        assert client.translate_and_extract.await_count == 1
+    
+    def test_fallback_reply_not_cached(self, test_client, register_client, env_vars):
+        """测试回复格式不完整、用了占位结果时不写入缓存，下次请求重新调用上游"""
+        from unittest.mock import AsyncMock, Mock
+        from src.xp_translator.api import translation_cache
+        from src.xp_translator.clients import DeepSeekClient
+        
+        client = DeepSeekClient()
+        malformed = Mock(choices=[Mock(message=Mock(content="无法解析的回复"), finish_reason="stop")], usage=None)
+        client.client = Mock()
+        client.client.chat.completions.create = AsyncMock(return_value=malformed)
+        register_client("deepseek", client)
+        translation_cache.clear()
+        
+        payload = {"text": "占位测试", "direction": "zh_to_en"}
+        first = test_client.post("/translate", json=payload)
+        second = test_client.post("/translate", json=payload)
+        
+        assert first.json()["translation"] == "Translated: 占位测试"
+        assert second.headers["X-Cache"] == "MISS"
+        assert client.client.chat.completions.create.await_count == 2
+        assert len(translation_cache) == 0
@@ -12,6 +12,7 @@ from src.xp_translator.clients import (
     DeepSeekClient, 
     AliyunQwenClient, 
     MockAIClient,
+    ClientRegistry,
     create_ai_client
 )
 
@@ -129,8 +130,8 @@ class TestDeepSeekClient:
             mock_response = Mock()
             mock_response.choices = [Mock(message=Mock(content='翻译：Mocked translation\n关键词：[test, mock, example]'))]
             
-            # OpenAI SDK 的 create 方法是同步的，所以使用普通 Mock
-            mock_instance.chat.completions.create = Mock(return_value=mock_response)
+            # 客户端使用 AsyncOpenAI，create 方法需要是可等待的
+            mock_instance.chat.completions.create = AsyncMock(return_value=mock_response)
             mock_openai.return_value = mock_instance
             yield mock_instance
     
@@ -176,7 +177,7 @@ class TestDeepSeekClient:
         """测试 DeepSeekClient 错误处理"""
         with patch('openai.OpenAI') as mock_openai:
             mock_instance = Mock()
-            mock_instance.chat.completions.create = Mock(side_effect=Exception("API Error"))
+            mock_instance.chat.completions.create = AsyncMock(side_effect=Exception("API Error"))
             mock_openai.return_value = mock_instance
             
             client = DeepSeekClient()
@@ -197,7 +198,7 @@ class TestAliyunQwenClient:
             mock_instance = Mock()
             mock_response = Mock()
             mock_response.choices = [Mock(message=Mock(content='翻译：阿里云翻译\n关键词：[aliyun, qwen, test]'))]
-            mock_instance.chat.completions.create = Mock(return_value=mock_response)
+            mock_instance.chat.completions.create = AsyncMock(return_value=mock_response)
             mock_openai.return_value = mock_instance
             yield mock_instance
     
@@ -280,6 +281,46 @@ class TestClientFactory:
             assert client is not None
 
 
+class TestClientRegistry:
+    """测试客户端注册表"""
+    
+    def test_registry_reuses_client(self):
+        """测试同一提供商只创建一次客户端"""
+        created = []
+        
+        def factory(provider):
+            created.append(provider)
+            return MockAIClient()
+        
+        registry = ClientRegistry(factory=factory)
+        first = registry.get("deepseek")
+        second = registry.get("deepseek")
+        
+        assert first is second
+        assert created == ["deepseek"]
+        assert "deepseek" in registry
+    
+    def test_registry_default_provider(self):
+        """测试不指定 provider 时使用环境变量"""
+        registry = ClientRegistry(factory=lambda provider: MockAIClient())
+        with patch.dict('os.environ', {'AI_PROVIDER': 'aliyun'}):
+            registry.get()
+        assert "aliyun" in registry
+    
+    def test_registry_aclose(self):
+        """测试关闭注册表时释放所有客户端"""
+        client = MockAIClient()
+        client.aclose = AsyncMock()
+        registry = ClientRegistry(factory=lambda provider: client)
+        registry.warm_up(["deepseek", "aliyun"])
+        
+        asyncio.run(registry.aclose())
+        
+        # 同一个实例只关闭一次
+        client.aclose.assert_awaited_once()
+        assert "deepseek" not in registry
+
+
 class TestClientIntegration:
     """测试客户端集成"""
     
@@ -0,0 +1,188 @@
+"""
+测试客户端断开时取消上游调用
+
+包含对 cancel_on_disconnect / iterate_until_disconnect 的单元测试，以及直接以 ASGI 调用
+/translate 和 /translate/stream、在请求进行中投递 http.disconnect 的测试
+"""
+
+import json
+import asyncio
+import pytest
+from unittest.mock import Mock
+
+from src.xp_translator.disconnect import ClientDisconnected, cancel_on_disconnect, iterate_until_disconnect
+from src.xp_translator.clients import DeepSeekClient, MockAIClient
+from src.xp_translator.metrics import REQUESTS_TOTAL, UPSTREAM_CANCELLED
+
+
+class FakeRequest:
+    """只实现 receive() 的请求替身，disconnect() 之后 receive() 返回 http.disconnect"""
+
+    def __init__(self):
+        self._gone = asyncio.Event()
+
+    def disconnect(self):
+        self._gone.set()
+
+    async def receive(self):
+        await self._gone.wait()
+        return {"type": "http.disconnect"}
+
+
+async def call_app(path: str, payload: dict, disconnect_after: float, spec_version: str = "2.4"):
+    """以 ASGI 直接调用应用，请求体发送 disconnect_after 秒后模拟客户端断开，返回发出的消息"""
+    from src.xp_translator.api import app
+
+    body = json.dumps(payload).encode()
+    pending = [{"type": "http.request", "body": body, "more_body": False}]
+    sent = []
+
+    async def receive():
+        if pending:
+            return pending.pop(0)
+        await asyncio.sleep(disconnect_after)
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0", "spec_version": spec_version}, "http_version": "1.1",
+        "method": "POST", "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+        "root_path": "", "client": ("test", 1), "server": ("test", 80),
+        "headers": [(b"host", b"test"), (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode())],
+    }
+    await app(scope, receive, send)
+    return sent
+
+
+class TestHelpers:
+    """测试断开检测的辅助函数"""
+
+    def test_cancel_on_disconnect(self):
+        """测试客户端断开时取消等待中的任务"""
+        cancelled = []
+
+        async def work():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        async def run():
+            request = FakeRequest()
+            asyncio.get_running_loop().call_later(0.01, request.disconnect)
+            await cancel_on_disconnect(request, work())
+
+        with pytest.raises(ClientDisconnected):
+            asyncio.run(run())
+        assert cancelled == [True]
+
+    def test_result_before_disconnect(self):
+        """测试结果先到达时正常返回"""
+        async def run():
+            return await cancel_on_disconnect(FakeRequest(), asyncio.sleep(0, result="ok"))
+
+        assert asyncio.run(run()) == "ok"
+
+    def test_iterate_until_disconnect(self):
+        """测试流式迭代中断开时取消进行中的那一步，迭代器随之结束"""
+        closed = []
+
+        async def upstream():
+            try:
+                yield 1
+                await asyncio.sleep(10)
+                yield 2
+            finally:
+                closed.append(True)
+
+        async def run():
+            request = FakeRequest()
+            items = []
+            with pytest.raises(ClientDisconnected):
+                async for item in iterate_until_disconnect(request, upstream()):
+                    items.append(item)
+                    request.disconnect()
+            await asyncio.sleep(0)
+            return items
+
+        assert asyncio.run(run()) == [1]
+        assert closed == [True]
+
+
+class TestTranslateDisconnect:
+    """测试 /translate 在客户端断开时取消上游调用"""
+
+    def test_upstream_cancelled(self, register_client):
+        """测试客户端断开后上游调用被取消，请求记为 cancelled"""
+        from src.xp_translator.api import translation_cache
+        client = MockAIClient()
+        cancelled = []
+
+        async def slow(text, direction="zh_to_en"):
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(text)
+                raise
+            return "slow", ["k"]
+
+        client.translate_and_extract = slow
+        register_client("deepseek", client)
+        translation_cache.clear()
+        counter = REQUESTS_TOTAL.labels("translate", "deepseek", client.model, "zh_to_en", "cancelled")
+        before = counter.value
+
+        async def run():
+            sent = await call_app("/translate", {"text": "断开测试", "direction": "zh_to_en"}, 0.02)
+            await asyncio.sleep(0.01)
+            return sent
+
+        sent = asyncio.run(run())
+        assert sent[0]["status"] == 499
+        assert cancelled == ["断开测试"]
+        assert counter.value - before == 1
+
+
+class TestStreamDisconnect:
+    """测试流式接口在客户端断开时关闭上游流"""
+
+    def test_stream_closed(self, env_vars, register_client):
+        """测试上游流被关闭、并发名额归还，并计入上游取消次数"""
+        from src.xp_translator.api import translation_cache
+        closed = []
+
+        async def fake_stream():
+            try:
+                yield Mock(choices=[Mock(delta=Mock(content="翻译：Hel"), finish_reason=None)])
+                await asyncio.sleep(10)
+                yield Mock(choices=[Mock(delta=Mock(content="lo"), finish_reason=None)])
+            finally:
+                closed.append(True)
+
+        async def create(**kwargs):
+            return fake_stream()
+
+        client = DeepSeekClient()
+        client.client = Mock()
+        client.client.chat.completions.create = create
+        register_client("deepseek", client)
+        translation_cache.clear()
+        cancelled = UPSTREAM_CANCELLED.labels("deepseek", client.model)
+        before = cancelled.value
+
+        async def run():
+            sent = await call_app("/translate/stream", {"text": "流式断开", "direction": "zh_to_en"}, 0.05)
+            await asyncio.sleep(0.01)
+            return sent
+
+        sent = asyncio.run(run())
+        bodies = b"".join(message.get("body", b"") for message in sent)
+        assert b"event: delta" in bodies
+        assert b"event: done" not in bodies and b"event: error" not in bodies
+        assert closed == [True]
+        assert cancelled.value - before == 1
+        assert client.limiter.in_flight == 0
@@ -0,0 +1,216 @@
+"""
+测试 OpenAI 兼容的本地桩服务
+
+包含对延迟分布、回复格式、错误和 429 注入、RPM 配额以及真实客户端对接桩服务的测试
+"""
+
+import random
+import asyncio
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from openai import AsyncOpenAI
+
+from benchmarks.fake_upstream import (
+    LatencyDistribution, StubConfig, create_app, build_reply, parse_args
+)
+from src.xp_translator.batch import parse_batch_response
+from src.xp_translator.prompts import build_batch_prompt, build_translation_prompt
+from src.xp_translator.clients import DeepSeekClient
+
+CHAT_REQUEST = {
+    "model": "deepseek-chat",
+    "messages": [{"role": "user", "content": "方向：中文→英文\n原文：你好"}],
+}
+
+
+class TestLatencyDistribution:
+    """测试延迟分布"""
+
+    def test_fixed(self):
+        """测试固定延迟按毫秒换算为秒"""
+        assert LatencyDistribution("fixed:200").sample(random.Random(0)) == 0.2
+
+    def test_uniform_range(self):
+        """测试均匀分布落在区间内"""
+        latency = LatencyDistribution("uniform:100:300")
+        rng = random.Random(0)
+        samples = [latency.sample(rng) for _ in range(200)]
+        assert all(0.1 <= s <= 0.3 for s in samples)
+
+    def test_lognormal_median(self):
+        """测试对数正态分布的中位数接近配置值"""
+        latency = LatencyDistribution("lognormal:200:0.5")
+        rng = random.Random(0)
+        samples = sorted(latency.sample(rng) for _ in range(2000))
+        assert 0.18 < samples[1000] < 0.22
+        assert samples[-1] > 0.4
+
+    def test_never_negative(self):
+        """测试正态分布截断为非负"""
+        latency = LatencyDistribution("normal:0:100")
+        rng = random.Random(0)
+        assert min(latency.sample(rng) for _ in range(100)) == 0.0
+
+    @pytest.mark.parametrize("spec", ["fixed", "uniform:100", "pareto:1:2", "fixed:abc"])
+    def test_invalid_spec(self, spec):
+        """测试无效的分布格式"""
+        with pytest.raises(ValueError):
+            LatencyDistribution(spec)
+
+
+class TestReply:
+    """测试回复生成"""
+
+    def test_single_reply(self):
+        """测试单条提示词按 翻译：/关键词： 格式回复"""
+        reply = build_reply(build_translation_prompt("你好世界", "zh_to_en"))
+        assert reply.startswith("翻译：Translation of 4 characters: 你好世界")
+        assert reply.endswith("关键词：[stub, translation, test]")
+
+    def test_batch_reply(self):
+        """测试批量提示词按编号逐条回复，且能被批量解析器解析"""
+        texts = ["Hello", "World", "Batch"]
+        reply = build_reply(build_batch_prompt(texts, "en_to_zh"))
+        parsed = parse_batch_response(reply, len(texts))
+        assert sorted(parsed) == [0, 1, 2]
+        assert parsed[1][0] == "译文（5 个字符）：World"
+        assert parsed[1][1] == ["桩服务", "翻译", "测试"]
+
+
+class TestStubServer:
+    """测试桩服务接口"""
+
+    def test_chat_completions(self):
+        """测试返回 OpenAI 兼容格式和 token 用量"""
+        client = TestClient(create_app())
+        data = client.post("/v1/chat/completions", json=CHAT_REQUEST).json()
+        assert data["choices"][0]["message"]["content"].startswith("翻译：")
+        assert data["usage"]["total_tokens"] > 0
+
+    def test_streaming(self):
+        """测试流式响应逐块输出并以 [DONE] 结束"""
+        client = TestClient(create_app())
+        response = client.post("/chat/completions", json={**CHAT_REQUEST, "stream": True})
+        assert response.headers["content-type"].startswith("text/event-stream")
+        events = [line[len("data: "):] for line in response.text.split("\n\n") if line]
+        assert events[-1] == "[DONE]"
+        assert len(events) > 5
+
+    def test_error_injection(self):
+        """测试按比例注入 500"""
+        client = TestClient(create_app(StubConfig(error_rate=1.0)))
+        response = client.post("/chat/completions", json=CHAT_REQUEST)
+        assert response.status_code == 500
+        assert response.json()["error"]["type"] == "server_error"
+        assert client.get("/stats").json()["errors"] == 1
+
+    def test_rate_limit_injection(self):
+        """测试按比例注入带 Retry-After 的 429"""
+        client = TestClient(create_app(StubConfig(rate_limit_rate=1.0, retry_after=2.5)))
+        response = client.post("/chat/completions", json=CHAT_REQUEST)
+        assert response.status_code == 429
+        assert response.headers["retry-after"] == "2.5"
+
+    def test_rpm_quota(self):
+        """测试 RPM 配额用完后返回 429，并在响应头中公布剩余额度"""
+        client = TestClient(create_app(StubConfig(rpm=2)))
+        first = client.post("/chat/completions", json=CHAT_REQUEST)
+        assert first.headers["x-ratelimit-limit-requests"] == "2"
+        assert first.headers["x-ratelimit-remaining-requests"] == "1"
+        client.post("/chat/completions", json=CHAT_REQUEST)
+        third = client.post("/chat/completions", json=CHAT_REQUEST)
+        assert third.status_code == 429
+        assert third.headers["x-ratelimit-remaining-requests"] == "0"
+        assert float(third.headers["retry-after"]) > 0
+        assert client.get("/stats").json()["status_counts"] == {"200": 2, "429": 1}
+
+    def test_parse_args(self):
+        """测试命令行参数"""
+        args = parse_args(["--latency", "lognormal:300:0.5", "--error-rate", "0.1", "--rpm", "60"])
+        assert args.latency == "lognormal:300:0.5"
+        assert args.error_rate == 0.1
+        assert args.rpm == 60
+
+
+class TestRealClientAgainstStub:
+    """测试真实客户端代码对接桩服务"""
+
+    @pytest.fixture
+    def stub_client(self, env_vars):
+        """返回一个工厂：在当前事件循环中创建通过 ASGI 传输连接桩服务的 DeepSeekClient"""
+        def factory(config=None):
+            client = DeepSeekClient()
+            client.client = AsyncOpenAI(
+                api_key="stub",
+                base_url="http://stub/v1",
+                max_retries=0,
+                http_client=httpx.AsyncClient(
+                    transport=httpx.ASGITransport(app=create_app(config)),
+                    event_hooks={"response": [client._observe_response]}
+                )
+            )
+            return client
+        return factory
+
+    def test_translate(self, stub_client):
+        """测试单条翻译走完提示词构建、调用和解析"""
+        async def run():
+            client = stub_client()
+            return await client.translate_and_extract("人工智能", "zh_to_en")
+
+        translation, keywords = asyncio.run(run())
+        assert translation == "Translation of 4 characters: 人工智能"
+        assert keywords == ["stub", "translation", "test"]
+
+    def test_translate_json_mode(self, stub_client):
+        """测试 JSON 输出模式下桩服务回复 JSON 对象并被直接校验"""
+        async def run():
+            client = stub_client()
+            client.output_format = "json"
+            return await client.translate_and_extract("人工智能", "zh_to_en")
+
+        assert asyncio.run(run()) == ("Translation of 4 characters: 人工智能", ["stub", "translation", "test"])
+
+    def test_stream_translate(self, stub_client):
+        """测试流式翻译逐块产出译文"""
+        async def run():
+            client = stub_client()
+            return [event async for event in client.stream_translate("Hello world", "en_to_zh")]
+
+        events = asyncio.run(run())
+        deltas = "".join(payload for kind, payload in events if kind == "delta")
+        assert events[-1] == ("result", (deltas, ["桩服务", "翻译", "测试"]))
+        assert len(events) > 2
+
+    def test_translate_batch(self, stub_client):
+        """测试批量翻译按编号解析每条结果"""
+        async def run():
+            client = stub_client()
+            return await client.translate_batch(["一", "二", "三"], "zh_to_en")
+
+        results = asyncio.run(run())
+        assert [r[0] for r in results] == [f"Translation of 1 characters: {t}" for t in "一二三"]
+
+    def test_rate_limit_headers_calibrate_client(self, stub_client):
+        """测试桩服务的限速响应头校准客户端的配额排速"""
+        async def run():
+            client = stub_client(StubConfig(rpm=30))
+            await client.translate_and_extract("配额", "zh_to_en")
+            return client.rate_limiter.stats()
+
+        stats = asyncio.run(run())
+        assert stats["rpm"] == 30
+        assert stats["requests_available"] <= 29
+
+    def test_prefix_cache_reported(self, stub_client):
+        """测试相同前缀的第二次调用报告缓存命中，流式调用也统计 usage"""
+        async def run():
+            client = stub_client()
+            await client.translate_and_extract("第一次", "zh_to_en")
+            first = client._cached_tokens.value
+            [event async for event in client.stream_translate("Second call", "en_to_zh")]
+            return first, client._cached_tokens.value
+
+        first, second = asyncio.run(run())
+        assert second - first >= 64
@@ -0,0 +1,130 @@
+"""
+测试术语表模块
+
+包含对 Aho-Corasick 自动机、最左最长匹配、单词边界、大术语表加载、关键词排序
+以及 MockAIClient 离线翻译的测试
+"""
+
+import time
+import random
+import asyncio
+from unittest.mock import patch
+
+from src.xp_translator.glossary import AhoCorasick, Glossary, GlossaryEntry, DEFAULT_GLOSSARY_PATH, _load_cached
+from src.xp_translator.clients import MockAIClient
+
+ENTRIES = [
+    GlossaryEntry("人工智能", "Artificial Intelligence", ("人工智能", "AI"), ("AI", "machine intelligence")),
+    GlossaryEntry("人工", "Manual", ("人工",), ("manual",)),
+    GlossaryEntry("智能", "Smart", ("智能",), ("smart",)),
+    GlossaryEntry("测试", "Test", ("测试", "验证"), ("test", "validation")),
+    GlossaryEntry("代码", "Code", ("代码",), ("code", "source")),
+]
+
+
+class TestAhoCorasick:
+    """测试多模式匹配自动机"""
+
+    def test_matches_brute_force(self):
+        """测试随机文本上的匹配结果与逐个模式查找一致（包括重叠匹配）"""
+        rng = random.Random(0)
+        patterns = list({"".join(rng.choice("abc") for _ in range(rng.randint(1, 4))) for _ in range(30)})
+        automaton = AhoCorasick(patterns)
+        for _ in range(50):
+            text = "".join(rng.choice("abcd") for _ in range(rng.randint(0, 40)))
+            expected = sorted(
+                (i, i + len(p), p) for p in patterns for i in range(len(text)) if text.startswith(p, i)
+            )
+            actual = sorted((s, e, automaton.patterns[idx]) for s, e, idx in automaton.iter_matches(text))
+            assert actual == expected
+
+    def test_empty_pattern_ignored(self):
+        """测试空模式不参与匹配"""
+        automaton = AhoCorasick(["", "ab"])
+        assert automaton.patterns == ["ab"]
+        assert automaton.scan("xaby") == [(1, 3, 0)]
+
+
+class TestGlossary:
+    """测试术语表"""
+
+    def test_leftmost_longest(self):
+        """测试重叠的术语取最左最长的一个"""
+        glossary = Glossary(ENTRIES)
+        matches = glossary.find("人工智能测试", "zh_to_en")
+        assert [m.entry.zh for m in matches] == ["人工智能", "测试"]
+
+    def test_word_boundary(self):
+        """测试英文术语只匹配完整单词且不区分大小写"""
+        glossary = Glossary(ENTRIES)
+        assert [m.entry.zh for m in glossary.find("CODE review, no codes", "en_to_zh")] == ["代码"]
+        assert glossary.find("barcode", "en_to_zh") == []
+
+    def test_substitute_spacing(self):
+        """测试译成英文时在译法与相邻字母数字之间补空格"""
+        glossary = Glossary(ENTRIES)
+        assert glossary.translate("测试代码", "zh_to_en")[0] == "Test Code"
+        assert glossary.translate("v2测试", "zh_to_en")[0] == "v2 Test"
+        assert glossary.translate("测试，完成", "zh_to_en")[0] == "Test，完成"
+
+    def test_rank_keywords_deterministic(self):
+        """测试关键词按出现次数、首次位置排序，且去重"""
+        glossary = Glossary(ENTRIES)
+        text = "代码测试测试代码测试"
+        keywords = glossary.translate(text, "zh_to_en")[1]
+        assert keywords == ["test", "validation", "code"]
+        assert all(glossary.translate(text, "zh_to_en")[1] == keywords for _ in range(5))
+
+    def test_no_match(self):
+        """测试没有术语时返回 None"""
+        assert Glossary(ENTRIES).translate("没有术语", "zh_to_en") is None
+
+    def test_large_glossary_loaded_once(self, tmp_path, monkeypatch):
+        """测试数万条术语的文件加载后可快速查找，相同路径只加载一次"""
+        path = tmp_path / "large.tsv"
+        path.write_text(
+            "# 大术语表\n" + "".join(f"术语{i:05d}号\tterm{i:05d}\t\tkw{i}\n" for i in range(20000)),
+            encoding="utf-8"
+        )
+        monkeypatch.setenv("MOCK_GLOSSARY_PATHS", f"{DEFAULT_GLOSSARY_PATH},{path}")
+        _load_cached.cache_clear()
+        glossary = Glossary.from_env()
+        assert glossary is Glossary.from_env()
+        assert len(glossary) >= 20000
+
+        start = time.perf_counter()
+        for _ in range(100):
+            result = glossary.translate("请把术语12345号和你好一起处理", "zh_to_en")
+        assert time.perf_counter() - start < 0.5
+        assert result[0] == "请把 term12345 和 Hello 一起处理"
+        assert result[1][0] == "kw12345"
+        _load_cached.cache_clear()
+
+
+class TestMockAIClient:
+    """测试基于术语表的 MockAIClient"""
+
+    def test_glossary_translation(self):
+        """测试按术语表翻译并返回目标语言关键词"""
+        client = MockAIClient(glossary=Glossary(ENTRIES), latency_ms=0)
+        translation, keywords = asyncio.run(client.translate_and_extract("人工智能代码", "zh_to_en"))
+        assert translation == "Artificial Intelligence Code"
+        assert keywords == ["AI", "machine intelligence", "code"]
+
+    def test_fallback_without_terms(self):
+        """测试没有术语时使用占位译文和默认关键词"""
+        client = MockAIClient(glossary=Glossary(ENTRIES), latency_ms=0)
+        translation, keywords = asyncio.run(client.translate_and_extract("Nothing here", "auto"))
+        assert translation == "翻译：Nothing here"
+        assert len(keywords) == 3
+
+    def test_latency_from_env(self):
+        """测试 MOCK_LATENCY_MS 配置人为延迟，默认不休眠"""
+        assert MockAIClient().latency == 0
+        with patch.dict("os.environ", {"MOCK_LATENCY_MS": "50"}):
+            assert MockAIClient().latency == 0.05
+
+        client = MockAIClient(latency_ms=0)
+        with patch("asyncio.sleep") as sleep:
+            asyncio.run(client.translate_and_extract("你好", "zh_to_en"))
+        sleep.assert_not_called()
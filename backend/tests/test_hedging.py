@@ -0,0 +1,199 @@
+"""
+测试对冲请求
+
+包含对延迟分位数统计、对冲等待时间以及 HedgedTranslator 胜出/取消语义的测试
+"""
+
+import asyncio
+import pytest
+from unittest.mock import patch
+
+from src.xp_translator.hedging import LatencyTracker, HedgedTranslator
+from src.xp_translator.prompts import FallbackReply
+
+
+def delayed(value, delay, state=None, name=None, error=None):
+    """构造一个延迟返回（或抛出异常）的调用，并记录是否被取消"""
+    async def call():
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            if state is not None:
+                state[name] = "cancelled"
+            raise
+        if error is not None:
+            raise error
+        return value
+    return call
+
+
+class TestLatencyTracker:
+    """测试延迟统计"""
+    
+    def test_percentile(self):
+        """测试分位数计算"""
+        tracker = LatencyTracker()
+        assert tracker.percentile(0.95) is None
+        for i in range(1, 101):
+            tracker.record(i / 100)
+        assert tracker.percentile(0.5) == 0.5
+        assert tracker.percentile(0.95) == 0.95
+    
+    def test_window(self):
+        """测试只保留窗口内的样本"""
+        tracker = LatencyTracker(window=3)
+        for value in [10, 1, 2, 3]:
+            tracker.record(value)
+        assert len(tracker) == 3
+        assert tracker.percentile(1.0) == 3
+
+
+class TestHedgeDelay:
+    """测试对冲等待时间"""
+    
+    def test_default_delay_without_samples(self):
+        """测试样本不足时使用默认等待时间"""
+        hedger = HedgedTranslator(default_delay=1.5, min_samples=5)
+        assert hedger.hedge_delay("deepseek") == 1.5
+    
+    def test_delay_clamped(self):
+        """测试等待时间限制在上下限之间"""
+        hedger = HedgedTranslator(min_delay=0.5, max_delay=2.0, min_samples=1)
+        hedger._tracker("fast").record(0.01)
+        hedger._tracker("slow").record(30)
+        assert hedger.hedge_delay("fast") == 0.5
+        assert hedger.hedge_delay("slow") == 2.0
+    
+    def test_from_env_disabled_by_default(self):
+        """测试默认不启用对冲"""
+        with patch.dict('os.environ', {}, clear=True):
+            assert HedgedTranslator.from_env() is None
+        with patch.dict('os.environ', {'HEDGING_ENABLED': 'true', 'HEDGING_PERCENTILE': '0.9'}):
+            assert HedgedTranslator.from_env().percentile == 0.9
+
+
+class TestHedgedTranslator:
+    """测试对冲调用"""
+    
+    def test_fast_primary_no_hedge(self):
+        """测试主请求及时返回时不发出对冲请求"""
+        hedger = HedgedTranslator(default_delay=0.5)
+        result = asyncio.run(hedger.run(
+            "deepseek", delayed("primary", 0.01),
+            "aliyun", delayed("secondary", 0.01)
+        ))
+        assert result == ("primary", "deepseek")
+        assert hedger.stats()["hedged"] == 0
+    
+    def test_slow_primary_secondary_wins(self):
+        """测试主请求过慢时备用请求胜出并取消主请求"""
+        hedger = HedgedTranslator(default_delay=0.05)
+        state = {}
+        result = asyncio.run(hedger.run(
+            "deepseek", delayed("primary", 1.0, state, "primary"),
+            "aliyun", delayed("secondary", 0.01)
+        ))
+        assert result == ("secondary", "aliyun")
+        assert state["primary"] == "cancelled"
+        stats = hedger.stats()
+        assert stats["hedged"] == 1
+        assert stats["hedge_wins"] == 1
+        assert stats["hedge_rate"] == 1.0
+    
+    def test_primary_can_still_win_after_hedge(self):
+        """测试发出对冲后主请求先返回时取消备用请求"""
+        hedger = HedgedTranslator(default_delay=0.02)
+        state = {}
+        result = asyncio.run(hedger.run(
+            "deepseek", delayed("primary", 0.05),
+            "aliyun", delayed("secondary", 1.0, state, "secondary")
+        ))
+        assert result == ("primary", "deepseek")
+        assert state["secondary"] == "cancelled"
+        assert hedger.stats()["hedge_wins"] == 0
+    
+    def test_primary_failure_hedges_immediately(self):
+        """测试主请求失败时立即发出对冲请求"""
+        hedger = HedgedTranslator(default_delay=5.0)
+        
+        async def run():
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            result = await hedger.run(
+                "deepseek", delayed(None, 0, error=RuntimeError("down")),
+                "aliyun", delayed("secondary", 0.01)
+            )
+            return result, loop.time() - start
+        
+        result, elapsed = asyncio.run(run())
+        assert result == ("secondary", "aliyun")
+        assert elapsed < 1.0
+    
+    def test_placeholder_does_not_win(self):
+        """测试主请求的占位结果不算胜出，继续等待备用请求的有效结果"""
+        hedger = HedgedTranslator(default_delay=5.0)
+        placeholder = FallbackReply(("Translated: 你好", ["translation"]))
+        result = asyncio.run(hedger.run(
+            "deepseek", delayed(placeholder, 0.01),
+            "aliyun", delayed(("Hello", ["hello"]), 0.02)
+        ))
+        assert result == (("Hello", ["hello"]), "aliyun")
+        assert hedger.stats()["hedge_wins"] == 1
+
+    def test_placeholder_returned_when_no_valid_result(self):
+        """测试双方都只有占位结果或失败时返回占位结果，优先主请求的"""
+        hedger = HedgedTranslator(default_delay=0.01)
+        primary = FallbackReply(("Translated: 你好", ["translation"]))
+        secondary = FallbackReply(("Translated: 你好 ", ["text"]))
+        result, provider = asyncio.run(hedger.run(
+            "deepseek", delayed(primary, 0.03),
+            "aliyun", delayed(secondary, 0.01)
+        ))
+        assert (result, provider) == (primary, "deepseek")
+        assert isinstance(result, FallbackReply)
+        result, provider = asyncio.run(hedger.run(
+            "deepseek", delayed(None, 0.03, error=RuntimeError("down")),
+            "aliyun", delayed(secondary, 0.01)
+        ))
+        assert (result, provider) == (secondary, "aliyun")
+
+    def test_both_fail_raises_primary_error(self):
+        """测试两个请求都失败时抛出主请求的异常"""
+        hedger = HedgedTranslator(default_delay=0.01)
+        with pytest.raises(RuntimeError, match="primary down"):
+            asyncio.run(hedger.run(
+                "deepseek", delayed(None, 0.02, error=RuntimeError("primary down")),
+                "aliyun", delayed(None, 0.01, error=RuntimeError("secondary down"))
+            ))
+
+
+class TestHedgingAPI:
+    """测试 /translate 接口的对冲行为"""
+    
+    def test_response_reports_answering_provider(self, test_client, register_client):
+        """测试备用提供商胜出时响应中的 provider 为实际提供商"""
+        from src.xp_translator import api
+        from src.xp_translator.clients import MockAIClient
+        
+        class StubClient(MockAIClient):
+            def __init__(self, provider, delay, translation):
+                super().__init__()
+                self.provider = provider
+                self.model = f"{provider}-model"
+                self.delay = delay
+                self.translation = translation
+            
+            async def translate_and_extract(self, text, direction="zh_to_en"):
+                await asyncio.sleep(self.delay)
+                return self.translation, ["k"]
+        
+        register_client("deepseek", StubClient("deepseek", 1.0, "slow"))
+        register_client("aliyun", StubClient("aliyun", 0.01, "fast"))
+        api.translation_cache.clear()
+        
+        with patch.object(api, "hedged_translator", HedgedTranslator(default_delay=0.05)):
+            response = test_client.post("/translate", json={"text": "对冲测试", "provider": "deepseek"})
+        
+        assert response.status_code == 200
+        assert response.json()["translation"] == "fast"
+        assert response.json()["provider"] == "aliyun"
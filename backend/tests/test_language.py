@@ -0,0 +1,123 @@
+"""
+测试语言检测模块
+
+包含对中英文判断、混合文本、汉字扩展区、长文本抽样、检测缓存以及接口返回检测结果的测试
+"""
+
+from unittest.mock import AsyncMock, patch
+
+from src.xp_translator import language
+from src.xp_translator.language import detect_language, script_counts, clear_cache
+from src.xp_translator.prompts import resolve_direction
+
+
+class TestDetectLanguage:
+    """测试语言检测"""
+
+    def test_pure_languages(self):
+        """测试纯中文、纯英文和没有文字的文本"""
+        assert detect_language("人工智能正在改变我们的生活").language == "zh"
+        assert detect_language("Artificial intelligence is changing our lives").language == "en"
+        assert detect_language("12345 !!!").language == "unknown"
+
+    def test_single_cjk_in_english_paragraph(self):
+        """测试英文段落中夹杂的个别汉字不会把方向改为中文到英文"""
+        text = "The restaurant 福 is famous for its dumplings and noodles in the city center."
+        assert detect_language(text).language == "en"
+        assert resolve_direction(text, "auto") == "en_to_zh"
+
+    def test_mixed_text(self):
+        """测试夹杂英文术语的中文判为中文，并标记为混合文本"""
+        detection = detect_language("使用 FastAPI 构建服务")
+        assert detection.language == "zh"
+        assert detection.mixed
+        assert not detect_language("纯中文文本").mixed
+
+    def test_product_name_with_chinese(self):
+        """测试中文短语夹杂英文产品名时按折算词数判断：持平时判为中文，英文单词更多时判为英文
+
+        旧实现出现一个汉字就判为中文，这里固定按比例判断后的结果
+        """
+        assert detect_language("iPhone 15 Pro 发布会") == ("zh", 0.5, True)
+        assert detect_language("iPhone 15 Pro Max 发布会").language == "en"
+        assert resolve_direction("iPhone 15 Pro 发布会", "auto") == "zh_to_en"
+
+    def test_cjk_extension_ranges(self):
+        """测试扩展区和兼容区的汉字也计为中文"""
+        assert script_counts("\U00020000\U0002a700㐀豈") == (4, 0)
+        assert detect_language("\U00020000\U00020001").language == "zh"
+
+    def test_long_text_sampled(self):
+        """测试长文本按均匀分布的窗口统计，中文出现在后半段也能检测到"""
+        text = "Hello world. " * 200 + "这是一段很长的中文内容，用来测试抽样窗口。" * 200
+        cjk, words = script_counts(text)
+        assert cjk + words < len(text) / 2
+        assert cjk > 0 and words > 0
+        assert detect_language(text).language == "zh"
+
+    def test_cached_by_text(self):
+        """测试相同文本只检测一次"""
+        clear_cache()
+        text = "缓存测试文本"
+        with patch.object(language, "_detect", wraps=language._detect) as detect:
+            first = detect_language(text)
+            second = detect_language("".join(["缓存", "测试文本"]))
+        assert first == second
+        assert detect.call_count == 1
+        # 键是长度加摘要，缓存不保留原文
+        assert list(language._cache) == [language._cache_key(text)]
+
+    def test_cache_does_not_retain_text(self):
+        """测试长文本的缓存键大小固定，孤立代理项也能计算"""
+        clear_cache()
+        detect_language("长文本" * 100000)
+        detect_language("\ud800 text")
+        for length, digest in language._cache:
+            assert isinstance(length, int) and len(digest) == 16
+
+    def test_cache_bounded(self):
+        """测试缓存条数有上限"""
+        clear_cache()
+        with patch.object(language, "CACHE_SIZE", 3):
+            for i in range(10):
+                detect_language(f"text {i}")
+            assert len(language._cache) == 3
+
+
+class TestDetectionInResponse:
+    """测试接口返回检测结果"""
+
+    def _register(self, register_client):
+        from src.xp_translator.api import translation_cache
+        from src.xp_translator.clients import MockAIClient
+
+        client = MockAIClient()
+        client.translate_and_extract = AsyncMock(return_value=("Translated", ["a"]))
+        register_client("deepseek", client)
+        translation_cache.clear()
+        return client
+
+    def test_auto_direction_reported(self, test_client, register_client):
+        """测试 auto 方向返回检测到的语言和实际使用的方向"""
+        self._register(register_client)
+        data = test_client.post("/translate", json={"text": "使用 FastAPI 构建服务", "direction": "auto"}).json()
+        assert data["direction"] == "zh_to_en"
+        assert data["detected_language"] == "zh"
+
+    def test_explicit_direction_not_detected(self, test_client, register_client):
+        """测试指定方向时不做检测"""
+        self._register(register_client)
+        data = test_client.post("/translate", json={"text": "Hello", "direction": "zh_to_en"}).json()
+        assert data["direction"] == "zh_to_en"
+        assert data["detected_language"] is None
+
+    def test_batch_items(self, test_client, register_client):
+        """测试批量接口逐条返回检测结果"""
+        client = self._register(register_client)
+        client.translate_batch = AsyncMock(return_value=[("A", ["a"])])
+        data = test_client.post("/translate/batch", json={"items": [
+            {"text": "Good morning everyone", "direction": "auto"},
+            {"text": "早上好", "direction": "zh_to_en"},
+        ]}).json()
+        assert [r["detected_language"] for r in data["results"]] == ["en", None]
+        assert data["results"][0]["direction"] == "en_to_zh"
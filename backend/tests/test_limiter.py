@@ -0,0 +1,172 @@
+"""
+测试自适应并发限制
+
+包含对并发上限、有界队列、AIMD 调整以及 API 503 背压响应的测试
+"""
+
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, Mock
+
+from src.xp_translator.limiter import AdaptiveLimiter, QueueFullError
+from src.xp_translator.clients import DeepSeekClient, MockAIClient
+
+
+class RateLimited(Exception):
+    """带 429 状态码的上游异常"""
+    status_code = 429
+
+
+class TestAdaptiveLimiter:
+    """测试并发限制器"""
+
+    def test_limits_concurrency(self):
+        """测试同时进行的调用数不超过上限，其余排队等待"""
+        limiter = AdaptiveLimiter("test", initial_limit=2)
+        peak = 0
+
+        async def work():
+            nonlocal peak
+            async with limiter.slot():
+                peak = max(peak, limiter.in_flight)
+                await asyncio.sleep(0.01)
+
+        async def run():
+            await asyncio.gather(*(work() for _ in range(6)))
+
+        asyncio.run(run())
+        assert peak == 2
+        assert limiter.in_flight == 0
+        assert limiter.queued == 0
+
+    def test_queue_full_rejects_immediately(self):
+        """测试队列已满时立即拒绝并给出重试时间"""
+        limiter = AdaptiveLimiter("test", initial_limit=1, max_queue=1)
+
+        async def run():
+            await limiter.acquire()
+            waiter = asyncio.ensure_future(limiter.acquire())
+            await asyncio.sleep(0)
+            with pytest.raises(QueueFullError) as exc_info:
+                await limiter.acquire()
+            assert exc_info.value.retry_after >= 1
+            limiter.release()
+            await waiter
+            limiter.release()
+
+        asyncio.run(run())
+        assert limiter.rejected == 1
+        assert limiter.in_flight == 0
+
+    def test_queue_timeout(self):
+        """测试排队超时后抛出 QueueFullError 并离开队列"""
+        limiter = AdaptiveLimiter("test", initial_limit=1, queue_timeout=0.01)
+
+        async def run():
+            await limiter.acquire()
+            with pytest.raises(QueueFullError):
+                await limiter.acquire()
+            assert limiter.queued == 0
+
+        asyncio.run(run())
+
+    def test_cancelled_waiter_leaves_queue(self):
+        """测试排队中被取消的调用不会占用名额"""
+        limiter = AdaptiveLimiter("test", initial_limit=1)
+
+        async def run():
+            await limiter.acquire()
+            waiter = asyncio.ensure_future(limiter.acquire())
+            await asyncio.sleep(0)
+            waiter.cancel()
+            await asyncio.gather(waiter, return_exceptions=True)
+            assert limiter.queued == 0
+            limiter.release()
+            assert limiter.in_flight == 0
+
+        asyncio.run(run())
+
+    def test_additive_increase_under_load(self):
+        """测试延迟正常且并发被充分使用时上限增长"""
+        limiter = AdaptiveLimiter("test", initial_limit=2)
+        limiter.in_flight = 2
+        for _ in range(4):
+            limiter.on_success(0.1)
+        assert limiter.limit > 2
+
+    def test_no_increase_when_idle(self):
+        """测试空闲时上限不增长"""
+        limiter = AdaptiveLimiter("test", initial_limit=10)
+        limiter.in_flight = 1
+        limiter.on_success(0.1)
+        assert limiter.limit == 10
+
+    def test_decrease_on_latency_and_overload(self):
+        """测试延迟超过基线容忍范围或遇到 429 时上限下降"""
+        limiter = AdaptiveLimiter("test", initial_limit=10, latency_tolerance=2.0)
+        limiter.on_success(0.1)
+        limiter.on_success(1.0)
+        assert limiter.limit == pytest.approx(9)
+
+        limiter.on_overload()
+        assert limiter.limit == pytest.approx(4.5)
+        for _ in range(10):
+            limiter.on_overload()
+        assert limiter.limit == limiter.min_limit
+
+    def test_slot_detects_429(self):
+        """测试 slot 识别 429 异常并降低上限"""
+        limiter = AdaptiveLimiter("test", initial_limit=8)
+
+        async def run():
+            with pytest.raises(RateLimited):
+                async with limiter.slot():
+                    raise RateLimited()
+
+        asyncio.run(run())
+        assert limiter.limit == 4
+        assert limiter.overloads == 1
+        assert limiter.in_flight == 0
+
+
+class TestClientLimiter:
+    """测试客户端接入并发限制"""
+
+    def test_client_429_lowers_limit(self, env_vars):
+        """测试上游 429 降低该提供商的并发上限"""
+        client = DeepSeekClient()
+        client.client = Mock()
+        client.client.chat.completions.create = AsyncMock(side_effect=RateLimited("too many requests"))
+        before = client.limiter.limit
+
+        with pytest.raises(Exception, match="DeepSeek API 调用失败"):
+            client.translate_sync("你好", "zh_to_en")
+        assert client.limiter.limit < before
+
+    def test_queue_full_not_wrapped(self, env_vars):
+        """测试排队已满的异常原样抛出，保留重试时间"""
+        client = DeepSeekClient()
+        client.limiter = AdaptiveLimiter("deepseek", initial_limit=1, max_queue=0)
+        client.limiter.in_flight = 1
+
+        with pytest.raises(QueueFullError):
+            client.translate_sync("你好", "zh_to_en")
+
+
+class TestLimiterAPI:
+    """测试 API 的背压响应"""
+
+    def test_queue_full_returns_503(self, test_client, register_client):
+        """测试所有提供商排队已满时返回 503 和 Retry-After"""
+        from src.xp_translator.api import translation_cache
+
+        client = MockAIClient()
+        client.translate_and_extract = AsyncMock(side_effect=QueueFullError("deepseek", 2.5))
+        register_client("deepseek", client)
+        register_client("aliyun", client)
+        translation_cache.clear()
+
+        response = test_client.post("/translate", json={"text": "背压测试", "provider": "deepseek"})
+
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "3"
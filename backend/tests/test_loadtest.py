@@ -0,0 +1,76 @@
+"""
+测试压测工具
+
+包含对结果汇总、开环压测的丢弃计数和请求生成的测试
+"""
+
+import asyncio
+
+import httpx
+
+from benchmarks.loadtest import percentile, summarize, run_open_loop, RequestFactory, parse_args
+
+
+class TestSummarize:
+    """测试结果汇总"""
+
+    def test_percentile(self):
+        """测试最近秩法分位数"""
+        values = [i / 100 for i in range(1, 101)]
+        assert percentile(values, 0.5) == 0.5
+        assert percentile(values, 0.99) == 0.99
+        assert percentile([], 0.5) == 0.0
+
+    def test_summarize(self):
+        """测试 RPS、错误率和延迟分位数"""
+        result = summarize("closed_loop", {"concurrency": 4}, [0.1, 0.2, 0.3, 0.4], [200, 200, 200, 503], 2.0)
+        assert result["concurrency"] == 4
+        assert result["requests"] == 4
+        assert result["errors"] == 1
+        assert result["error_rate"] == 0.25
+        assert result["rps"] == 1.5
+        assert result["latency_ms"]["p50"] == 200.0
+        assert result["latency_ms"]["max"] == 400.0
+        assert result["status_counts"] == {"200": 3, "503": 1}
+
+        assert result["dropped"] == 0
+
+    def test_open_loop_drops_not_in_latency(self):
+        """测试开环压测中未发出的请求单独计数，不以 0 延迟拉低分位数"""
+        async def handler(request):
+            await asyncio.sleep(0.05)
+            return httpx.Response(200, json={})
+
+        async def run():
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url="http://test") as client:
+                return await run_open_loop(client, RequestFactory(), rate=200, duration=0.1, max_outstanding=1)
+
+        result = asyncio.run(run())
+        assert result["dropped"] > 0
+        assert result["errors"] == result["dropped"]
+        assert result["requests"] == 20
+        assert result["latency_ms"]["p50"] >= 50
+        assert result["status_counts"]["0"] == result["dropped"]
+
+
+class TestRequestFactory:
+    """测试请求生成"""
+
+    def test_unique_texts_by_default(self):
+        """测试默认每个请求的文本都不同，不会命中缓存"""
+        factory = RequestFactory()
+        texts = [factory.next()["text"] for _ in range(100)]
+        assert len(set(texts)) == 100
+
+    def test_hit_ratio_repeats_texts(self):
+        """测试 hit_ratio 控制重复文本的比例"""
+        factory = RequestFactory(hit_ratio=0.5)
+        texts = [factory.next()["text"] for _ in range(1000)]
+        assert 400 < 1000 - len(set(texts)) < 600
+
+    def test_parse_args(self):
+        """测试逗号分隔的场景列表"""
+        args = parse_args(["--concurrency", "2,4", "--rates", "10,20.5"])
+        assert args.concurrency == [2, 4]
+        assert args.rates == [10.0, 20.5]
+
@@ -0,0 +1,153 @@
+"""
+测试结构化日志
+
+包含对 JSON 格式化、队列写出、访问日志中间件采样以及客户端创建不再打印的测试
+"""
+
+import io
+import json
+import logging
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from unittest.mock import patch
+
+from src.xp_translator import logging_config
+from src.xp_translator.logging_config import JsonFormatter, AccessLogMiddleware
+from src.xp_translator.clients import create_ai_client
+
+
+class ListHandler(logging.Handler):
+    """把日志记录保存在列表中"""
+
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+@pytest.fixture
+def access_records():
+    """提供一个独立的访问日志记录器及其记录列表"""
+    logger = logging.getLogger("xp_translator_test.access")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    handler = ListHandler()
+    logger.addHandler(handler)
+    yield logger, handler.records
+    logger.removeHandler(handler)
+
+
+def make_app(logger, sample_rate):
+    app = FastAPI()
+
+    @app.get("/ok")
+    async def ok():
+        return {"ok": True}
+
+    @app.get("/fail")
+    async def fail():
+        raise HTTPException(status_code=503, detail="down")
+
+    app.add_middleware(AccessLogMiddleware, sample_rate=sample_rate, logger=logger)
+    return TestClient(app)
+
+
+class TestJsonFormatter:
+    """测试 JSON 格式化"""
+
+    def test_extra_fields_merged(self):
+        """测试 extra 字段合并到 JSON 顶层"""
+        record = logging.makeLogRecord({
+            "name": "xp_translator.api",
+            "levelname": "INFO",
+            "msg": "access",
+            "status": 200,
+            "duration_ms": 1.5,
+        })
+        payload = json.loads(JsonFormatter().format(record))
+        assert payload["message"] == "access"
+        assert payload["logger"] == "xp_translator.api"
+        assert payload["status"] == 200
+        assert payload["duration_ms"] == 1.5
+        assert "args" not in payload
+
+    def test_non_ascii_preserved(self):
+        """测试中文内容不被转义"""
+        record = logging.makeLogRecord({"msg": "使用模拟客户端"})
+        assert "使用模拟客户端" in JsonFormatter().format(record)
+
+
+class TestQueueLogging:
+    """测试队列写出"""
+
+    def test_records_written_by_listener(self):
+        """测试日志经由后台线程写出为 JSON 行"""
+        logging_config.shutdown_logging()
+        stream = io.StringIO()
+        try:
+            logging_config.configure_logging(stream=stream)
+            logging_config.get_logger("test").info("hello", extra={"provider": "deepseek"})
+            # 停止监听线程会写完队列中剩余的日志
+            logging_config.shutdown_logging()
+            line = json.loads(stream.getvalue().strip().splitlines()[-1])
+            assert line["message"] == "hello"
+            assert line["provider"] == "deepseek"
+            assert line["logger"] == "xp_translator.test"
+        finally:
+            logging_config.shutdown_logging()
+            logging_config.configure_logging()
+
+    def test_configure_is_idempotent(self):
+        """测试重复配置不会重复添加处理器"""
+        first = logging_config.configure_logging()
+        assert logging_config.configure_logging() is first
+
+
+class TestAccessLogMiddleware:
+    """测试访问日志中间件"""
+
+    def test_logs_timing_fields(self, access_records):
+        """测试每个请求记录一行包含耗时字段的访问日志"""
+        logger, records = access_records
+        make_app(logger, 1.0).get("/ok")
+
+        assert len(records) == 1
+        record = records[0]
+        assert record.method == "GET"
+        assert record.path == "/ok"
+        assert record.status == 200
+        assert record.duration_ms >= record.ttfb_ms >= 0
+        assert record.bytes > 0
+
+    def test_sampling_skips_success(self, access_records):
+        """测试采样率为 0 时成功请求不记录，5xx 请求总是记录"""
+        logger, records = access_records
+        client = make_app(logger, 0.0)
+        client.get("/ok")
+        client.get("/fail")
+
+        assert [record.status for record in records] == [503]
+
+    def test_partial_sampling(self, access_records):
+        """测试按采样率随机记录"""
+        logger, records = access_records
+        client = make_app(logger, 0.5)
+        with patch("src.xp_translator.logging_config.random.random", side_effect=[0.1, 0.9]):
+            client.get("/ok")
+            client.get("/ok")
+
+        assert len(records) == 1
+        assert records[0].sampled is True
+
+
+class TestClientCreationLogging:
+    """测试客户端创建不再写 stdout"""
+
+    def test_create_ai_client_does_not_print(self, capsys):
+        """测试创建客户端时没有 print 输出"""
+        with patch.dict("os.environ", {}, clear=True):
+            create_ai_client("deepseek")
+        assert capsys.readouterr().out == ""
@@ -0,0 +1,194 @@
+"""
+测试 Prometheus 指标
+
+包含对指标类型、文本格式导出、客户端上游指标以及 /metrics 接口的测试
+"""
+
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, Mock
+
+from src.xp_translator.metrics import (
+    MetricsRegistry, RequestMetrics, UPSTREAM_TOKENS, PARSE_FALLBACKS, UPSTREAM_DURATION, REQUESTS_TOTAL,
+    SINGLEFLIGHT_CALLS, HEDGED_REQUESTS
+)
+from src.xp_translator.singleflight import SingleFlight
+from src.xp_translator.hedging import HedgedTranslator
+from src.xp_translator.clients import DeepSeekClient, MockAIClient
+
+
+class TestMetricTypes:
+    """测试指标类型和导出格式"""
+
+    def test_counter_render(self):
+        """测试计数器按标签导出"""
+        registry = MetricsRegistry()
+        counter = registry.counter("test_total", "测试计数", ("provider",))
+        counter.labels("deepseek").inc()
+        counter.labels("deepseek").inc(2)
+        counter.labels("aliyun").inc()
+
+        text = registry.render()
+        assert "# TYPE test_total counter" in text
+        assert 'test_total{provider="deepseek"} 3' in text
+        assert 'test_total{provider="aliyun"} 1' in text
+
+    def test_children_cached(self):
+        """测试相同标签值返回同一个子指标"""
+        counter = MetricsRegistry().counter("test_total", "测试计数", ("provider",))
+        assert counter.labels("deepseek") is counter.labels("deepseek")
+
+    def test_label_count_checked(self):
+        """测试标签数量不匹配时报错"""
+        counter = MetricsRegistry().counter("test_total", "测试计数", ("provider", "model"))
+        with pytest.raises(ValueError):
+            counter.labels("deepseek")
+
+    def test_gauge(self):
+        """测试仪表的增减"""
+        registry = MetricsRegistry()
+        gauge = registry.gauge("test_in_flight", "测试仪表")
+        child = gauge.labels()
+        child.inc()
+        child.inc()
+        child.dec()
+        assert "test_in_flight 1" in registry.render()
+
+    def test_histogram_buckets(self):
+        """测试直方图导出累计桶、总和与次数"""
+        registry = MetricsRegistry()
+        histogram = registry.histogram("test_seconds", "测试耗时", ("provider",), buckets=(0.1, 1.0))
+        child = histogram.labels("deepseek")
+        child.observe(0.05)
+        child.observe(0.1)
+        child.observe(0.5)
+        child.observe(3.0)
+
+        text = registry.render()
+        assert 'test_seconds_bucket{provider="deepseek",le="0.1"} 2' in text
+        assert 'test_seconds_bucket{provider="deepseek",le="1"} 3' in text
+        assert 'test_seconds_bucket{provider="deepseek",le="+Inf"} 4' in text
+        assert 'test_seconds_sum{provider="deepseek"} 3.65' in text
+        assert 'test_seconds_count{provider="deepseek"} 4' in text
+
+    def test_label_escaping(self):
+        """测试标签值中的引号和换行被转义"""
+        registry = MetricsRegistry()
+        registry.counter("test_total", "测试计数", ("text",)).labels('a"b\nc').inc()
+        assert 'test_total{text="a\\"b\\nc"} 1' in registry.render()
+
+
+class TestRequestMetrics:
+    """测试请求指标的预绑定表"""
+
+    def test_children_bound_once(self, monkeypatch):
+        """测试每组标签值只调用一次 labels()，之后的记录直接使用缓存的子指标"""
+        metrics = RequestMetrics(("translate",), ("success",))
+        calls = []
+        labels = REQUESTS_TOTAL.labels
+        monkeypatch.setattr(REQUESTS_TOTAL, "labels", lambda *values: calls.append(values) or labels(*values))
+        child = REQUESTS_TOTAL.labels("translate", "test", "m", "zh_to_en", "success")
+        calls.clear()
+        before = child.value
+
+        for _ in range(3):
+            metrics.record("translate", "test", "m", "zh_to_en", "success", 0.01)
+
+        assert child.value - before == 3
+        assert calls == [("translate", "test", "m", "zh_to_en", "success")]
+
+    def test_unknown_outcome_rejected(self):
+        """测试未预先声明的 outcome 直接报错，而不是悄悄创建新的标签组合"""
+        with pytest.raises(KeyError):
+            RequestMetrics(("translate",), ("success",)).record("translate", "p", "m", "auto", "typo", 0.0)
+
+
+class TestCoalescingMetrics:
+    """测试请求合并和对冲的计数器"""
+
+    def test_singleflight_counters(self):
+        """测试合并的调用计入 xp_singleflight_calls_total"""
+        leader, coalesced = SINGLEFLIGHT_CALLS.labels("leader"), SINGLEFLIGHT_CALLS.labels("coalesced")
+        before = (leader.value, coalesced.value)
+
+        async def fn():
+            await asyncio.sleep(0.01)
+            return "ok"
+
+        async def run():
+            flight = SingleFlight()
+            return await asyncio.gather(*(flight.do("key", fn) for _ in range(3)))
+
+        assert asyncio.run(run()) == ["ok"] * 3
+        assert (leader.value - before[0], coalesced.value - before[1]) == (1, 2)
+
+    def test_hedge_counters(self):
+        """测试对冲次数和备用胜出次数计入 xp_hedged_requests_total"""
+        children = [HEDGED_REQUESTS.labels(event) for event in ("requests", "hedged", "hedge_wins")]
+        before = [child.value for child in children]
+
+        async def slow():
+            await asyncio.sleep(1)
+
+        async def fast():
+            return "backup"
+
+        hedger = HedgedTranslator(default_delay=0.01)
+        assert asyncio.run(hedger.run("deepseek", slow, "aliyun", fast)) == ("backup", "aliyun")
+        assert [child.value - value for child, value in zip(children, before)] == [1, 1, 1]
+
+
+class TestClientMetrics:
+    """测试客户端记录的上游指标"""
+
+    def test_usage_and_duration_recorded(self, env_vars):
+        """测试记录上游耗时和 response.usage 中的 token 数"""
+        client = DeepSeekClient()
+        mock_response = Mock()
+        mock_response.choices = [Mock(message=Mock(content="翻译：Hello\n关键词：[hello]"))]
+        mock_response.usage = Mock(prompt_tokens=40, completion_tokens=10, total_tokens=50)
+        client.client = Mock()
+        client.client.chat.completions.create = AsyncMock(return_value=mock_response)
+
+        prompt_tokens = UPSTREAM_TOKENS.labels("deepseek", client.model, "prompt")
+        completion_tokens = UPSTREAM_TOKENS.labels("deepseek", client.model, "completion")
+        duration = UPSTREAM_DURATION.labels("deepseek", client.model, "success")
+        before = (prompt_tokens.value, completion_tokens.value, duration.count)
+
+        client.translate_sync("你好", "zh_to_en")
+
+        assert prompt_tokens.value - before[0] == 40
+        assert completion_tokens.value - before[1] == 10
+        assert duration.count - before[2] == 1
+
+    def test_parse_fallback_counted(self, env_vars):
+        """测试无法解析的回复计入备用方案次数"""
+        client = DeepSeekClient()
+        fallbacks = PARSE_FALLBACKS.labels("deepseek", "translation")
+        before = fallbacks.value
+
+        client._parse_response("无法解析的回复", "zh_to_en", "你好")
+        assert fallbacks.value - before == 1
+
+
+class TestMetricsAPI:
+    """测试 /metrics 接口"""
+
+    def test_metrics_endpoint(self, test_client, register_client):
+        """测试翻译请求计入请求计数和耗时直方图"""
+        from src.xp_translator.api import translation_cache
+
+        register_client("deepseek", MockAIClient())
+        translation_cache.clear()
+        test_client.post("/translate", json={"text": "指标测试", "provider": "deepseek"})
+        test_client.post("/translate", json={"text": "指标测试", "provider": "deepseek"})
+
+        response = test_client.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        text = response.text
+        labels = 'endpoint="translate",provider="deepseek",model="mock",direction="zh_to_en"'
+        assert f'xp_translation_requests_total{{{labels},outcome="success"}}' in text
+        assert f'xp_translation_requests_total{{{labels},outcome="cache_hit"}}' in text
+        assert "xp_translation_request_duration_seconds_bucket" in text
+        assert 'xp_translation_requests_in_flight{endpoint="translate"} 0' in text
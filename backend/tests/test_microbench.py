@@ -0,0 +1,60 @@
+"""
+测试微基准与回退检查
+
+包含对基线比较、基线保存、缺少基线和回退时返回失败的测试
+"""
+
+import json
+
+from benchmarks.micro import DEFAULT_BASELINE, compare, run_benchmarks, run_regression_gate
+
+
+class TestCompare:
+    """测试与基线比较"""
+
+    def test_regression_detected(self):
+        """测试超过阈值的变慢被标记为回退"""
+        rows = compare({"a": 130.0, "b": 110.0}, {"a": 100.0, "b": 100.0}, threshold=0.25)
+        assert [row["regressed"] for row in rows] == [True, False]
+        assert rows[0]["ratio"] == 1.3
+
+    def test_new_benchmark_not_regressed(self):
+        """测试基线中没有的基准不算回退"""
+        rows = compare({"new": 50.0}, {}, threshold=0.25)
+        assert rows[0]["ratio"] is None
+        assert not rows[0]["regressed"]
+
+
+class TestRegressionGate:
+    """测试回退检查流程"""
+
+    def test_run_benchmarks(self):
+        """测试所有热点函数都有结果"""
+        results = run_benchmarks(repeat=1, scale=0.01)
+        for name in ("prompt_build_zh_to_en", "parse_response_large", "parse_response_malformed",
+                     "mock_translate", "request_validate", "response_serialize"):
+            assert results[name] > 0
+
+    def test_missing_baseline_fails(self, tmp_path):
+        """测试没有基线时返回失败且不写入基线，指定 update_baseline 才保存"""
+        baseline = tmp_path / "baseline.json"
+        assert run_regression_gate(baseline, repeat=1, scale=0.01) == 1
+        assert not baseline.exists()
+        assert run_regression_gate(baseline, update_baseline=True, repeat=1, scale=0.01) == 0
+        assert "memory_lookup_10k_fuzzy" in json.loads(baseline.read_text())["results"]
+        assert run_regression_gate(baseline, threshold=100, repeat=1, scale=0.01) == 0
+
+    def test_default_baseline_tracked(self):
+        """测试默认基线不在被 .gitignore 忽略的 benchmarks/results/ 下，并且覆盖所有基准"""
+        assert "results" not in DEFAULT_BASELINE.parts
+        names = set(json.loads(DEFAULT_BASELINE.read_text())["results"])
+        assert names == set(run_benchmarks(repeat=1, scale=0.01))
+
+    def test_fails_on_regression(self, tmp_path):
+        """测试比基线慢超过阈值时返回失败"""
+        baseline = tmp_path / "baseline.json"
+        run_regression_gate(baseline, update_baseline=True, repeat=1, scale=0.01)
+        data = json.loads(baseline.read_text())
+        data["results"] = {name: 0.001 for name in data["results"]}
+        baseline.write_text(json.dumps(data))
+        assert run_regression_gate(baseline, repeat=1, scale=0.01) == 1
@@ -0,0 +1,140 @@
+"""
+测试 JSON 输出模式
+
+包含对 JSON 前缀、JSON 回复校验（多行译文、关键词截断、格式错误）、客户端的
+response_format 参数、解析失败不生成占位结果以及两种格式解析次数统计的测试
+"""
+
+import json
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, Mock
+
+from src.xp_translator.prompts import (
+    FallbackReply, JSON_PREFIX_MESSAGES, PREFIX_MESSAGES, build_messages, build_translation_prompt, parse_json_reply
+)
+from src.xp_translator.clients import DeepSeekClient, ReplyFormatError, create_ai_client
+from src.xp_translator.metrics import REPLY_PARSES
+
+
+class TestJsonPrompt:
+    """测试 JSON 模式的提示词"""
+
+    def test_json_prefix(self):
+        """测试 JSON 模式使用另一套固定前缀，且提示词中提到 JSON（response_format 的要求）"""
+        messages = build_messages(build_translation_prompt("你好", "zh_to_en"), "json")
+        assert messages[:-1] == list(JSON_PREFIX_MESSAGES)
+        assert "JSON" in messages[0]["content"]
+        assert build_messages("x")[:-1] == list(PREFIX_MESSAGES)
+
+    def test_few_shot_examples_are_valid(self):
+        """测试少样本示例中的回复本身能通过校验"""
+        replies = [m["content"] for m in JSON_PREFIX_MESSAGES if m["role"] == "assistant"]
+        assert all(parse_json_reply(reply).keywords for reply in replies)
+
+
+class TestParseJsonReply:
+    """测试 JSON 回复校验"""
+
+    def test_multiline_translation_preserved(self):
+        """测试多行译文保留换行"""
+        content = json.dumps({"translation": "第一行\n第二行", "keywords": ["一", "二"]}, ensure_ascii=False)
+        reply = parse_json_reply(content)
+        assert reply.translation == "第一行\n第二行"
+        assert reply.keywords == ["一", "二"]
+
+    def test_keywords_trimmed(self):
+        """测试关键词去除空白和空项，最多保留 3 个"""
+        reply = parse_json_reply('{"translation": "Hi", "keywords": [" a ", "", "b", "c", "d"]}')
+        assert reply.keywords == ["a", "b", "c"]
+
+    @pytest.mark.parametrize("content", [
+        "翻译：Hello\n关键词：[a]",
+        '{"translation": "Hello"}',
+        '{"translation": "  ", "keywords": []}',
+        '{"translation": "Hello", "keywords": ["a"',
+    ])
+    def test_invalid_reply_raises(self, content):
+        """测试非 JSON、缺少字段、译文为空或被截断的回复抛出 ValueError"""
+        with pytest.raises(ValueError):
+            parse_json_reply(content)
+
+
+class TestJsonClient:
+    """测试 JSON 模式的客户端"""
+
+    def _client(self, content, output_format="json"):
+        client = DeepSeekClient()
+        client.output_format = output_format
+        response = Mock()
+        response.choices = [Mock(message=Mock(content=content), finish_reason="stop")]
+        response.usage = None
+        client.client = Mock()
+        client.client.chat.completions.create = AsyncMock(return_value=response)
+        return client
+
+    def test_requests_json_object(self, env_vars):
+        """测试调用带 response_format=json_object，并使用 JSON 前缀"""
+        client = self._client('{"translation": "Hello\\nWorld", "keywords": ["hello", "world"]}')
+        result = asyncio.run(client.translate_and_extract("你好\n世界", "zh_to_en"))
+        assert result == ("Hello\nWorld", ["hello", "world"])
+        kwargs = client.client.chat.completions.create.call_args.kwargs
+        assert kwargs["response_format"] == {"type": "json_object"}
+        assert kwargs["messages"][0] == JSON_PREFIX_MESSAGES[0]
+
+    def test_text_mode_unchanged(self, env_vars):
+        """测试 text 模式不传 response_format"""
+        client = self._client("翻译：Hello\n关键词：[hello]", output_format="text")
+        assert asyncio.run(client.translate_and_extract("你好", "zh_to_en"))[0] == "Hello"
+        assert "response_format" not in client.client.chat.completions.create.call_args.kwargs
+
+    def test_invalid_reply_is_error(self, env_vars):
+        """测试 JSON 回复不合格时调用失败并计入解析失败，而不是返回占位译文"""
+        failures = REPLY_PARSES.labels("deepseek", "json", "failure")
+        before = failures.value
+        client = self._client("翻译：Hello\n关键词：[hello]")
+        with pytest.raises(Exception, match="JSON"):
+            asyncio.run(client.translate_and_extract("你好", "zh_to_en"))
+        assert failures.value - before == 1
+        with pytest.raises(ReplyFormatError):
+            client._parse_json_response("{}")
+
+    def test_parse_outcomes_by_format(self, env_vars):
+        """测试两种格式的解析成功与失败分别计数"""
+        text_failures = REPLY_PARSES.labels("deepseek", "text", "failure")
+        json_successes = REPLY_PARSES.labels("deepseek", "json", "success")
+        before = (text_failures.value, json_successes.value)
+        client = self._client('{"translation": "Hi", "keywords": []}')
+        asyncio.run(client.translate_and_extract("你好", "zh_to_en"))
+        client._parse_response("无法解析的回复", "zh_to_en", "你好")
+        assert (text_failures.value - before[0], json_successes.value - before[1]) == (1, 1)
+
+    def test_text_parse_counted_once(self, env_vars):
+        """测试行格式每次解析恰好计一次：有译文即成功，没有译文即失败，与关键词无关"""
+        client = DeepSeekClient()
+        success = REPLY_PARSES.labels("deepseek", "text", "success")
+        failure = REPLY_PARSES.labels("deepseek", "text", "failure")
+        cases = [("翻译：Hi", (1, 0)), ("关键词：[hi]", (0, 1)), ("翻译：Hi\n关键词：[hi]", (1, 0))]
+        for content, expected in cases:
+            before = (success.value, failure.value)
+            client._parse_response(content, "zh_to_en", "你好")
+            assert (success.value - before[0], failure.value - before[1]) == expected
+
+    def test_text_fallback_marked(self, env_vars):
+        """测试行格式用了占位译文或默认关键词时返回 FallbackReply，完整回复返回普通元组"""
+        client = DeepSeekClient()
+        assert isinstance(client._parse_response("无法解析的回复", "zh_to_en", "你好"), FallbackReply)
+        assert isinstance(client._parse_response("翻译：Hi", "zh_to_en", "你好"), FallbackReply)
+        assert not isinstance(client._parse_response("翻译：Hi\n关键词：[hi]", "zh_to_en", "你好"), FallbackReply)
+
+    def test_invalid_output_format(self, env_vars, monkeypatch):
+        """测试无效的 OUTPUT_FORMAT 在创建客户端时报错"""
+        monkeypatch.setenv("OUTPUT_FORMAT", "xml")
+        with pytest.raises(ValueError, match="OUTPUT_FORMAT"):
+            DeepSeekClient()
+
+    def test_invalid_output_format_not_degraded(self, env_vars, monkeypatch):
+        """测试无效的 OUTPUT_FORMAT 直接报错，不会逐个提供商降级为模拟客户端"""
+        monkeypatch.setenv("OUTPUT_FORMAT", "jsno")
+        with pytest.raises(ValueError, match="OUTPUT_FORMAT"):
+            create_ai_client("deepseek")
@@ -0,0 +1,95 @@
+"""
+测试共用提示词模块
+
+包含对固定前缀的字节稳定性、两个提供商共用提示词、回复解析以及缓存命中 token 统计的测试
+"""
+
+import json
+import asyncio
+from unittest.mock import AsyncMock, Mock
+
+from src.xp_translator.prompts import (
+    PREFIX_MESSAGES, build_messages, build_translation_prompt, build_batch_prompt, parse_reply, resolve_direction
+)
+from src.xp_translator.clients import DeepSeekClient, AliyunQwenClient
+from src.xp_translator.metrics import UPSTREAM_TOKENS
+
+
+def prefix_bytes(messages):
+    """序列化除最后一条用户消息外的前缀"""
+    return json.dumps(messages[:-1], ensure_ascii=False, sort_keys=True).encode()
+
+
+class TestPromptLayout:
+    """测试提示词布局"""
+
+    def test_prefix_byte_stable(self):
+        """测试不同原文、方向和批量调用的前缀逐字节相同"""
+        prompts = [
+            build_translation_prompt("你好", "zh_to_en"),
+            build_translation_prompt("Hello", "en_to_zh"),
+            build_translation_prompt("自动检测", "auto"),
+            build_batch_prompt(["一", "二"], "zh_to_en"),
+        ]
+        prefixes = {prefix_bytes(build_messages(prompt)) for prompt in prompts}
+        assert len(prefixes) == 1
+
+    def test_only_last_message_varies(self):
+        """测试原文只出现在最后一条用户消息中"""
+        messages = build_messages(build_translation_prompt("独一无二的原文", "zh_to_en"))
+        assert messages[:-1] == list(PREFIX_MESSAGES)
+        assert messages[-1] == {"role": "user", "content": "方向：中文→英文\n原文：独一无二的原文"}
+        assert all("独一无二" not in m["content"] for m in messages[:-1])
+
+    def test_auto_direction(self):
+        """测试 auto 方向按是否包含中文解析"""
+        assert resolve_direction("你好", "auto") == "zh_to_en"
+        assert resolve_direction("Hello", "auto") == "en_to_zh"
+        assert build_translation_prompt("Hello", "auto").startswith("方向：英文→中文")
+
+    def test_providers_share_prompts(self, env_vars):
+        """测试两个提供商构建的消息完全相同"""
+        deepseek, aliyun = DeepSeekClient(), AliyunQwenClient()
+        prompt = deepseek._build_translation_prompt("你好", "zh_to_en")
+        assert prompt == aliyun._build_translation_prompt("你好", "zh_to_en")
+        assert deepseek._build_messages(prompt) == aliyun._build_messages(prompt)
+
+    def test_parse_reply(self):
+        """测试解析回复，缺失的部分返回空值"""
+        assert parse_reply("翻译：Hello\n关键词：[a, b, c]") == ("Hello", ["a", "b", "c"])
+        assert parse_reply("no format") == ("", [])
+
+    def test_parse_multiline_reply(self):
+        """测试多行译文保留换行"""
+        assert parse_reply("翻译：第一行\n第二行\n关键词：[a, b]") == ("第一行\n第二行", ["a", "b"])
+
+
+class TestCachedTokens:
+    """测试上下文缓存命中的 token 统计"""
+
+    def _client_with_usage(self, usage):
+        client = DeepSeekClient()
+        response = Mock()
+        response.choices = [Mock(message=Mock(content="翻译：Hi\n关键词：[hi]"))]
+        response.usage = usage
+        client.client = Mock()
+        client.client.chat.completions.create = AsyncMock(return_value=response)
+        return client
+
+    def test_qwen_style_cached_tokens(self, env_vars):
+        """测试读取 prompt_tokens_details.cached_tokens"""
+        cached = UPSTREAM_TOKENS.labels("deepseek", "deepseek-chat", "cached")
+        before = cached.value
+        usage = Mock(prompt_tokens=300, completion_tokens=10, total_tokens=310,
+                     prompt_tokens_details=Mock(cached_tokens=256))
+        asyncio.run(self._client_with_usage(usage).translate_and_extract("你好", "zh_to_en"))
+        assert cached.value - before == 256
+
+    def test_deepseek_style_cached_tokens(self, env_vars):
+        """测试读取 DeepSeek 的 prompt_cache_hit_tokens"""
+        cached = UPSTREAM_TOKENS.labels("deepseek", "deepseek-chat", "cached")
+        before = cached.value
+        usage = Mock(prompt_tokens=300, completion_tokens=10, total_tokens=310,
+                     prompt_tokens_details=None, prompt_cache_hit_tokens=192)
+        asyncio.run(self._client_with_usage(usage).translate_and_extract("你好", "zh_to_en"))
+        assert cached.value - before == 192
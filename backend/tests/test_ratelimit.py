@@ -0,0 +1,205 @@
+"""
+测试上游配额限速
+
+包含对时长解析、令牌桶排速、限速响应头校准以及客户端接入的测试
+"""
+
+import asyncio
+import httpx
+import pytest
+from unittest.mock import AsyncMock, Mock, patch
+
+from src.xp_translator.ratelimit import parse_duration, TokenBucket, ProviderRateLimiter
+from src.xp_translator.clients import DeepSeekClient
+
+
+class FakeClock:
+    """可手动推进的 time.monotonic 替身"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    fake = FakeClock()
+    with patch("src.xp_translator.ratelimit.time.monotonic", fake):
+        yield fake
+
+
+class TestParseDuration:
+    """测试限速响应头时长解析"""
+
+    @pytest.mark.parametrize("value,expected", [
+        ("2", 2.0),
+        ("0.5", 0.5),
+        ("20ms", 0.02),
+        ("1s", 1.0),
+        ("6m0s", 360.0),
+        ("1h2m3s", 3723.0),
+        ("", None),
+        (None, None),
+        ("soon", None),
+    ])
+    def test_parse(self, value, expected):
+        """测试各种时长格式"""
+        assert parse_duration(value) == (pytest.approx(expected) if expected is not None else None)
+
+
+class TestTokenBucket:
+    """测试令牌桶"""
+
+    def test_paces_after_capacity(self, clock):
+        """测试配额用完后按补充速率返回等待时间"""
+        bucket = TokenBucket(60)
+        for _ in range(60):
+            assert bucket.reserve(1) == 0
+        assert bucket.reserve(1) == pytest.approx(1.0)
+        assert bucket.reserve(1) == pytest.approx(2.0)
+
+    def test_refills_over_time(self, clock):
+        """测试令牌随时间补充且不超过容量"""
+        bucket = TokenBucket(60)
+        bucket.reserve(60)
+        clock.now += 30
+        assert bucket.available() == pytest.approx(30)
+        clock.now += 600
+        assert bucket.available() == pytest.approx(60)
+
+    def test_oversized_request_clamped(self, clock):
+        """测试超过容量的单次预约按满桶计"""
+        bucket = TokenBucket(100)
+        assert bucket.reserve(1000) == 0
+        assert bucket.reserve(100) == pytest.approx(60)
+
+    def test_sync_remaining_only_lowers(self, clock):
+        """测试上游剩余额度只向下校准"""
+        bucket = TokenBucket(100)
+        bucket.sync_remaining(10)
+        assert bucket.available() == 10
+        bucket.sync_remaining(50)
+        assert bucket.available() == 10
+
+
+class TestProviderRateLimiter:
+    """测试提供商排速器"""
+
+    def test_unlimited_by_default(self, clock):
+        """测试未配置配额时不排速"""
+        limiter = ProviderRateLimiter("deepseek")
+        assert limiter.reserve(10000) == 0
+
+    def test_from_env(self):
+        """测试从环境变量读取配额"""
+        with patch.dict("os.environ", {"DEEPSEEK_RPM": "120", "DEEPSEEK_TPM": "60000"}):
+            limiter = ProviderRateLimiter.from_env("deepseek")
+        assert limiter.requests.capacity == 120
+        assert limiter.tokens.capacity == 60000
+
+    def test_waits_for_slowest_bucket(self, clock):
+        """测试等待时间取 RPM 和 TPM 中较长的一个"""
+        limiter = ProviderRateLimiter("deepseek", rpm=60, tpm=600)
+        assert limiter.reserve(600) == 0
+        assert limiter.reserve(300) == pytest.approx(30)
+
+    def test_acquire_sleeps_instead_of_failing(self, clock):
+        """测试配额不足时调用方被延后而不是报错"""
+        limiter = ProviderRateLimiter("deepseek", rpm=60)
+        limiter.reserve(0)
+        limiter.requests.tokens = 0
+
+        with patch("src.xp_translator.ratelimit.asyncio.sleep", new=AsyncMock()) as sleep:
+            asyncio.run(limiter.acquire(0))
+        sleep.assert_awaited_once()
+        assert sleep.await_args.args[0] == pytest.approx(1.0)
+        assert limiter.paced == 1
+
+    def test_settle_refunds_unused_tokens(self, clock):
+        """测试按实际用量归还预约的 token"""
+        limiter = ProviderRateLimiter("deepseek", tpm=1000)
+        limiter.reserve(600)
+        limiter.settle(600, 100)
+        assert limiter.tokens.available() == pytest.approx(900)
+
+    def test_observe_learns_limits(self, clock):
+        """测试未配置时从响应头学习配额"""
+        limiter = ProviderRateLimiter("deepseek")
+        limiter.observe({
+            "x-ratelimit-limit-requests": "60",
+            "x-ratelimit-remaining-requests": "5",
+            "x-ratelimit-limit-tokens": "1000",
+            "x-ratelimit-remaining-tokens": "800",
+        })
+        assert limiter.requests.capacity == 60
+        assert limiter.requests.available() == 5
+        assert limiter.tokens.available() == 800
+
+    def test_observe_pauses_until_reset(self, clock):
+        """测试剩余额度为 0 时暂停到重置时间"""
+        limiter = ProviderRateLimiter("deepseek")
+        limiter.observe({
+            "x-ratelimit-limit-requests": "60",
+            "x-ratelimit-remaining-requests": "0",
+            "x-ratelimit-reset-requests": "1.5s",
+        })
+        assert limiter.reserve(1) >= 1.5
+
+    def test_observe_retry_after(self, clock):
+        """测试 Retry-After 和不带等待时间的 429 都会暂停调用"""
+        limiter = ProviderRateLimiter("aliyun")
+        limiter.observe({"retry-after": "3"}, status_code=429)
+        assert limiter.reserve(1) == pytest.approx(3)
+
+        clock.now += 10
+        limiter.observe({}, status_code=429)
+        assert limiter.reserve(1) == pytest.approx(1)
+
+
+class TestClientRateLimit:
+    """测试客户端接入配额限速"""
+
+    def test_response_hook_updates_limiter(self, env_vars):
+        """测试上游响应头通过 httpx 钩子校准排速器"""
+        client = DeepSeekClient()
+        assert client._observe_response in client.client._client.event_hooks["response"]
+
+        response = httpx.Response(429, headers={"retry-after": "2"})
+        asyncio.run(client._observe_response(response))
+        assert client.rate_limiter.stats()["paused_for"] > 1
+
+    def test_completion_reserves_and_settles(self, env_vars):
+        """测试调用前预约 TPM 配额，完成后按实际用量修正"""
+        with patch.dict("os.environ", {"DEEPSEEK_TPM": "10000"}):
+            client = DeepSeekClient()
+        mock_response = Mock()
+        mock_response.choices = [Mock(message=Mock(content="翻译：Hello\n关键词：[hello]"))]
+        mock_response.usage = Mock(total_tokens=50)
+        client.client = Mock()
+        client.client.chat.completions.create = AsyncMock(return_value=mock_response)
+
+        client.translate_sync("你好", "zh_to_en")
+        assert client.rate_limiter.tokens.available() == pytest.approx(9950, abs=1)
+
+    def test_failed_stream_refunds_reservation(self, env_vars):
+        """测试流式调用在第一个数据块之前失败时归还预约的 TPM 配额"""
+        with patch.dict("os.environ", {"DEEPSEEK_TPM": "10000"}):
+            client = DeepSeekClient()
+
+        async def broken_stream():
+            raise ValueError("connection reset")
+            yield
+
+        async def consume():
+            async for _ in client.stream_translate("你好", "zh_to_en"):
+                pass
+
+        client.client = Mock()
+        # 建立连接失败，以及连接建立后读取第一个数据块失败
+        for create in (AsyncMock(side_effect=ValueError("bad request")), AsyncMock(return_value=broken_stream())):
+            client.client.chat.completions.create = create
+            with pytest.raises(Exception, match="流式调用失败"):
+                asyncio.run(consume())
+            assert client.rate_limiter.tokens.available() == pytest.approx(10000, abs=1)
@@ -0,0 +1,330 @@
+"""
+测试重试与截止时间
+
+包含对错误分类、完全抖动退避、重试次数上限、截止时间收缩每次尝试的超时、
+客户端关闭 SDK 重试后自行重试、路由不因截止时间熔断以及 504 响应的测试
+"""
+
+import asyncio
+import random
+import httpx
+import openai
+import pytest
+from unittest.mock import AsyncMock, Mock
+
+from src.xp_translator.retry import (
+    DeadlineExceeded, RetryPolicy, classify, deadline_scope, no_deadline, remaining, within_deadline
+)
+from src.xp_translator.clients import DeepSeekClient, MockAIClient
+from src.xp_translator.metrics import UPSTREAM_RETRIES
+from src.xp_translator.routing import CircuitBreaker, ProviderRouter
+
+REQUEST = httpx.Request("POST", "http://upstream/v1/chat/completions")
+
+
+def status_error(status: int) -> openai.APIStatusError:
+    return openai.APIStatusError("upstream error", response=httpx.Response(status, request=REQUEST), body=None)
+
+
+def no_wait_policy(max_retries: int = 2) -> RetryPolicy:
+    return RetryPolicy(max_retries=max_retries, base_delay=0.0, max_delay=0.0)
+
+
+class TestClassify:
+    """测试错误分类"""
+
+    def test_retryable(self):
+        """测试 5xx、429、408、连接错误和超时可重试"""
+        assert classify(status_error(500)) == "server_error"
+        assert classify(status_error(503)) == "server_error"
+        assert classify(status_error(429)) == "rate_limited"
+        assert classify(status_error(408)) == "timeout"
+        assert classify(openai.APIConnectionError(request=REQUEST)) == "connection"
+        assert classify(openai.APITimeoutError(request=REQUEST)) == "timeout"
+        assert classify(httpx.ReadError("reset")) == "connection"
+        assert classify(TimeoutError()) == "timeout"
+
+    def test_fatal(self):
+        """测试参数错误、鉴权失败和其他异常不重试"""
+        assert classify(status_error(400)) is None
+        assert classify(status_error(401)) is None
+        assert classify(ValueError("bad reply")) is None
+
+
+class TestRetryPolicy:
+    """测试重试策略"""
+
+    def test_full_jitter_backoff(self):
+        """测试退避时间在 [0, min(max_delay, base × 2ⁿ)] 内均匀分布"""
+        policy = RetryPolicy(base_delay=0.1, max_delay=1.0, rng=random.Random(1))
+        for retry, cap in [(0, 0.1), (2, 0.4), (10, 1.0)]:
+            delays = [policy.backoff(retry) for _ in range(200)]
+            assert 0 <= min(delays) and max(delays) <= cap
+            assert max(delays) > cap * 0.8
+
+    def test_retries_until_success(self):
+        """测试可重试的错误重试后成功，并报告重试原因"""
+        errors = [status_error(502), openai.APIConnectionError(request=REQUEST)]
+        reasons = []
+
+        async def attempt(timeout):
+            if errors:
+                raise errors.pop(0)
+            return "ok"
+
+        policy = no_wait_policy()
+        assert asyncio.run(policy.run(attempt, reasons.append)) == "ok"
+        assert reasons == ["server_error", "connection"]
+        assert policy.stats()["retries"] == 2
+
+    def test_fatal_not_retried(self):
+        """测试不可重试的错误立即抛出"""
+        attempt = AsyncMock(side_effect=status_error(400))
+        with pytest.raises(openai.APIStatusError):
+            asyncio.run(no_wait_policy().run(attempt))
+        assert attempt.await_count == 1
+
+    def test_gives_up_after_max_retries(self):
+        """测试重试次数用完后抛出最后一次的错误"""
+        attempt = AsyncMock(side_effect=status_error(500))
+        with pytest.raises(openai.APIStatusError):
+            asyncio.run(no_wait_policy(max_retries=2).run(attempt))
+        assert attempt.await_count == 3
+
+    def test_attempt_timeout_retried(self):
+        """测试单次尝试超时后重试，用完次数后抛出 TimeoutError"""
+        timeouts = []
+
+        async def attempt(timeout):
+            timeouts.append(timeout)
+            await asyncio.sleep(1)
+
+        policy = RetryPolicy(max_retries=1, base_delay=0.0, attempt_timeout=0.02)
+        with pytest.raises(TimeoutError, match="0.02 秒未完成"):
+            asyncio.run(policy.run(attempt))
+        assert timeouts == [0.02, 0.02]
+
+
+class TestDeadline:
+    """测试截止时间"""
+
+    def test_attempt_timeout_shrinks_to_deadline(self):
+        """测试每次尝试的超时不超过剩余时间，截止时间到达后不再重试"""
+        timeouts = []
+
+        async def attempt(timeout):
+            timeouts.append(timeout)
+            await asyncio.sleep(1)
+
+        async def run():
+            with deadline_scope(0.05):
+                await RetryPolicy(attempt_timeout=30).run(attempt)
+
+        with pytest.raises(DeadlineExceeded):
+            asyncio.run(run())
+        assert len(timeouts) == 1 and timeouts[0] <= 0.05
+
+    def test_no_retry_when_backoff_exceeds_deadline(self):
+        """测试剩余时间不够退避时直接返回错误"""
+        attempt = AsyncMock(side_effect=status_error(503))
+
+        async def run():
+            with deadline_scope(0.5):
+                await RetryPolicy(base_delay=10, max_delay=10, rng=Mock(uniform=lambda a, b: b)).run(attempt)
+
+        with pytest.raises(openai.APIStatusError):
+            asyncio.run(run())
+        assert attempt.await_count == 1
+
+    def test_expired_deadline_skips_call(self):
+        """测试截止时间已到时不再发起调用"""
+        attempt = AsyncMock(return_value="ok")
+
+        async def run():
+            with deadline_scope(0.0):
+                await RetryPolicy().run(attempt)
+
+        with pytest.raises(DeadlineExceeded):
+            asyncio.run(run())
+        attempt.assert_not_awaited()
+
+    def test_nested_scope_keeps_earlier_deadline(self):
+        """测试内层不能延长外层的截止时间"""
+        with deadline_scope(1.0):
+            with deadline_scope(100.0):
+                assert remaining() <= 1.0
+        assert remaining() is None
+
+    def test_within_deadline(self):
+        """测试截止时间到达时取消等待并抛出 DeadlineExceeded"""
+        async def run():
+            with deadline_scope(0.02):
+                await within_deadline(asyncio.sleep(1))
+
+        with pytest.raises(DeadlineExceeded):
+            asyncio.run(run())
+
+
+    def test_no_deadline_clears_scope(self):
+        """测试 no_deadline 块内没有截止时间，离开后恢复外层的截止时间"""
+        with deadline_scope(1.0):
+            with no_deadline():
+                assert remaining() is None
+            assert remaining() is not None
+
+    def test_inner_timeout_not_deadline(self):
+        """测试被等待的调用自己抛出的 TimeoutError 原样传递，不被当成截止时间到达"""
+        async def fails():
+            raise TimeoutError("inner")
+
+        async def run():
+            with deadline_scope(10):
+                await within_deadline(fails())
+
+        with pytest.raises(TimeoutError, match="inner"):
+            asyncio.run(run())
+
+    def test_timed_out_attempt_cleaned_up_before_retry(self):
+        """测试超时的尝试在下一次尝试开始之前已经完成清理"""
+        events = []
+
+        async def attempt(timeout):
+            events.append("start")
+            try:
+                await asyncio.sleep(1)
+            finally:
+                events.append("cleanup")
+
+        policy = RetryPolicy(max_retries=1, base_delay=0.0, attempt_timeout=0.02)
+        with pytest.raises(TimeoutError):
+            asyncio.run(policy.run(attempt))
+        assert events == ["start", "cleanup", "start", "cleanup"]
+
+
+class TestClientRetries:
+    """测试客户端的重试"""
+
+    def _client(self, *outcomes):
+        client = DeepSeekClient()
+        client.retry_policy = no_wait_policy()
+        response = Mock()
+        response.choices = [Mock(message=Mock(content="翻译：Hello\n关键词：[hello]"), finish_reason="stop")]
+        response.usage = None
+        client.client = Mock()
+        client.client.chat.completions.create = AsyncMock(
+            side_effect=[response if outcome is None else outcome for outcome in outcomes]
+        )
+        return client
+
+    def test_sdk_retries_disabled(self, env_vars):
+        """测试 SDK 自带的重试被关闭，避免与客户端的重试次数相乘"""
+        assert DeepSeekClient().client.max_retries == 0
+
+    def test_transient_error_retried(self, env_vars):
+        """测试上游 5xx 重试后成功，每次尝试都带超时并计入重试指标"""
+        retries = UPSTREAM_RETRIES.labels("deepseek", "server_error")
+        before = retries.value
+        client = self._client(status_error(502), None)
+        assert asyncio.run(client.translate_and_extract("你好", "zh_to_en"))[0] == "Hello"
+        create = client.client.chat.completions.create
+        assert create.await_count == 2
+        assert create.call_args.kwargs["timeout"] == client.retry_policy.attempt_timeout
+        assert retries.value - before == 1
+
+    def test_deadline_not_wrapped(self, env_vars):
+        """测试截止时间错误保持原类型，不被包装成普通的调用失败"""
+        client = self._client(None)
+
+        async def run():
+            with deadline_scope(0.0):
+                await client.translate_and_extract("你好", "zh_to_en")
+
+        with pytest.raises(DeadlineExceeded):
+            asyncio.run(run())
+
+
+class TestDeadlineRouting:
+    """测试截止时间与路由"""
+
+    def test_deadline_does_not_trip_breaker(self):
+        """测试截止时间到达不计入熔断统计，也不切换到备用提供商"""
+        router = ProviderRouter(Mock(), breaker_factory=lambda name: CircuitBreaker(name, min_calls=1))
+        backup = AsyncMock(return_value="backup")
+
+        async def primary(client):
+            raise DeadlineExceeded("请求已超过截止时间")
+
+        async def fn(client):
+            return await (primary(client) if client == "primary" else backup(client))
+
+        with pytest.raises(DeadlineExceeded):
+            asyncio.run(router.call_with_failover([("deepseek", "primary"), ("aliyun", "backup")], fn))
+        assert router.breaker("deepseek").snapshot()["calls"] == 0
+        backup.assert_not_awaited()
+
+
+class TestRequestTimeoutHeader:
+    """测试 X-Request-Timeout 请求头"""
+
+    @pytest.fixture
+    def slow_client(self, register_client):
+        from src.xp_translator.api import translation_cache
+        client = MockAIClient()
+
+        async def slow(text, direction="zh_to_en"):
+            await asyncio.sleep(1)
+            return "slow", ["k"]
+
+        client.translate_and_extract = slow
+        register_client("deepseek", client)
+        translation_cache.clear()
+        return client
+
+    def test_deadline_returns_504(self, test_client, slow_client):
+        """测试超过请求头给出的截止时间返回 504"""
+        response = test_client.post(
+            "/translate", json={"text": "你好", "direction": "zh_to_en"}, headers={"X-Request-Timeout": "0.05"}
+        )
+        assert response.status_code == 504
+        assert "超时" in response.json()["detail"]
+
+    @pytest.mark.parametrize("value", ["abc", "0", "-1", "nan", "inf"])
+    def test_invalid_header(self, test_client, slow_client, value):
+        """测试无效的 X-Request-Timeout 返回 400"""
+        response = test_client.post("/translate", json={"text": "你好"}, headers={"X-Request-Timeout": value})
+        assert response.status_code == 400
+
+    def test_coalesced_requests_keep_own_deadlines(self, register_client):
+        """测试合并的并发请求各自遵守自己的截止时间，不受首个请求的截止时间影响"""
+        from src.xp_translator.api import app, translation_cache
+        policy = no_wait_policy()
+        client = MockAIClient()
+
+        async def upstream(text, direction="zh_to_en"):
+            # 与真实客户端一样，每次尝试的超时按截止时间收缩
+            return await policy.run(lambda timeout: asyncio.sleep(0.2, result=("shared", ["k"])))
+
+        client.translate_and_extract = upstream
+        register_client("deepseek", client)
+        translation_cache.clear()
+
+        async def run():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+                body = {"text": "合并请求的截止时间", "direction": "zh_to_en"}
+                leader = asyncio.ensure_future(http.post("/translate", json=body, headers={"X-Request-Timeout": "0.05"}))
+                await asyncio.sleep(0.01)
+                follower = await http.post("/translate", json=body, headers={"X-Request-Timeout": "5"})
+                return await leader, follower
+
+        leader, follower = asyncio.run(run())
+        assert leader.status_code == 504
+        assert follower.status_code == 200
+        assert follower.json()["translation"] == "shared"
+
+    def test_batch_deadline(self, test_client, slow_client):
+        """测试批量请求同样遵守截止时间"""
+        response = test_client.post(
+            "/translate/batch", json={"items": [{"text": "一"}]}, headers={"X-Request-Timeout": "0.05"}
+        )
+        assert response.status_code == 504
@@ -0,0 +1,312 @@
+"""
+测试提供商路由
+
+包含对熔断器状态转换、健康路由选择、故障切换以及 API 503 响应的测试
+"""
+
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from src.xp_translator.clients import MockAIClient
+from src.xp_translator.routing import (
+    CircuitBreaker,
+    ProviderRouter,
+    CircuitOpenError,
+    NoHealthyProviderError,
+)
+
+
+class FakeClock:
+    """可手动推进的 time.monotonic 替身"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    fake = FakeClock()
+    with patch("src.xp_translator.routing.time.monotonic", fake):
+        yield fake
+
+
+def small_breaker(name="deepseek"):
+    return CircuitBreaker(name, window_seconds=60, min_calls=4, failure_rate_threshold=0.5, open_duration=10)
+
+
+class FakeRegistry:
+    """只包含指定客户端的注册表"""
+
+    def __init__(self, clients):
+        self.clients = clients
+
+    def get(self, provider=None):
+        return self.clients.get(provider) or self.clients["mock"]
+
+    def is_configured(self, provider):
+        return provider in self.clients
+
+
+class TestCircuitBreaker:
+    """测试熔断器状态转换"""
+
+    def test_stays_closed_below_min_calls(self, clock):
+        """测试调用数不足 min_calls 时不会打开"""
+        breaker = small_breaker()
+        for _ in range(3):
+            breaker.record_failure(0.1)
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    def test_opens_on_failure_rate(self, clock):
+        """测试错误率达到阈值时打开并拒绝调用"""
+        breaker = small_breaker()
+        breaker.record_success(0.1)
+        breaker.record_success(0.1)
+        breaker.record_failure(0.1)
+        breaker.record_failure(0.1)
+
+        assert breaker.state == CircuitBreaker.OPEN
+        assert not breaker.available()
+        assert not breaker.try_acquire()
+        assert breaker.retry_after() == pytest.approx(10)
+
+    def test_opens_on_slow_calls(self, clock):
+        """测试慢调用率达到阈值时打开"""
+        breaker = CircuitBreaker("deepseek", min_calls=2, slow_call_seconds=1.0, slow_call_rate_threshold=0.5)
+        breaker.record_success(2.0)
+        breaker.record_success(3.0)
+        assert breaker.state == CircuitBreaker.OPEN
+
+    def test_old_calls_leave_window(self, clock):
+        """测试窗口外的调用不计入错误率"""
+        breaker = small_breaker()
+        for _ in range(3):
+            breaker.record_failure(0.1)
+        clock.now += 61
+        breaker.record_failure(0.1)
+        assert breaker.state == CircuitBreaker.CLOSED
+        assert breaker.snapshot()["calls"] == 1
+
+    def test_half_open_probe_recovers(self, clock):
+        """测试打开时间结束后半开探测成功则关闭"""
+        breaker = small_breaker()
+        for _ in range(4):
+            breaker.record_failure(0.1)
+        clock.now += 10
+
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        assert breaker.try_acquire()
+        # 探测名额已用完，其余调用被拒绝
+        assert not breaker.try_acquire()
+        breaker.record_success(0.1)
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    def test_half_open_probe_failure_reopens(self, clock):
+        """测试半开探测失败时重新打开"""
+        breaker = small_breaker()
+        for _ in range(4):
+            breaker.record_failure(0.1)
+        clock.now += 10
+
+        assert breaker.try_acquire()
+        breaker.record_failure(0.1)
+        assert breaker.state == CircuitBreaker.OPEN
+        assert breaker.times_opened == 2
+
+    def test_release_returns_probe(self, clock):
+        """测试被取消的探测归还名额"""
+        breaker = small_breaker()
+        for _ in range(4):
+            breaker.record_failure(0.1)
+        clock.now += 10
+
+        assert breaker.try_acquire()
+        breaker.release()
+        assert breaker.try_acquire()
+
+
+class TestProviderRouter:
+    """测试路由选择与故障切换"""
+
+    def make_router(self, clients):
+        return ProviderRouter(FakeRegistry(clients), breaker_factory=small_breaker)
+
+    def test_requested_provider_first(self):
+        """测试请求的提供商排在最前，其余真实提供商作为备用"""
+        deepseek, aliyun = MockAIClient(), MockAIClient()
+        router = self.make_router({"deepseek": deepseek, "aliyun": aliyun, "mock": MockAIClient()})
+
+        assert router.route("aliyun") == [("aliyun", aliyun), ("deepseek", deepseek)]
+        assert router.route("deepseek") == [("deepseek", deepseek), ("aliyun", aliyun)]
+
+    def test_unconfigured_provider_skipped(self):
+        """测试未配置的提供商被跳过，全部未配置时使用模拟客户端"""
+        aliyun, mock = MockAIClient(), MockAIClient()
+        assert self.make_router({"aliyun": aliyun, "mock": mock}).route("deepseek") == [("aliyun", aliyun)]
+        assert self.make_router({"mock": mock}).route("deepseek") == [("mock", mock)]
+        assert self.make_router({"mock": mock}).route("mock") == [("mock", mock)]
+
+    def test_open_provider_skipped(self, clock):
+        """测试熔断打开的提供商不会出现在路由中"""
+        aliyun = MockAIClient()
+        router = self.make_router({"deepseek": MockAIClient(), "aliyun": aliyun, "mock": MockAIClient()})
+        for _ in range(4):
+            router.breaker("deepseek").record_failure(0.1)
+
+        assert router.route("deepseek") == [("aliyun", aliyun)]
+        assert router.select("deepseek") is aliyun
+
+    def test_all_open_raises(self, clock):
+        """测试所有提供商都熔断时抛出 NoHealthyProviderError"""
+        router = self.make_router({"deepseek": MockAIClient(), "aliyun": MockAIClient(), "mock": MockAIClient()})
+        for name in ("deepseek", "aliyun"):
+            for _ in range(4):
+                router.breaker(name).record_failure(0.1)
+        clock.now += 3
+
+        assert router.route("deepseek") == []
+        with pytest.raises(NoHealthyProviderError) as exc_info:
+            router.select("deepseek")
+        assert exc_info.value.retry_after == pytest.approx(7)
+
+    def test_failover_to_next_provider(self):
+        """测试主提供商失败时切换到下一个提供商并记录失败"""
+        deepseek, aliyun = MockAIClient(), MockAIClient()
+        router = self.make_router({"deepseek": deepseek, "aliyun": aliyun, "mock": MockAIClient()})
+
+        async def fn(client):
+            if client is deepseek:
+                raise Exception("upstream down")
+            return "ok"
+
+        result, name = asyncio.run(router.call_with_failover(router.route("deepseek"), fn))
+        assert (result, name) == ("ok", "aliyun")
+        assert router.failovers == 1
+        assert router.breaker("deepseek").snapshot()["failure_rate"] == 1.0
+
+    def test_all_failures_raise_last_error(self):
+        """测试所有提供商都失败时抛出最后一个错误"""
+        router = self.make_router({"deepseek": MockAIClient(), "aliyun": MockAIClient(), "mock": MockAIClient()})
+        fn = AsyncMock(side_effect=[Exception("first"), Exception("second")])
+
+        with pytest.raises(Exception, match="second"):
+            asyncio.run(router.call_with_failover(router.route("deepseek"), fn))
+
+    def test_call_rejected_when_open(self, clock):
+        """测试熔断打开时直接拒绝调用，不触达上游"""
+        router = self.make_router({"deepseek": MockAIClient(), "mock": MockAIClient()})
+        for _ in range(4):
+            router.breaker("deepseek").record_failure(0.1)
+        fn = AsyncMock(return_value="ok")
+
+        with pytest.raises(CircuitOpenError):
+            asyncio.run(router.call("deepseek", MockAIClient(), fn))
+        fn.assert_not_awaited()
+
+
+class TestRoutingAPI:
+    """测试 API 的路由行为"""
+
+    def test_failover_reports_answering_provider(self, test_client, register_client):
+        """测试故障切换后响应中的提供商为实际返回结果的提供商"""
+        from src.xp_translator.api import translation_cache
+
+        failing = MockAIClient()
+        failing.translate_and_extract = AsyncMock(side_effect=Exception("upstream down"))
+        register_client("deepseek", failing)
+        register_client("aliyun", MockAIClient())
+        translation_cache.clear()
+
+        response = test_client.post("/translate", json={"text": "路由切换测试", "provider": "deepseek"})
+
+        assert response.status_code == 200
+        assert response.json()["provider"] == "aliyun"
+
+    def test_failover_result_not_cached_as_requested_provider(self, test_client, register_client):
+        """测试备用提供商的结果写在它自己的缓存键下，之后请求原提供商不会命中并冒用其名义"""
+        from src.xp_translator.api import translation_cache
+        from src.xp_translator.metrics import REQUESTS_TOTAL
+
+        failing = MockAIClient()
+        failing.provider, failing.model = "deepseek", "deepseek-chat"
+        failing.translate_and_extract = AsyncMock(side_effect=Exception("upstream down"))
+        backup = MockAIClient()
+        backup.provider, backup.model = "aliyun", "qwen-plus"
+        register_client("deepseek", failing)
+        register_client("aliyun", backup)
+        translation_cache.clear()
+        counter = REQUESTS_TOTAL.labels("translate", "aliyun", "qwen-plus", "zh_to_en", "success")
+        before = counter.value
+
+        first = test_client.post("/translate", json={"text": "缓存归属测试", "provider": "deepseek"})
+        assert first.headers["X-Cache"] == "MISS"
+        assert first.json()["provider"] == "aliyun"
+        assert counter.value - before == 1
+
+        failing.translate_and_extract = AsyncMock(return_value=("from deepseek", ["k"]))
+        again = test_client.post("/translate", json={"text": "缓存归属测试", "provider": "deepseek"})
+        assert again.headers["X-Cache"] == "MISS"
+        assert again.json()["translation"] == "from deepseek"
+        assert again.json()["provider"] == "deepseek"
+
+        direct = test_client.post("/translate", json={"text": "缓存归属测试", "provider": "aliyun"})
+        assert direct.headers["X-Cache"] == "HIT"
+        assert direct.json()["provider"] == "aliyun"
+
+    def test_unconfigured_provider_reports_answering_provider(self, test_client, register_client, monkeypatch):
+        """测试请求的提供商未配置时，响应和指标中的提供商为实际返回结果的提供商"""
+        from src.xp_translator.api import translation_cache
+        from src.xp_translator.clients import client_registry
+        from src.xp_translator.metrics import REQUESTS_TOTAL
+
+        backup = MockAIClient()
+        backup.provider, backup.model = "aliyun", "qwen-plus"
+        register_client("aliyun", backup)
+        # 与缺少 DEEPSEEK_API_KEY 时相同：deepseek 降级为通义千问客户端，路由时被跳过
+        degraded = MockAIClient()
+        degraded.provider, degraded.model = "aliyun", "qwen-plus"
+        register_client("deepseek", degraded)
+        monkeypatch.setattr(client_registry, "is_configured", lambda provider: provider != "deepseek")
+        translation_cache.clear()
+        success = REQUESTS_TOTAL.labels("translate", "aliyun", "qwen-plus", "zh_to_en", "success")
+        cache_hit = REQUESTS_TOTAL.labels("translate", "aliyun", "qwen-plus", "zh_to_en", "cache_hit")
+        before = success.value, cache_hit.value
+
+        first = test_client.post("/translate", json={"text": "未配置提供商测试", "provider": "deepseek"})
+        again = test_client.post("/translate", json={"text": "未配置提供商测试", "provider": "deepseek"})
+
+        assert first.json()["provider"] == "aliyun"
+        assert again.headers["X-Cache"] == "HIT"
+        assert again.json()["provider"] == "aliyun"
+        assert (success.value - before[0], cache_hit.value - before[1]) == (1, 1)
+
+    def test_all_open_returns_503(self, test_client, register_client):
+        """测试所有提供商熔断时返回 503 和 Retry-After"""
+        from src.xp_translator.api import translation_cache, provider_router
+
+        register_client("deepseek", MockAIClient())
+        register_client("aliyun", MockAIClient())
+        translation_cache.clear()
+        for name in ("deepseek", "aliyun"):
+            breaker = provider_router.breaker(name)
+            for _ in range(breaker.min_calls):
+                breaker.record_failure(0.1)
+
+        response = test_client.post("/translate", json={"text": "熔断测试", "provider": "deepseek"})
+
+        assert response.status_code == 503
+        assert int(response.headers["Retry-After"]) >= 1
+
+    def test_health_reports_breakers(self, test_client, register_client):
+        """测试健康检查返回各提供商的熔断器状态"""
+        from src.xp_translator.api import provider_router
+
+        register_client("deepseek", MockAIClient())
+        provider_router.breaker("deepseek")
+
+        data = test_client.get("/health").json()
+        assert data["providers"]["breakers"]["deepseek"]["state"] == "closed"
@@ -0,0 +1,159 @@
+"""
+测试长文本分段翻译
+
+包含对句子切分、片段打包、译文拼接、关键词合并以及并发分段翻译的测试
+"""
+
+import asyncio
+
+from src.xp_translator.batch import estimate_tokens
+from src.xp_translator.prompts import FallbackReply
+from src.xp_translator.segmentation import (
+    TextChunk,
+    split_sentences,
+    chunk_text,
+    join_translations,
+    merge_keywords,
+    translate_chunked
+)
+
+
+class TestSentenceSplitting:
+    """测试句子切分"""
+    
+    def test_chinese_sentences(self):
+        """测试中文句末标点切分"""
+        assert split_sentences("你好。今天天气很好！你呢？") == ["你好。", "今天天气很好！", "你呢？"]
+    
+    def test_english_sentences(self):
+        """测试英文句末标点切分，不在小数点处切分"""
+        assert split_sentences("Pi is 3.14. It is irrational! Right?") == [
+            "Pi is 3.14.", "It is irrational!", "Right?"
+        ]
+
+
+class TestChunkText:
+    """测试文本切分"""
+    
+    def test_short_text_single_chunk(self):
+        """测试短文本不切分"""
+        assert chunk_text("你好世界。") == [TextChunk("你好世界。", "")]
+    
+    def test_chunks_respect_token_limit(self):
+        """测试每个片段不超过 token 上限且覆盖全部原文"""
+        text = "人工智能正在改变世界。" * 50
+        chunks = chunk_text(text, max_tokens=50)
+        assert len(chunks) > 1
+        assert all(estimate_tokens(chunk.text) <= 50 for chunk in chunks)
+        assert "".join(chunk.text for chunk in chunks) == text
+    
+    def test_paragraph_boundaries_preserved(self):
+        """测试段落边界总是片段边界并记录分隔符"""
+        chunks = chunk_text("第一段。\n\n第二段。\n第三段。", max_tokens=1000)
+        assert [chunk.text for chunk in chunks] == ["第一段。", "第二段。", "第三段。"]
+        assert [chunk.separator for chunk in chunks] == ["\n\n", "\n", ""]
+    
+    def test_english_words_not_broken(self):
+        """测试超长英文句子按词切分"""
+        sentence = " ".join(["word"] * 400)
+        chunks = chunk_text(sentence, max_tokens=50)
+        assert len(chunks) > 1
+        assert all(set(chunk.text.split()) == {"word"} for chunk in chunks)
+        assert sum(len(chunk.text.split()) for chunk in chunks) == 400
+
+
+class TestReassembly:
+    """测试译文拼接和关键词合并"""
+    
+    def test_join_english_target(self):
+        """测试目标语言为英文时段内片段以空格连接"""
+        chunks = [TextChunk("一。", ""), TextChunk("二。", "\n\n"), TextChunk("三。", "")]
+        assert join_translations(["One.", "Two.", "Three."], chunks, "zh_to_en") == "One. Two.\n\nThree."
+    
+    def test_join_chinese_target(self):
+        """测试目标语言为中文时段内片段直接连接"""
+        chunks = [TextChunk("One.", ""), TextChunk("Two.", "")]
+        assert join_translations(["一。", "二。"], chunks, "en_to_zh") == "一。二。"
+    
+    def test_merge_keywords(self):
+        """测试关键词按出现次数和首次出现顺序合并"""
+        merged = merge_keywords([["AI", "world", "data"], ["ai", "model"], ["Model", "AI"]])
+        assert merged == ["AI", "model", "world"]
+
+
+class TestTranslateChunked:
+    """测试并发分段翻译"""
+    
+    def test_chunks_translated_concurrently_in_order(self):
+        """测试各片段并发翻译且按原文顺序拼接"""
+        active = {"now": 0, "peak": 0}
+        
+        class SlowClient:
+            async def translate_and_extract(self, text, direction="zh_to_en"):
+                active["now"] += 1
+                active["peak"] = max(active["peak"], active["now"])
+                # 越靠前的片段越慢，验证结果顺序不依赖完成顺序
+                await asyncio.sleep(0.05 if text.startswith("甲") else 0.01)
+                active["now"] -= 1
+                return f"[{text[0]}]", [text[0], "common"]
+        
+        text = "甲" * 40 + "。" + "乙" * 40 + "。" + "丙" * 40 + "。"
+        translation, keywords = asyncio.run(
+            translate_chunked(SlowClient(), text, "zh_to_en", max_tokens=45, concurrency=4)
+        )
+        
+        assert translation == "[甲] [乙] [丙]"
+        assert keywords[0] == "common"
+        assert active["peak"] == 3
+    
+    def test_concurrency_limit(self):
+        """测试并发片段数不超过上限"""
+        active = {"now": 0, "peak": 0}
+        
+        class Client:
+            async def translate_and_extract(self, text, direction="zh_to_en"):
+                active["now"] += 1
+                active["peak"] = max(active["peak"], active["now"])
+                await asyncio.sleep(0.01)
+                active["now"] -= 1
+                return "x", []
+        
+        asyncio.run(translate_chunked(Client(), "测试。" * 100, "zh_to_en", max_tokens=10, concurrency=2))
+        assert active["peak"] == 2
+    
+    def test_fallback_chunk_marks_result(self):
+        """测试任一片段用了占位结果时，拼接后的结果同样标记为占位结果"""
+        class Client:
+            async def translate_and_extract(self, text, direction="zh_to_en"):
+                if text.startswith("乙"):
+                    return FallbackReply((f"Translated: {text}", ["translation"]))
+                return "ok", ["k"]
+        
+        text = "甲" * 40 + "。" + "乙" * 40 + "。"
+        result = asyncio.run(translate_chunked(Client(), text, "zh_to_en", max_tokens=45))
+        assert isinstance(result, FallbackReply)
+        assert result[0].startswith("ok ")
+    
+    def test_api_uses_chunking_for_long_text(self, test_client, register_client):
+        """测试 /translate 对长文本分段翻译"""
+        from src.xp_translator.api import translation_cache
+        from src.xp_translator.clients import MockAIClient
+        
+        calls = []
+        
+        class RecordingClient(MockAIClient):
+            async def translate_and_extract(self, text, direction="zh_to_en"):
+                calls.append((text, direction))
+                return "Sentence.", ["sentence"]
+        
+        register_client("deepseek", RecordingClient())
+        translation_cache.clear()
+        
+        text = "这是一个用于测试长文本分段翻译的句子。" * 100
+        response = test_client.post("/translate", json={"text": text, "direction": "auto"})
+        
+        assert response.status_code == 200
+        assert len(calls) > 1
+        # auto 方向在整段文本上解析一次，所有片段使用相同方向
+        assert {direction for _, direction in calls} == {"zh_to_en"}
+        assert response.json()["translation"].startswith("Sentence. Sentence.")
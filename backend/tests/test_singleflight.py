@@ -0,0 +1,164 @@
+"""
+测试并发请求合并
+
+包含对 SingleFlight 的结果共享、异常传递和取消语义的测试
+"""
+
+import asyncio
+import pytest
+
+from src.xp_translator.singleflight import SingleFlight
+
+
+class TestSingleFlight:
+    """测试 SingleFlight"""
+    
+    def test_concurrent_calls_share_one_upstream(self):
+        """测试相同键的并发调用只执行一次上游函数"""
+        flight = SingleFlight()
+        calls = []
+        
+        async def upstream():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "result"
+        
+        async def run():
+            return await asyncio.gather(*[flight.do("k", upstream) for _ in range(10)])
+        
+        results = asyncio.run(run())
+        assert results == ["result"] * 10
+        assert len(calls) == 1
+        assert flight.stats()["leaders"] == 1
+        assert flight.stats()["coalesced"] == 9
+        assert len(flight) == 0
+    
+    def test_different_keys_not_coalesced(self):
+        """测试不同键分别执行"""
+        flight = SingleFlight()
+        
+        async def run():
+            return await asyncio.gather(
+                flight.do("a", lambda: asyncio.sleep(0.01, result="a")),
+                flight.do("b", lambda: asyncio.sleep(0.01, result="b")),
+            )
+        
+        assert asyncio.run(run()) == ["a", "b"]
+        assert flight.stats()["coalesced"] == 0
+    
+    def test_error_propagates_to_all_waiters(self):
+        """测试上游异常传递给所有等待者"""
+        flight = SingleFlight()
+        
+        async def upstream():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("upstream failed")
+        
+        async def run():
+            return await asyncio.gather(
+                *[flight.do("k", upstream) for _ in range(3)],
+                return_exceptions=True
+            )
+        
+        results = asyncio.run(run())
+        assert all(isinstance(r, RuntimeError) for r in results)
+        # 失败后不保留进行中的调用，下一次请求会重新发起
+        assert len(flight) == 0
+    
+    def test_single_waiter_cancel_does_not_affect_others(self):
+        """测试取消一个等待者不影响其他等待者"""
+        flight = SingleFlight()
+        
+        async def upstream():
+            await asyncio.sleep(0.05)
+            return "result"
+        
+        async def run():
+            first = asyncio.create_task(flight.do("k", upstream))
+            second = asyncio.create_task(flight.do("k", upstream))
+            await asyncio.sleep(0.01)
+            first.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await first
+            return await second
+        
+        assert asyncio.run(run()) == "result"
+        assert flight.stats()["cancelled"] == 0
+    
+    def test_all_waiters_cancel_cancels_upstream(self):
+        """测试所有等待者都取消后上游任务被取消"""
+        flight = SingleFlight()
+        state = {"cancelled": False}
+        
+        async def upstream():
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                state["cancelled"] = True
+                raise
+        
+        async def run():
+            waiters = [asyncio.create_task(flight.do("k", upstream)) for _ in range(2)]
+            await asyncio.sleep(0.01)
+            for waiter in waiters:
+                waiter.cancel()
+            await asyncio.gather(*waiters, return_exceptions=True)
+            await asyncio.sleep(0)
+        
+        asyncio.run(run())
+        assert state["cancelled"] is True
+        assert flight.stats()["cancelled"] == 1
+        assert len(flight) == 0
+    
+    def test_upstream_cancel_propagates_to_waiters(self):
+        """测试上游任务被取消时所有等待者都收到 CancelledError"""
+        flight = SingleFlight()
+        
+        async def upstream():
+            raise asyncio.CancelledError()
+        
+        async def run():
+            return await asyncio.gather(
+                *[flight.do("k", upstream) for _ in range(2)],
+                return_exceptions=True
+            )
+        
+        results = asyncio.run(run())
+        assert all(isinstance(r, asyncio.CancelledError) for r in results)
+
+
+class TestSingleFlightAPI:
+    """测试 /translate 接口的请求合并"""
+    
+    def test_identical_concurrent_requests_coalesced(self, register_client):
+        """测试相同的并发翻译请求只调用一次上游"""
+        import httpx
+        from src.xp_translator.api import app, translation_cache, inflight_translations
+        from src.xp_translator.clients import MockAIClient
+        
+        calls = []
+        
+        async def slow_translate(text, direction="zh_to_en"):
+            calls.append(text)
+            await asyncio.sleep(0.1)
+            return "Banner", ["banner", "text", "popular"]
+        
+        client = MockAIClient()
+        client.translate_and_extract = slow_translate
+        register_client("deepseek", client)
+        translation_cache.clear()
+        before = inflight_translations.stats()["coalesced"]
+        
+        async def run():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+                return await asyncio.gather(*[
+                    http.post("/translate", json={"text": "热门横幅文案"})
+                    for _ in range(5)
+                ])
+        
+        responses = asyncio.run(run())
+        assert all(r.status_code == 200 for r in responses)
+        assert all(r.json()["translation"] == "Banner" for r in responses)
+        assert len(calls) == 1
+        assert inflight_translations.stats()["coalesced"] - before == 4
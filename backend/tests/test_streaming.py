@@ -0,0 +1,189 @@
+"""
+测试流式翻译
+
+包含对 IncrementalResponseParser 的增量解析、客户端流式调用以及 /translate/stream 接口的测试
+"""
+
+import asyncio
+import json
+import pytest
+from unittest.mock import AsyncMock, Mock
+
+from src.xp_translator.clients import IncrementalResponseParser, DeepSeekClient, MockAIClient
+
+
+def feed_all(parser, chunks):
+    """依次喂入所有片段并返回输出的译文片段列表"""
+    return [delta for delta in (parser.feed(chunk) for chunk in chunks) if delta]
+
+
+def parse_sse(body: str):
+    """将 SSE 响应体解析为 (event, data) 列表"""
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+class TestIncrementalResponseParser:
+    """测试增量解析器"""
+    
+    CONTENT = "翻译：Hello world, this is a test.\n关键词：[hello, world, test]"
+    
+    @pytest.mark.parametrize("size", [1, 2, 3, 7, 100])
+    def test_deltas_match_final_translation(self, size):
+        """测试任意切分方式下片段拼接结果等于最终译文"""
+        parser = IncrementalResponseParser()
+        chunks = [self.CONTENT[i:i + size] for i in range(0, len(self.CONTENT), size)]
+        deltas = feed_all(parser, chunks)
+        
+        translation, keywords = parser.finish()
+        assert "".join(deltas) == translation == "Hello world, this is a test."
+        assert keywords == ["hello", "world", "test"]
+    
+    def test_translation_emitted_before_keywords(self):
+        """测试译文在关键词到达前就开始输出"""
+        parser = IncrementalResponseParser()
+        assert parser.feed("翻译：Hel") == "Hel"
+        assert parser.feed("lo") == "lo"
+        assert parser.feed("\n关键") == ""
+        assert parser.feed("词：[a, b]") == ""
+        assert parser.finish() == ("Hello", ["a", "b"])
+    
+    def test_keywords_prefix_not_leaked(self):
+        """测试可能是关键词前缀的行尾不会被提前输出"""
+        parser = IncrementalResponseParser()
+        deltas = feed_all(parser, ["翻译：你好\n", "关", "键词：[问候]"])
+        assert "".join(deltas) == "你好"
+    
+    def test_multiline_translation(self):
+        """测试多行译文被完整保留"""
+        parser = IncrementalResponseParser()
+        deltas = feed_all(parser, ["翻译：Line one\n", "Line two\n", "关键词：[a]"])
+        assert "".join(deltas) == "Line one\nLine two"
+        assert parser.finish()[0] == "Line one\nLine two"
+    
+    def test_missing_sections(self):
+        """测试格式缺失时不输出片段"""
+        parser = IncrementalResponseParser()
+        assert feed_all(parser, ["Just some ", "free text"]) == []
+        assert parser.finish() == ("", [])
+
+
+class TestClientStreaming:
+    """测试客户端流式调用"""
+    
+    def test_deepseek_stream_translate(self, env_vars):
+        """测试 DeepSeekClient 使用 stream=True 并产出片段和最终结果"""
+        pieces = ["翻译：", "Hello", " world", "\n关键词：", "[hello, world]"]
+        
+        async def fake_stream():
+            for piece in pieces:
+                yield Mock(choices=[Mock(delta=Mock(content=piece))])
+        
+        client = DeepSeekClient()
+        client.client = Mock()
+        client.client.chat.completions.create = AsyncMock(return_value=fake_stream())
+        
+        async def collect():
+            return [event async for event in client.stream_translate("你好世界", "zh_to_en")]
+        
+        events = asyncio.run(collect())
+        assert client.client.chat.completions.create.call_args.kwargs["stream"] is True
+        assert [payload for kind, payload in events if kind == "delta"] == ["Hello", " world"]
+        assert events[-1] == ("result", ("Hello world", ["hello", "world"]))
+    
+    def test_stream_fallback_on_bad_format(self, env_vars):
+        """测试流式回复格式错误时使用备用结果"""
+        async def fake_stream():
+            yield Mock(choices=[Mock(delta=Mock(content="no format"))])
+        
+        client = DeepSeekClient()
+        client.client = Mock()
+        client.client.chat.completions.create = AsyncMock(return_value=fake_stream())
+        
+        async def collect():
+            return [event async for event in client.stream_translate("你好", "zh_to_en")]
+        
+        events = asyncio.run(collect())
+        assert events == [("result", ("Translated: 你好", ["translation", "text", "content"]))]
+
+
+    def test_slot_released_during_backoff(self, env_vars):
+        """测试建立连接失败后退避等待期间不占用并发名额，成功后整个流式响应期间占用"""
+        import httpx
+        import openai
+        from src.xp_translator.retry import RetryPolicy
+        
+        request = httpx.Request("POST", "http://upstream/v1/chat/completions")
+        client = DeepSeekClient()
+        client.retry_policy = RetryPolicy(max_retries=2, base_delay=0.0, max_delay=0.0)
+        in_flight = {}
+        
+        async def fake_stream():
+            in_flight["streaming"] = client.limiter.in_flight
+            yield Mock(choices=[Mock(delta=Mock(content="翻译：Hello\n关键词：[hello]"))])
+        
+        client.client = Mock()
+        client.client.chat.completions.create = AsyncMock(side_effect=[
+            openai.APIStatusError("upstream error", response=httpx.Response(503, request=request), body=None),
+            fake_stream()
+        ])
+        on_retry = client._on_retry
+        
+        def record(reason):
+            in_flight["backoff"] = client.limiter.in_flight
+            on_retry(reason)
+        
+        client._on_retry = record
+        
+        async def collect():
+            return [event async for event in client.stream_translate("你好", "zh_to_en")]
+        
+        events = asyncio.run(collect())
+        assert events[-1] == ("result", ("Hello", ["hello"]))
+        assert in_flight == {"backoff": 0, "streaming": 1}
+        assert client.limiter.in_flight == 0
+
+
+class TestStreamingAPI:
+    """测试 /translate/stream 接口"""
+    
+    def test_stream_endpoint(self, test_client, register_client):
+        """测试流式接口输出 delta 事件和包含关键词的 done 事件"""
+        from src.xp_translator.api import translation_cache
+        
+        register_client("deepseek", MockAIClient())
+        translation_cache.clear()
+        
+        response = test_client.post("/translate/stream", json={"text": "你好"})
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        assert response.headers["X-Cache"] == "MISS"
+        
+        events = parse_sse(response.text)
+        deltas = [data["text"] for event, data in events if event == "delta"]
+        event, done = events[-1]
+        assert event == "done"
+        assert "".join(deltas) == done["translation"] == "Hello"
+        assert done["keywords"]
+        
+        # 流式结果写入缓存，再次请求直接命中
+        again = test_client.post("/translate/stream", json={"text": "你好"})
+        assert again.headers["X-Cache"] == "HIT"
+        assert parse_sse(again.text)[-1][1]["translation"] == "Hello"
+    
+    def test_stream_endpoint_error_event(self, test_client, register_client):
+        """测试上游失败时输出 error 事件"""
+        from src.xp_translator.api import translation_cache
+        
+        client = MockAIClient()
+        client.translate_and_extract = AsyncMock(side_effect=Exception("boom"))
+        register_client("deepseek", client)
+        translation_cache.clear()
+        
+        response = test_client.post("/translate/stream", json={"text": "出错"})
+        events = parse_sse(response.text)
+        assert events[-1][0] == "error"
+        assert "boom" in events[-1][1]["detail"]
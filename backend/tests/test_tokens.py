@@ -0,0 +1,143 @@
+"""
+测试 token 预算模块
+
+包含对 token 估算、动态 max_tokens、输出比例校准、预算检查、客户端传入的 max_tokens
+以及 413 拒绝和 /estimate 接口的测试
+"""
+
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, Mock
+
+from src.xp_translator.tokens import TokenBudget, TokenBudgetExceeded, estimate_tokens, REPLY_OVERHEAD_TOKENS
+from src.xp_translator.clients import DeepSeekClient, MockAIClient
+
+
+class TestEstimateTokens:
+    """测试 token 估算"""
+
+    def test_chinese_and_english(self):
+        """测试汉字约 1 token/字，其余约 4 字符/token"""
+        assert estimate_tokens("你好世界") == 4
+        assert estimate_tokens("abcdefgh") == 2
+        assert estimate_tokens("你好 world") == 2 + 2
+
+    def test_cjk_extension(self):
+        """测试扩展区汉字按汉字计"""
+        assert estimate_tokens("\U00020000\U00020001") == 2
+
+
+class TestTokenBudget:
+    """测试 max_tokens 计算与预算检查"""
+
+    def test_max_tokens_scales_with_input(self):
+        """测试 max_tokens 随原文长度增长，并限制在上下限之间"""
+        budget = TokenBudget(min_tokens=64, max_output_tokens=1000, safety_factor=1.5)
+        assert budget.max_tokens(2, "zh_to_en") == 64
+        assert budget.max_tokens(100, "zh_to_en") == 150 + REPLY_OVERHEAD_TOKENS
+        assert budget.max_tokens(100, "en_to_zh") > budget.max_tokens(100, "zh_to_en")
+        assert budget.max_tokens(5000, "zh_to_en") == 1000
+
+    def test_observe_moves_ratio(self):
+        """测试实际输出用于校准比例，过短的原文不参与"""
+        budget = TokenBudget(alpha=0.5)
+        before = budget.ratio("zh_to_en")
+        budget.observe("zh_to_en", 100, 300 + REPLY_OVERHEAD_TOKENS)
+        assert budget.ratio("zh_to_en") == pytest.approx(before + 0.5 * (3.0 - before))
+        budget.observe("zh_to_en", 2, 500)
+        assert budget.observations == 1
+        assert budget.stats()["output_ratios"]["zh_to_en"] == pytest.approx(2.0)
+
+    def test_chunked_estimate(self):
+        """测试分段翻译时按片段计算单次调用的 max_tokens"""
+        budget = TokenBudget(max_output_tokens=1000)
+        text = "测" * 3000
+        chunked = budget.estimate(text, "zh_to_en", chunk_tokens=300)
+        assert chunked.calls == 10
+        assert chunked.within_budget
+        assert chunked.max_tokens == budget.max_tokens(300, "zh_to_en")
+        assert not budget.estimate(text, "zh_to_en").within_budget
+
+    def test_check_raises(self):
+        """测试原文或预计输出超出上限时抛出异常"""
+        with pytest.raises(TokenBudgetExceeded, match="超过上限 10"):
+            TokenBudget(max_input_tokens=10).check("测" * 20, "zh_to_en")
+        with pytest.raises(TokenBudgetExceeded, match="输出 token"):
+            TokenBudget(max_output_tokens=100).check("测" * 200, "zh_to_en")
+        assert TokenBudget().check("你好", "zh_to_en").input_tokens == 2
+
+
+class TestClientMaxTokens:
+    """测试客户端按预算设置 max_tokens"""
+
+    def _client(self, completion_tokens=40, finish_reason="stop"):
+        client = DeepSeekClient()
+        response = Mock()
+        response.choices = [Mock(message=Mock(content="翻译：Hi\n关键词：[hi]"), finish_reason=finish_reason)]
+        response.usage = Mock(prompt_tokens=500, completion_tokens=completion_tokens, total_tokens=540,
+                              prompt_tokens_details=None, prompt_cache_hit_tokens=None)
+        client.client = Mock()
+        client.client.chat.completions.create = AsyncMock(return_value=response)
+        return client
+
+    def test_max_tokens_follows_input(self, env_vars):
+        """测试短文本和长文本使用不同的 max_tokens，并用实际输出校准比例"""
+        client = self._client()
+        asyncio.run(client.translate_and_extract("你好", "zh_to_en"))
+        short = client.client.chat.completions.create.call_args.kwargs["max_tokens"]
+        asyncio.run(client.translate_and_extract("测" * 400, "zh_to_en"))
+        long = client.client.chat.completions.create.call_args.kwargs["max_tokens"]
+        assert short == client.token_budget.min_tokens
+        assert long == TokenBudget().max_tokens(400, "zh_to_en") > 400
+        assert client.token_budget.observations == 1
+
+    def test_truncation_counted(self, env_vars):
+        """测试 finish_reason=length 的回复计入截断指标"""
+        client = self._client(finish_reason="length")
+        before = client._truncations.value
+        asyncio.run(client.translate_and_extract("你好", "zh_to_en"))
+        assert client._truncations.value - before == 1
+
+
+class TestBudgetAPI:
+    """测试接口的预算检查"""
+
+    @pytest.fixture
+    def client(self, register_client):
+        from src.xp_translator.api import translation_cache
+        client = MockAIClient()
+        client.translate_and_extract = AsyncMock(return_value=("ok", ["k"]))
+        client.token_budget = TokenBudget(max_input_tokens=1000, max_output_tokens=500)
+        register_client("deepseek", client)
+        translation_cache.clear()
+        return client
+
+    def test_translate_rejected_before_upstream(self, test_client, client):
+        """测试超出预算的输入返回 413 且不调用上游"""
+        response = test_client.post("/translate", json={"text": "测" * 1200, "direction": "zh_to_en"})
+        assert response.status_code == 413
+        client.translate_and_extract.assert_not_awaited()
+        # 400 字超过单次调用的输出上限，但 /translate 会分段翻译
+        assert test_client.post("/translate", json={"text": "测" * 400}).status_code == 200
+
+    def test_batch_reports_item(self, test_client, client):
+        """测试批量请求中任一条目超出预算时返回 413 并指出条目序号"""
+        response = test_client.post("/translate/batch", json={"items": [{"text": "短"}, {"text": "测" * 1200}]})
+        assert response.status_code == 413
+        assert "第 2 条" in response.json()["detail"]
+
+    def test_stream_not_chunked(self, test_client, client):
+        """测试流式接口不分段，整段输出超出上限时返回 413"""
+        response = test_client.post("/translate/stream", json={"text": "测" * 400, "direction": "zh_to_en"})
+        assert response.status_code == 413
+
+    def test_estimate_endpoint(self, test_client, client):
+        """测试 /estimate 返回与预算检查一致的数字"""
+        data = test_client.post("/estimate", json={"text": "测" * 400, "direction": "auto"}).json()
+        assert data["direction"] == "zh_to_en"
+        assert data["input_tokens"] == 400
+        assert data["calls"] == 2
+        assert data["within_budget"] is True
+        assert data["max_output_tokens"] == 500
+        streamed = test_client.post("/estimate?stream=true", json={"text": "测" * 400}).json()
+        assert streamed["within_budget"] is False
@@ -0,0 +1,149 @@
+"""
+测试请求追踪
+
+包含对 span 记录、上下文传递、环形缓冲区导出以及 Server-Timing 响应头的测试
+"""
+
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, Mock, patch
+
+from src.xp_translator.tracing import Tracer, span, current_trace
+from src.xp_translator.clients import DeepSeekClient
+
+
+class TestTracer:
+    """测试追踪记录与导出"""
+
+    def test_span_noop_without_trace(self):
+        """测试没有进行中的追踪时 span 为共享的空操作对象"""
+        assert span("upstream") is span("parse")
+        with span("upstream"):
+            pass
+
+    def test_disabled_tracer(self):
+        """测试未启用时不创建追踪"""
+        tracer = Tracer(enabled=False)
+        assert tracer.start("translate") is None
+        assert current_trace() is None
+        tracer.finish(None)
+        assert tracer.recent() == []
+
+    def test_records_spans(self):
+        """测试记录 span 并生成 Server-Timing"""
+        tracer = Tracer(enabled=True)
+
+        async def run():
+            trace = tracer.start("translate")
+            with span("cache"):
+                pass
+            with span("upstream"):
+                await asyncio.sleep(0.01)
+            tracer.finish(trace)
+            return trace
+
+        trace = asyncio.run(run())
+        breakdown = trace.breakdown()
+        assert list(breakdown) == ["cache", "upstream"]
+        assert breakdown["upstream"] >= 10
+
+        header = trace.server_timing()
+        assert header.startswith("cache;dur=")
+        assert "upstream;dur=" in header
+        assert "total;dur=" in header
+
+        exported = tracer.recent()[0]
+        assert exported["name"] == "translate"
+        assert [s["name"] for s in exported["spans"]] == ["cache", "upstream"]
+
+    def test_child_tasks_share_trace(self):
+        """测试并发子任务的 span 记录到同一个追踪，同名 span 累加"""
+        tracer = Tracer(enabled=True)
+
+        async def chunk():
+            with span("llm"):
+                await asyncio.sleep(0.01)
+
+        async def run():
+            trace = tracer.start("translate")
+            await asyncio.gather(chunk(), chunk(), chunk())
+            tracer.finish(trace)
+            return trace
+
+        trace = asyncio.run(run())
+        assert len(trace.spans) == 3
+        assert trace.breakdown()["llm"] >= 30
+
+    def test_finish_restores_context(self):
+        """测试结束追踪后当前上下文中不再有追踪"""
+        tracer = Tracer(enabled=True)
+
+        async def run():
+            tracer.finish(tracer.start("translate"))
+            return current_trace()
+
+        assert asyncio.run(run()) is None
+
+    def test_ring_buffer_bounded(self):
+        """测试环形缓冲区只保留最近的追踪"""
+        tracer = Tracer(enabled=True, buffer_size=2)
+
+        async def run():
+            for name in ("a", "b", "c"):
+                tracer.finish(tracer.start(name))
+
+        asyncio.run(run())
+        assert [t["name"] for t in tracer.recent()] == ["c", "b"]
+
+    def test_from_env(self):
+        """测试从环境变量读取配置"""
+        with patch.dict("os.environ", {"TRACING_ENABLED": "true"}):
+            assert Tracer.from_env().enabled
+        with patch.dict("os.environ", {}, clear=True):
+            assert not Tracer.from_env().enabled
+
+
+class TestTracingAPI:
+    """测试翻译接口的追踪"""
+
+    @pytest.fixture
+    def enabled_tracer(self):
+        from src.xp_translator.api import tracer
+        tracer.enabled = True
+        tracer.clear()
+        yield tracer
+        tracer.enabled = False
+        tracer.clear()
+
+    def test_server_timing_header(self, test_client, register_client, env_vars, enabled_tracer):
+        """测试响应包含各阶段耗时，客户端内部的 span 也被记录"""
+        from src.xp_translator.api import translation_cache
+
+        client = DeepSeekClient()
+        mock_response = Mock()
+        mock_response.choices = [Mock(message=Mock(content="翻译：Tracing\n关键词：[trace]"))]
+        client.client = Mock()
+        client.client.chat.completions.create = AsyncMock(return_value=mock_response)
+        register_client("deepseek", client)
+        translation_cache.clear()
+
+        response = test_client.post("/translate", json={"text": "追踪测试", "provider": "deepseek"})
+
+        assert response.status_code == 200
+        names = [entry.split(";")[0] for entry in response.headers["Server-Timing"].split(", ")]
+        for name in ("client", "cache", "upstream", "prompt", "llm", "parse", "total"):
+            assert name in names
+
+        traces = test_client.get("/debug/traces").json()
+        assert traces["enabled"] is True
+        assert traces["traces"][0]["attributes"]["outcome"] == "success"
+
+    def test_no_header_when_disabled(self, test_client, register_client):
+        """测试未启用追踪时不返回 Server-Timing"""
+        from src.xp_translator.api import tracer
+        from src.xp_translator.clients import MockAIClient
+
+        assert not tracer.enabled
+        register_client("deepseek", MockAIClient())
+        response = test_client.post("/translate", json={"text": "未启用追踪", "provider": "deepseek"})
+        assert "Server-Timing" not in response.headers
@@ -0,0 +1,192 @@
+"""
+测试翻译记忆模块
+
+包含对精确和模糊命中、数字与术语替换、语序变化、阈值、淘汰、TMX 导入导出
+以及 /translate 接口复用翻译记忆的测试
+"""
+
+from unittest.mock import AsyncMock, patch
+import pytest
+
+from src.xp_translator.glossary import Glossary, GlossaryEntry
+from src.xp_translator.translation_memory import TranslationMemory
+
+GLOSSARY = Glossary([
+    GlossaryEntry("项目", "project", ("项目",), ("project",)),
+    GlossaryEntry("报告", "report", ("报告",), ("report",)),
+    GlossaryEntry("测试", "test", ("测试",), ("test",)),
+])
+
+
+def make_memory(**kwargs):
+    return TranslationMemory(glossary=GLOSSARY, **kwargs)
+
+
+class TestLookup:
+    """测试查找与复用"""
+
+    def test_exact_hit(self):
+        """测试相同原文（首尾空白忽略）精确命中"""
+        memory = make_memory()
+        memory.add("今天天气很好", "zh_to_en", "The weather is nice today", ["weather"])
+        hit = memory.lookup("  今天天气很好\n", "zh_to_en")
+        assert hit.translation == "The weather is nice today"
+        assert hit.score == 1.0
+        assert memory.stats()["hits"] == 1
+
+    def test_number_replaced(self):
+        """测试只有数字不同的句子命中并替换译文中的数字"""
+        memory = make_memory()
+        memory.add("订单12345已经发货", "zh_to_en", "Order 12345 has shipped", ["order"])
+        hit = memory.lookup("订单67890已经发货", "zh_to_en")
+        assert hit.translation == "Order 67890 has shipped"
+        assert hit.source == "订单12345已经发货"
+
+    def test_term_replaced_with_keywords(self):
+        """测试只有术语不同的句子替换译法，保持大小写并同步关键词"""
+        memory = make_memory()
+        memory.add("请查收项目", "zh_to_en", "Please check the Project", ["project", "check"])
+        hit = memory.lookup("请查收报告", "zh_to_en")
+        assert hit.translation == "Please check the Report"
+        assert hit.keywords == ["report", "check"]
+
+    def test_reordered_target(self):
+        """测试译文中占位符顺序与原文不同时仍能对应"""
+        memory = make_memory()
+        memory.add("3 tests passed", "en_to_zh", "测试通过了 3 个", ["测试"])
+        hit = memory.lookup("7 tests passed", "en_to_zh")
+        assert hit.translation == "测试通过了 7 个"
+
+    def test_fuzzy_threshold(self):
+        """测试相似度低于阈值时不命中"""
+        memory = make_memory(threshold=0.9)
+        memory.add("今天天气很好", "zh_to_en", "The weather is nice today", [])
+        assert memory.lookup("今天天气很好吗？", "zh_to_en") is None
+        loose = make_memory(threshold=0.8)
+        loose.add("今天天气很好", "zh_to_en", "The weather is nice today", [])
+        assert loose.lookup("今天天气很好吗？", "zh_to_en").score < 1.0
+
+    def test_slot_mismatch_misses(self):
+        """测试译文中找不到旧数字时不复用"""
+        memory = make_memory()
+        memory.add("共有12个", "zh_to_en", "There are twelve", [])
+        assert memory.lookup("共有13个", "zh_to_en") is None
+
+    def test_direction_isolated(self):
+        """测试不同方向的条目互不影响"""
+        memory = make_memory()
+        memory.add("hello world", "en_to_zh", "你好世界", [])
+        assert memory.lookup("hello world", "zh_to_en") is None
+        assert memory.lookup("hello world", "auto").translation == "你好世界"
+
+    def test_fuzzy_lookup_bounded(self):
+        """测试常见 n-gram 的倒排表超过遍历上限时，仍能从少见的 n-gram 找到相似条目"""
+        memory = make_memory(threshold=0.8)
+        for i in range(300):
+            memory.add(f"please send the status update {chr(97 + i % 26)}{chr(97 + i // 26)}", "en_to_zh", f"更新 {i}", [])
+        memory.add("the quarterly review meeting moved to friday", "en_to_zh", "季度评审会议改到周五", [])
+        with patch("src.xp_translator.translation_memory.MAX_SCANNED_POSTINGS", 20), \
+                patch("src.xp_translator.translation_memory.MAX_CANDIDATES", 5):
+            hit = memory.lookup("the quarterly review meeting moved to friday!", "en_to_zh")
+            assert hit.translation == "季度评审会议改到周五"
+            assert hit.score < 1.0
+
+    def test_eviction(self):
+        """测试超过 max_entries 时淘汰最早写入的条目"""
+        memory = make_memory(max_entries=2)
+        for text in ["第一句话", "第二句话", "第三句话"]:
+            memory.add(text, "zh_to_en", f"sentence {text}", [])
+        assert len(memory) == 2
+        assert memory.stats()["evictions"] == 1
+        assert memory.lookup("第一句话", "zh_to_en") is None
+        assert memory.lookup("第三句话", "zh_to_en") is not None
+
+
+class TestTMX:
+    """测试 TMX 导入导出"""
+
+    def test_round_trip(self, tmp_path):
+        """测试导出后再导入得到相同条目，并可保存到文件"""
+        memory = make_memory(tmx_path=str(tmp_path / "memory.tmx"))
+        memory.add("订单12345已经发货", "zh_to_en", "Order 12345 has shipped", ["order", "shipping"])
+        memory.add("Good morning", "en_to_zh", "早上好", ["早上"])
+        memory.save()
+
+        restored = make_memory(tmx_path=str(tmp_path / "memory.tmx"))
+        assert restored.load() == 2
+        assert restored.lookup("订单1已经发货", "zh_to_en").translation == "Order 1 has shipped"
+        hit = restored.lookup("Good morning", "en_to_zh")
+        assert (hit.translation, hit.keywords) == ("早上好", ["早上"])
+
+    def test_export_indented(self):
+        """测试导出的 TMX 每层缩进两个空格（不依赖 Python 3.9 的 ET.indent）"""
+        memory = make_memory()
+        memory.add("早上好", "zh_to_en", "Good morning", ["morning"])
+        lines = memory.export_tmx().splitlines()
+        assert '  <header' in lines[2]
+        assert '      <prop type="x-keywords">morning</prop>' in lines
+        assert '        <seg>早上好</seg>' in lines
+
+    def test_import_all_directions(self):
+        """测试 srclang 为 *all* 的翻译单元两个方向都导入"""
+        content = """<?xml version="1.0" encoding="UTF-8"?>
+<tmx version="1.4"><header srclang="*all*" segtype="sentence" datatype="plaintext"
+ adminlang="en" o-tmf="x" creationtool="x" creationtoolversion="1"/>
+<body><tu><tuv xml:lang="zh-CN"><seg>云计算</seg></tuv><tuv xml:lang="en-US"><seg>Cloud computing</seg></tuv></tu>
+<tu><tuv xml:lang="fr"><seg>Bonjour</seg></tuv><tuv xml:lang="en"><seg>Hello</seg></tuv></tu></body></tmx>"""
+        memory = make_memory()
+        assert memory.import_tmx(content) == 2
+        assert memory.lookup("云计算", "zh_to_en").translation == "Cloud computing"
+        assert memory.lookup("cloud computing", "en_to_zh").translation == "云计算"
+
+    def test_from_env_disabled_by_default(self):
+        """测试默认不启用翻译记忆"""
+        with patch.dict("os.environ", {"TRANSLATION_MEMORY_ENABLED": "false"}):
+            assert TranslationMemory.from_env() is None
+        with patch.dict("os.environ", {"TRANSLATION_MEMORY_ENABLED": "true", "TRANSLATION_MEMORY_THRESHOLD": "0.8"}):
+            assert TranslationMemory.from_env().threshold == 0.8
+
+
+class TestTranslationMemoryAPI:
+    """测试接口复用翻译记忆"""
+
+    @pytest.fixture
+    def memory(self, monkeypatch):
+        from src.xp_translator import api
+        memory = make_memory()
+        monkeypatch.setattr(api, "translation_memory", memory)
+        api.translation_cache.clear()
+        return memory
+
+    def test_near_repeat_skips_upstream(self, test_client, register_client, memory):
+        """测试近似重复的请求由翻译记忆返回，不再调用上游"""
+        from src.xp_translator.clients import MockAIClient
+
+        client = MockAIClient()
+        client.provider = "deepseek"
+        client.translate_and_extract = AsyncMock(return_value=("Order 12345 has shipped", ["order"]))
+        register_client("deepseek", client)
+
+        first = test_client.post("/translate", json={"text": "订单12345已经发货", "direction": "zh_to_en"})
+        second = test_client.post("/translate", json={"text": "订单555已经发货", "direction": "zh_to_en"})
+
+        assert first.headers["X-Cache"] == "MISS"
+        assert second.headers["X-Cache"] == "TM"
+        assert second.json()["translation"] == "Order 555 has shipped"
+        assert client.translate_and_extract.await_count == 1
+
+    def test_import_export_endpoints(self, test_client, memory):
+        """测试通过接口导入导出 TMX"""
+        memory.add("早上好", "zh_to_en", "Good morning", [])
+        exported = test_client.get("/translation-memory/export")
+        assert exported.headers["content-type"].startswith("application/x-tmx+xml")
+
+        imported = test_client.post("/translation-memory/import", content=exported.content)
+        assert imported.json() == {"imported": 1, "entries": 1}
+        assert test_client.post("/translation-memory/import", content=b"<tmx").status_code == 400
+
+    def test_endpoints_disabled(self, test_client, monkeypatch):
+        """测试未启用时导入导出接口返回 404"""
+        from src.xp_translator import api
+        monkeypatch.setattr(api, "translation_memory", None)
+        assert test_client.get("/translation-memory/export").status_code == 404